@@ -2,135 +2,345 @@
 AQI API Endpoints - Air Quality Index
 Các endpoint liên quan đến chất lượng không khí và dữ liệu AQI
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict, Any, Optional
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-from app.db.bigquery import get_bigquery_client
+from __future__ import annotations
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Hashable, NamedTuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import time
+import orjson
+from app.core.lazy import lazy_import
+from datetime import datetime
+from app.core.config import settings
+from app.core.http_cache import cached_bytes, cached_json, is_not_modified, make_etag, not_modified, validator_headers
+from app.core.imaging import encode_png
+from app.core.interpolation import NO_DATA_UINT8, GridBounds, grid_axes, idw_grid, quantize_uint8
+from app.core.tiles import EMPTY_TILE_VERSION, TileCache, empty_tile, intersects, render_aqi_tile, tile_bounds
+from app.core.serialization import FieldSpec, serialize_frame, serialize_table, iter_ndjson, iter_arrow_ipc
+from app.db.bigquery import iter_arrow_batches, run_query
+from app.db.queries import hours_ago, normalize_date, run_template, run_template_arrow, run_template_pages
+from app.db.dimensions import resolve_station, get_dimensions
+from app.db.ingestion import get_fact_version
 import random
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
 
 router = APIRouter()
 
+# Schema serialize cho dữ liệu AQI: field -> (cột nguồn, kiểu, giá trị mặc định khi NULL)
+AQI_READING_FIELDS: Dict[str, FieldSpec] = {
+    'latitude': ('latitude', 'float', 0.0),
+    'longitude': ('longitude', 'float', 0.0),
+    'location_name': ('location_name', 'str', 'Unknown'),
+    'district': ('district', 'str', 'Unknown'),
+    'time': ('time', 'timestamp', None),
+    'pm2_5': ('pm2_5', 'float', 0),
+    'pm10': ('pm10', 'float', 0),
+    'temperature_2m': ('temperature_2m', 'float', 25.0),
+    'relative_humidity_2m': ('relative_humidity_2m', 'float', 60.0),
+    'wind_speed_10m': ('wind_speed_10m', 'float', 5.0),
+    'wind_direction_10m': ('wind_direction_10m', 'float', 0),
+    'pressure_msl': ('pressure_msl', 'float', 1013.25),
+    'AQI_TOTAL': ('AQI_TOTAL', 'int', 0),
+}
+
+# Các field lấy từ trạm đã resolve (spatial index) thay vì JOIN Dim_Location
+STATION_COLUMNS = ('latitude', 'longitude', 'location_name', 'district')
+
+AQI_DETAIL_FIELDS: Dict[str, FieldSpec] = {
+    name: spec for name, spec in AQI_READING_FIELDS.items()
+    if name not in STATION_COLUMNS
+}
+
+AQI_LATEST_FIELDS: Dict[str, FieldSpec] = {
+    **AQI_READING_FIELDS,
+    'aqi': ('aqi', 'int', 0),
+}
+
+AQI_RANGE_FIELDS: Dict[str, FieldSpec] = {
+    name: spec for name, spec in AQI_READING_FIELDS.items()
+    if name not in ('wind_direction_10m', 'pressure_msl')
+}
+
+LOCATION_FIELDS: Dict[str, FieldSpec] = {
+    'location_key': ('location_key', 'int', 0),
+    'location_name': ('location_name', 'str', 'Unknown'),
+    'latitude': ('latitude', 'float', 0.0),
+    'longitude': ('longitude', 'float', 0.0),
+    'district': ('location_name', 'str', 'Unknown'),  # Fallback
+}
+
+def station_fields(station: Dict[str, Any]) -> Dict[str, Any]:
+    """Thông tin location của trạm dùng làm field cố định trong response"""
+    return {
+        'latitude': station['latitude'],
+        'longitude': station['longitude'],
+        'location_name': station['location_name'],
+        'district': station['location_name']
+    }
+
+class SnapshotCache:
+    """
+    Cache snapshot dùng chung trong process với TTL
+    - Chỉ 1 request chạy query refresh tại một thời điểm (stampede protection)
+    - Trong lúc refresh, request khác nhận snapshot cũ (stale) nếu có, nếu chưa có thì chờ
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._value: Any = None
+        self._loaded_at: float = 0.0
+        self._lock = asyncio.Lock()
+        # Counters cho monitoring
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _is_fresh(self) -> bool:
+        return self._value is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def get(self, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Trả về snapshot hiện tại, gọi loader để refresh khi hết TTL
+        Loader raise exception nếu không có dữ liệu hợp lệ (kết quả lỗi không được cache)
+        """
+        if self._is_fresh():
+            self.hits += 1
+            return self._value
+
+        # Đang có request khác refresh - trả về dữ liệu cũ thay vì chạy thêm query
+        if self._value is not None and self._lock.locked():
+            self.stale_hits += 1
+            return self._value
+
+        self.misses += 1
+        async with self._lock:
+            # Request khác có thể vừa refresh xong trong lúc chờ lock
+            if self._is_fresh():
+                return self._value
+
+            try:
+                value = await loader()
+            except Exception as e:
+                self.errors += 1
+                if self._value is not None:
+                    print(f"⚠️ Snapshot refresh failed, serving stale data: {e}")
+                    self.stale_hits += 1
+                    return self._value
+                raise
+
+            self._value = value
+            self._loaded_at = time.monotonic()
+            self.refreshes += 1
+            return value
+
+    def invalidate(self) -> None:
+        """Đánh dấu snapshot hết hạn - lần gọi tiếp theo sẽ refresh"""
+        self._loaded_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss/refresh của cache"""
+        age = time.monotonic() - self._loaded_at if self._value is not None else None
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "snapshot_age_seconds": round(age, 1) if age is not None else None
+        }
+
+class SurfaceCache:
+    """
+    LRU các kết quả tính từ 1 snapshot (lưới nội suy đã encode) theo tham số request
+    Snapshot khác (cache AQI vừa refresh) -> bỏ toàn bộ kết quả cũ
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._snapshot: Any = None
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, snapshot: Any, key: Hashable) -> Any:
+        if snapshot is self._snapshot and key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, snapshot: Any, key: Hashable, value: Any) -> None:
+        if snapshot is not self._snapshot:
+            self._snapshot = snapshot
+            self._entries.clear()
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+class AqiSnapshot(NamedTuple):
+    """Snapshot AQI mới nhất kèm body JSON đã encode và validator HTTP (tính 1 lần mỗi lần refresh)"""
+    readings: List[Dict[str, Any]]
+    body: bytes
+    etag: str
+    # Thời điểm dữ liệu mới nhất (Last-Modified)
+    last_modified: Optional[datetime]
+
+# Snapshot dùng chung cho /current, /latest, /realdata-only và /grid
+latest_aqi_cache = SnapshotCache(ttl_seconds=settings.AQI_SNAPSHOT_TTL_SECONDS)
+
+# Lưới nội suy của snapshot hiện tại
+aqi_grid_cache = SurfaceCache(max_entries=settings.AQI_GRID_CACHE_ENTRIES)
+
+# Version nội dung của snapshot hiện tại (tính 1 lần mỗi snapshot)
+snapshot_versions = SurfaceCache(max_entries=1)
+
+# Tile PNG theo version snapshot - memory LRU + đĩa
+aqi_tile_cache = TileCache(
+    max_entries=settings.AQI_TILE_CACHE_ENTRIES,
+    directory=settings.AQI_TILE_CACHE_DIR,
+    keep_versions=settings.AQI_TILE_CACHE_VERSIONS
+)
+
 # GET /api/v1/aqi/current - Lấy dữ liệu AQI hiện tại (alias cho realdata-only)
 @router.get("/current")
-async def get_current_aqi() -> List[Dict[str, Any]]:
+async def get_current_aqi(request: Request) -> List[Dict[str, Any]]:
     """
     Lấy dữ liệu AQI hiện tại (alias cho realdata-only)
     """
-    return await get_latest_aqi_real_data()
+    return await get_latest_aqi_real_data(request)
 
 # GET /api/v1/aqi/latest - Lấy dữ liệu AQI mới nhất (alias cho realdata-only)
 @router.get("/latest")
-async def get_latest_aqi() -> List[Dict[str, Any]]:
+async def get_latest_aqi(request: Request) -> List[Dict[str, Any]]:
     """
     Lấy dữ liệu AQI mới nhất (alias cho realdata-only)
     """
-    return await get_latest_aqi_real_data()
+    return await get_latest_aqi_real_data(request)
 
 # GET /api/v1/aqi/realdata-only - Lấy dữ liệu AQI thực từ BigQuery
 @router.get("/realdata-only")
-async def get_latest_aqi_real_data() -> List[Dict[str, Any]]:
+async def get_latest_aqi_real_data(request: Request) -> List[Dict[str, Any]]:
     """
     Lấy dữ liệu AQI mới nhất từ 3 bảng chính: Dim_Location, Dim_Time, Fact_Weather_AirQuality
+    Kết quả được cache theo AQI_SNAPSHOT_TTL_SECONDS, dùng chung cho mọi request
+    ETag theo nội dung snapshot: client gửi If-None-Match khớp -> 304, không gửi lại body
     """
+    snapshot = await latest_snapshot()
+    if snapshot is None:
+        # Fallback về dữ liệu mẫu nếu có lỗi
+        return get_mock_aqi_data()
+
+    if is_not_modified(request, snapshot.etag, snapshot.last_modified):
+        return not_modified(snapshot.etag, snapshot.last_modified)
+    return cached_bytes(snapshot.body, "application/json", snapshot.etag, snapshot.last_modified)
+
+async def latest_snapshot() -> Optional[AqiSnapshot]:
+    """Snapshot AQI mới nhất từ cache, None khi BigQuery lỗi / không có dữ liệu"""
     try:
-        client = get_bigquery_client()
-        
-        # Query từ 3 bảng chính theo mô hình Star Schema - chỉ 1 record mới nhất cho mỗi location
-        query = """
-        SELECT
-            l.latitude,
-            l.longitude,
-            l.location_name,
-            l.location_name as district,
-            t.time as time,
-            f.pm2_5,
-            f.pm10,
-            f.temperature_2m,
-            f.relative_humidity_2m,
-            f.wind_speed_10m,
-            f.wind_direction_10m,
-            f.pressure_msl,
-            f.AQI_TOTAL as AQI_TOTAL,
-            f.AQI_TOTAL as aqi
-        FROM
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Location` l
-        LEFT JOIN (
-            SELECT 
-                location_key,
-                time_key,
-                pm2_5,
-                pm10,
-                temperature_2m,
-                relative_humidity_2m,
-                wind_speed_10m,
-                wind_direction_10m,
-                pressure_msl,
-                AQI_TOTAL,
-                ROW_NUMBER() OVER (PARTITION BY location_key ORDER BY time_key DESC) as rn
-            FROM `invertible-now-462103-m3.weather_and_air_dataset.Fact_Weather_AirQuality`
-            WHERE AQI_TOTAL IS NOT NULL
-        ) f ON l.location_key = f.location_key AND f.rn = 1
-        LEFT JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        ORDER BY l.location_name
-        """
-        
-        # Execute query
-        df = client.query(query).to_dataframe()
-        
-        if not df.empty:
-            # Xử lý dữ liệu từ 3 bảng chính
-            aqi_data = []
-            for _, row in df.iterrows():
-                # Nếu không có dữ liệu fact, tạo dữ liệu mẫu cho location này
-                if pd.isna(row['pm2_5']):
-                    aqi_data.append({
-                        'latitude': float(row['latitude']),
-                        'longitude': float(row['longitude']),
-                        'location_name': str(row['location_name']) if pd.notna(row['location_name']) else 'Unknown',
-                        'district': str(row['district']) if pd.notna(row['district']) else 'Unknown',
-                        'time': datetime.now().isoformat(),
-                        'pm2_5': max(0, 60 * 0.33 + random.uniform(-5, 5)),
-                        'pm10': max(0, 60 * 0.58 + random.uniform(-8, 8)),
-                        'temperature_2m': round(28 + random.uniform(-3, 3), 1),
-                        'relative_humidity_2m': max(0, min(100, 60 + random.uniform(-15, 15))),
-                        'wind_speed_10m': max(0, 3 + random.uniform(-1, 2)),
-                        'wind_direction_10m': random.uniform(0, 360),
-                        'pressure_msl': 1013.25 + random.uniform(-10, 10),
-                        'AQI_TOTAL': max(0, 60 + random.randint(-20, 40)),
-                        'aqi': max(0, 60 + random.randint(-20, 40))
-                    })
-                else:
-                    aqi_data.append({
-                        'latitude': float(row['latitude']),
-                        'longitude': float(row['longitude']),
-                        'location_name': str(row['location_name']) if pd.notna(row['location_name']) else 'Unknown',
-                        'district': str(row['district']) if pd.notna(row['district']) else 'Unknown',
-                        'time': row['time'].isoformat() if hasattr(row['time'], 'isoformat') else str(row['time']),
-                        'pm2_5': float(row['pm2_5']) if pd.notna(row['pm2_5']) else 0,
-                        'pm10': float(row['pm10']) if pd.notna(row['pm10']) else 0,
-                        'temperature_2m': float(row['temperature_2m']) if pd.notna(row['temperature_2m']) else 25.0,
-                        'relative_humidity_2m': float(row['relative_humidity_2m']) if pd.notna(row['relative_humidity_2m']) else 60.0,
-                        'wind_speed_10m': float(row['wind_speed_10m']) if pd.notna(row['wind_speed_10m']) else 5.0,
-                        'wind_direction_10m': float(row['wind_direction_10m']) if pd.notna(row['wind_direction_10m']) else 0,
-                        'pressure_msl': float(row['pressure_msl']) if pd.notna(row['pressure_msl']) else 1013.25,
-                        'AQI_TOTAL': int(row['AQI_TOTAL']) if pd.notna(row['AQI_TOTAL']) else 0,
-                        'aqi': int(row['aqi']) if pd.notna(row['aqi']) else 0
-                    })
-            
-            return aqi_data
-        else:
-            # Fallback về dữ liệu mẫu nếu không có dữ liệu thực
-            return get_mock_aqi_data()
-            
+        return await latest_aqi_cache.get(query_latest_aqi_snapshot)
     except Exception as e:
         print(f"❌ AQI API error: {e}")
-        # Fallback về dữ liệu mẫu nếu có lỗi
-        return get_mock_aqi_data()
+        return None
+
+async def latest_readings() -> List[Dict[str, Any]]:
+    """Các bản ghi của snapshot mới nhất, dữ liệu mẫu nếu không có snapshot"""
+    snapshot = await latest_snapshot()
+    return snapshot.readings if snapshot is not None else get_mock_aqi_data()
+
+async def fact_etag(*parts: Any) -> Optional[str]:
+    """
+    ETag cho endpoint đọc bảng fact: tham số request + version dữ liệu fact (metadata bảng, không chạy query)
+    Đổi theo mọi lần ghi fact kể cả backfill / MERGE sửa giờ cũ. None khi không đọc được version - response không kèm ETag
+    """
+    version = await get_fact_version().get()
+    if version is None:
+        return None
+    return make_etag(*parts, version)
+
+# GET /api/v1/aqi/cache-stats - Thống kê cache snapshot AQI
+@router.get("/cache-stats")
+async def get_aqi_cache_stats() -> Dict[str, Any]:
+    """
+    Thống kê hit/miss/refresh của cache snapshot AQI mới nhất
+    """
+    return {
+        "latest_snapshot": latest_aqi_cache.stats(),
+        "grid": aqi_grid_cache.stats(),
+        "tiles": aqi_tile_cache.stats()
+    }
+
+async def query_latest_aqi_snapshot() -> AqiSnapshot:
+    """
+    Query snapshot mới nhất cho mỗi location (1 BigQuery job cho mỗi lần refresh cache)
+    Raise ValueError khi không có dữ liệu để cache không lưu kết quả fallback
+    """
+    # Chỉ query bảng fact (location_key/time_key + measures) - location và time JOIN trong memory
+    # Giới hạn AQI_SNAPSHOT_LOOKBACK_HOURS giờ gần nhất (time_key + partition) thay vì QUALIFY trên toàn bảng
+    dimensions = await get_dimensions()
+    facts = await run_template(
+        "aqi_latest_snapshot",
+        **await dimensions.fact_window(hours=settings.AQI_SNAPSHOT_LOOKBACK_HOURS)
+    )
+
+    # Giữ mọi location trong Dim_Location (tương đương LEFT JOIN), thứ tự theo location_name
+    df = dimensions.attach_locations(facts, keep_all_locations=True)
+    df = await dimensions.attach_time(df)
+    df['aqi'] = df['AQI_TOTAL']
+    
+    if not df.empty:
+        # Serialize theo cột cho toàn bộ snapshot
+        aqi_data = serialize_frame(df, AQI_LATEST_FIELDS)
+
+        # Location chưa có dữ liệu fact - thay bằng dữ liệu mẫu cho location này
+        for i in np.flatnonzero(df['pm2_5'].isna().to_numpy()):
+            aqi_data[i] = get_mock_reading(aqi_data[i])
+
+        # Encode 1 lần cho mọi request - ETag theo nội dung nên refresh mà dữ liệu không đổi vẫn giữ ETag cũ
+        body = orjson.dumps(aqi_data, option=orjson.OPT_SERIALIZE_NUMPY)
+        latest_time = df['time'].max()
+        return AqiSnapshot(
+            readings=aqi_data,
+            body=body,
+            etag=make_etag("aqi_latest", hashlib.sha1(body).hexdigest()),
+            last_modified=None if pd.isna(latest_time) else latest_time.to_pydatetime()
+        )
+    else:
+        raise ValueError("No rows returned from Dim_Location")
+
+def get_mock_reading(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Dữ liệu mẫu cho 1 location chưa có dữ liệu fact (giữ nguyên tọa độ và tên)"""
+    return {
+        'latitude': record['latitude'],
+        'longitude': record['longitude'],
+        'location_name': record['location_name'],
+        'district': record['district'],
+        'time': datetime.now().isoformat(),
+        'pm2_5': max(0, 60 * 0.33 + random.uniform(-5, 5)),
+        'pm10': max(0, 60 * 0.58 + random.uniform(-8, 8)),
+        'temperature_2m': round(28 + random.uniform(-3, 3), 1),
+        'relative_humidity_2m': max(0, min(100, 60 + random.uniform(-15, 15))),
+        'wind_speed_10m': max(0, 3 + random.uniform(-1, 2)),
+        'wind_direction_10m': random.uniform(0, 360),
+        'pressure_msl': 1013.25 + random.uniform(-10, 10),
+        'AQI_TOTAL': max(0, 60 + random.randint(-20, 40)),
+        'aqi': max(0, 60 + random.randint(-20, 40))
+    }
 
 def get_mock_aqi_data() -> List[Dict[str, Any]]:
     """Dữ liệu mẫu cho AQI khi không có dữ liệu thực - ĐẦY ĐỦ 30 LOCATIONS"""
@@ -203,6 +413,7 @@ def get_mock_aqi_data() -> List[Dict[str, Any]]:
 # GET /api/v1/aqi/detail - Lấy chi tiết một điểm cụ thể
 @router.get("/detail")
 async def get_aqi_detail(
+    request: Request,
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude")
 ) -> Dict[str, Any]:
@@ -210,62 +421,28 @@ async def get_aqi_detail(
     Lấy chi tiết AQI cho một điểm cụ thể từ 3 bảng chính
     """
     try:
-        client = get_bigquery_client()
-        
-        # Query từ 3 bảng chính theo mô hình Star Schema
-        query = f"""
-        SELECT
-            l.latitude,
-            l.longitude,
-            l.location_name,
-            l.location_name as district,
-            t.time as time,
-            f.pm2_5,
-            f.pm10,
-            f.temperature_2m,
-            f.relative_humidity_2m,
-            f.wind_speed_10m,
-            f.wind_direction_10m,
-            f.pressure_msl,
-            f.AQI_TOTAL as AQI_TOTAL
-        FROM
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Location` l
-        JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Fact_Weather_AirQuality` f
-        ON
-            l.location_key = f.location_key
-        JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        WHERE
-             ABS(l.latitude - {lat}) < 0.01 
-            AND ABS(l.longitude - {lng}) < 0.01
-            AND t.time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
-        ORDER BY t.time DESC
-        LIMIT 1
-        """
+        # Resolve tọa độ về trạm gần nhất bằng spatial index trong memory
+        station = await resolve_station(lat, lng)
+        if station is None:
+            return get_mock_detail(lat, lng)
+
+        # Chưa có dữ liệu mới của fact kể từ lần trước client nhận -> 304, không query BigQuery
+        etag = await fact_etag("aqi_detail", station['location_key'], hours_ago(24))
+        if etag and is_not_modified(request, etag):
+            return not_modified(etag)
         
-        # Execute query
-        df = client.query(query).to_dataframe()
+        # Filter trực tiếp theo location_key/time_key - không cần JOIN Dim_Location/Dim_Time
+        # Template có tham số: mọi tọa độ gần cùng 1 trạm trong cùng 1 giờ dùng chung 1 BigQuery job
+        dimensions = await get_dimensions()
+        df = await run_template(
+            "aqi_detail",
+            location_key=station['location_key'],
+            **await dimensions.fact_window(hours=24)
+        )
         
         if not df.empty:
-            row = df.iloc[0]
-            return {
-                'latitude': float(row['latitude']),
-                'longitude': float(row['longitude']),
-                'location_name': str(row['location_name']) if pd.notna(row['location_name']) else 'Unknown',
-                'district': str(row['district']) if pd.notna(row['district']) else 'Unknown',
-                'time': row['time'].isoformat() if hasattr(row['time'], 'isoformat') else str(row['time']),
-                'pm2_5': float(row['pm2_5']) if pd.notna(row['pm2_5']) else 0,
-                'pm10': float(row['pm10']) if pd.notna(row['pm10']) else 0,
-                'temperature_2m': float(row['temperature_2m']) if pd.notna(row['temperature_2m']) else 25.0,
-                'relative_humidity_2m': float(row['relative_humidity_2m']) if pd.notna(row['relative_humidity_2m']) else 60.0,
-                'wind_speed_10m': float(row['wind_speed_10m']) if pd.notna(row['wind_speed_10m']) else 5.0,
-                'wind_direction_10m': float(row['wind_direction_10m']) if pd.notna(row['wind_direction_10m']) else 0,
-                'pressure_msl': float(row['pressure_msl']) if pd.notna(row['pressure_msl']) else 1013.25,
-                'AQI_TOTAL': int(row['AQI_TOTAL']) if pd.notna(row['AQI_TOTAL']) else 0
-            }
+            df = await dimensions.attach_time(df)
+            return cached_json(serialize_frame(df.head(1), AQI_DETAIL_FIELDS, constants=station_fields(station))[0], etag)
         else:
             # Fallback về dữ liệu mẫu
             return get_mock_detail(lat, lng)
@@ -298,112 +475,242 @@ def get_mock_detail(lat: float, lng: float) -> Dict[str, Any]:
 # GET /api/v1/aqi/date-range - Lấy dữ liệu theo khoảng thời gian
 @router.get("/date-range")
 async def get_aqi_by_date_range(
+    request: Request,
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
-    limit: int = Query(100, description="Maximum number of records")
+    limit: int = Query(100, ge=1, description="Maximum number of records (chỉ áp dụng cho format=json)"),
+    format: str = Query("json", pattern="^(json|ndjson|arrow)$", description="json | ndjson | arrow - ndjson/arrow stream toàn bộ kết quả, không giới hạn limit")
 ) -> List[Dict[str, Any]]:
     """
     Lấy dữ liệu AQI theo khoảng thời gian từ 3 bảng chính
+    format=ndjson/arrow: stream từng page kết quả BigQuery ngay khi nhận được (export dữ liệu dài hạn)
     """
     try:
-        client = get_bigquery_client()
-        
-        # Query từ 3 bảng chính theo mô hình Star Schema
-        query = f"""
-        SELECT
-            l.latitude,
-            l.longitude,
-            l.location_name,
-            l.location_name as district,
-            t.time as time,
-            f.pm2_5,
-            f.pm10,
-            f.temperature_2m,
-            f.relative_humidity_2m,
-            f.wind_speed_10m,
-            f.AQI_TOTAL as AQI_TOTAL
-        FROM
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Location` l
-        JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Fact_Weather_AirQuality` f
-        ON
-            l.location_key = f.location_key
-        JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        WHERE
-             DATE(t.time) BETWEEN '{start_date}' AND '{end_date}'
-            AND f.AQI_TOTAL IS NOT NULL
-        ORDER BY t.time DESC
-        LIMIT {limit}
-        """
-        
-        # Execute query
-        df = client.query(query).to_dataframe()
+        # Chuẩn hoá tham số trước khi gắn vào query template
+        params = {'start_date': normalize_date(start_date), 'end_date': normalize_date(end_date)}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date/end_date must be YYYY-MM-DD")
+
+    # Khoảng ngày không có dữ liệu mới kể từ lần trước -> 304, không query/stream lại
+    etag = await fact_etag("aqi_date_range", params['start_date'], params['end_date'], limit, format)
+    if etag and is_not_modified(request, etag):
+        return not_modified(etag)
+
+    if format != "json":
+        # Stream không giới hạn số record
+        return await stream_query_response("aqi_date_range_export", params, format, AQI_RANGE_FIELDS, etag=etag)
+
+    try:
+        # Execute query - kết quả Arrow (Storage Read API), serialize trực tiếp không qua pandas
+        table = await run_template_arrow("aqi_date_range", limit=limit, **params)
         
-        if not df.empty:
-            aqi_data = []
-            for _, row in df.iterrows():
-                aqi_data.append({
-                    'latitude': float(row['latitude']),
-                    'longitude': float(row['longitude']),
-                    'location_name': str(row['location_name']) if pd.notna(row['location_name']) else 'Unknown',
-                    'district': str(row['district']) if pd.notna(row['district']) else 'Unknown',
-                    'time': row['time'].isoformat() if hasattr(row['time'], 'isoformat') else str(row['time']),
-                    'pm2_5': float(row['pm2_5']) if pd.notna(row['pm2_5']) else 0,
-                    'pm10': float(row['pm10']) if pd.notna(row['pm10']) else 0,
-                    'temperature_2m': float(row['temperature_2m']) if pd.notna(row['temperature_2m']) else 25.0,
-                    'relative_humidity_2m': float(row['relative_humidity_2m']) if pd.notna(row['relative_humidity_2m']) else 60.0,
-                    'wind_speed_10m': float(row['wind_speed_10m']) if pd.notna(row['wind_speed_10m']) else 5.0,
-                    'AQI_TOTAL': int(row['AQI_TOTAL']) if pd.notna(row['AQI_TOTAL']) else 0
-                })
-            
-            return aqi_data
+        if table.num_rows > 0:
+            # Trả về bytes orjson trực tiếp - bỏ qua jsonable_encoder cho hàng nghìn records
+            return cached_json(serialize_table(table, AQI_RANGE_FIELDS), etag)
         else:
-            return []
+            return cached_json([], etag)
             
     except Exception as e:
         print(f"❌ AQI Date Range API error: {e}")
         return []
 
+async def stream_query_response(
+    template: str,
+    params: Dict[str, Any],
+    format: str,
+    fields: Dict[str, FieldSpec],
+    etag: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Stream kết quả query template theo từng Arrow RecordBatch dưới dạng NDJSON hoặc Arrow IPC
+    Batch đọc qua Storage Read API khi có (fallback từng page REST)
+    Memory phẳng và time-to-first-byte nhanh cho các export lớn
+    """
+    headers = validator_headers(etag) if etag else None
+    try:
+        rows = await run_template_pages(template, **params)
+    except Exception as e:
+        print(f"❌ AQI Stream API error: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if format == "arrow":
+        return StreamingResponse(
+            iter_arrow_ipc(iter_arrow_batches(rows)),
+            media_type="application/vnd.apache.arrow.stream",
+            headers=headers
+        )
+
+    return StreamingResponse(
+        iter_ndjson(iter_arrow_batches(rows), fields),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
+
+# uint8 / png: byte 0..254 tương ứng AQI 0..AQI_GRID_SCALE
+AQI_GRID_SCALE = 500
+
+GRID_MEDIA_TYPES = {
+    "uint8": "application/octet-stream",
+    "float16": "application/octet-stream",
+    "png": "image/png",
+    "json": "application/json",
+}
+
+def encode_aqi_grid(readings: List[Dict[str, Any]], bounds: GridBounds, width: int, height: int, power: float, format: str) -> bytes:
+    """Nội suy IDW AQI của các trạm lên lưới và encode theo format (chạy ngoài event loop)"""
+    lats, lngs = grid_axes(bounds, width, height)
+    grid = idw_grid(
+        [r['latitude'] for r in readings],
+        [r['longitude'] for r in readings],
+        [r['aqi'] for r in readings],
+        lats, lngs, power=power
+    )
+
+    if format == "float16":
+        return grid.astype("<f2").tobytes()
+    if format == "json":
+        # orjson ghi NaN thành null
+        return orjson.dumps({
+            "bounds": str(bounds),
+            "width": width,
+            "height": height,
+            "values": np.round(grid, 1),
+        }, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    levels = quantize_uint8(grid, AQI_GRID_SCALE)
+    if format == "png":
+        # Gray + alpha: ô không có dữ liệu trong suốt
+        alpha = np.where(levels == NO_DATA_UINT8, 0, 255).astype(np.uint8)
+        return encode_png(np.dstack([levels, alpha]))
+    return levels.tobytes()
+
+# GET /api/v1/aqi/grid - Bề mặt AQI nội suy (IDW) trên lưới lat/lng
+@router.get("/grid")
+async def get_aqi_grid(
+    request: Request,
+    width: int = Query(settings.AQI_GRID_SIZE, ge=2, le=settings.AQI_GRID_MAX_SIZE, description="Số cột của lưới"),
+    height: Optional[int] = Query(None, ge=2, le=settings.AQI_GRID_MAX_SIZE, description="Số hàng (mặc định: ô lưới vuông theo km)"),
+    bounds: Optional[str] = Query(None, description="lat_min,lng_min,lat_max,lng_max (mặc định AQI_GRID_BOUNDS)"),
+    power: float = Query(settings.AQI_GRID_IDW_POWER, gt=0, le=8, description="Số mũ IDW"),
+    format: str = Query("uint8", pattern="^(uint8|float16|png|json)$", description="uint8 | float16 | png | json")
+) -> Response:
+    """
+    AQI nội suy IDW từ snapshot mới nhất (/aqi/latest) trên lưới height x width, hàng đầu là phía bắc
+    - uint8: 1 byte/ô, AQI = byte * X-Grid-Scale / 254, 255 = không có dữ liệu
+    - float16: 2 byte/ô little-endian
+    - png: ảnh gray + alpha cùng mã hoá uint8
+    Kết quả cache theo snapshot và tham số - mọi client nhận cùng 1 bề mặt
+    """
+    try:
+        grid_bounds = GridBounds.parse(bounds or settings.AQI_GRID_BOUNDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    height = height or min(grid_bounds.aspect_height(width), settings.AQI_GRID_MAX_SIZE)
+
+    snapshot = await latest_snapshot()
+    readings = snapshot.readings if snapshot is not None else get_mock_aqi_data()
+    key = (format, grid_bounds, width, height, power)
+    headers = {
+        "X-Grid-Width": str(width),
+        "X-Grid-Height": str(height),
+        "X-Grid-Bounds": str(grid_bounds),
+        "X-Grid-Scale": str(AQI_GRID_SCALE),
+    }
+
+    # Client đã có lưới của snapshot này -> 304, không nội suy / encode lại
+    etag = make_etag("aqi_grid", snapshot.etag, *key) if snapshot is not None else None
+    if etag and is_not_modified(request, etag, snapshot.last_modified):
+        return not_modified(etag, snapshot.last_modified)
+
+    body = aqi_grid_cache.get(readings, key)
+    if body is None:
+        body = await asyncio.to_thread(encode_aqi_grid, readings, grid_bounds, width, height, power, format)
+        aqi_grid_cache.put(readings, key, body)
+
+    if etag is None:
+        return Response(content=body, media_type=GRID_MEDIA_TYPES[format], headers=headers)
+    return cached_bytes(body, GRID_MEDIA_TYPES[format], etag, snapshot.last_modified, headers=headers)
+
+def snapshot_version(readings: List[Dict[str, Any]]) -> str:
+    """
+    Version theo nội dung snapshot (tọa độ + AQI các trạm): refresh mà dữ liệu không đổi thì giữ version,
+    giờ dữ liệu mới -> version mới. Ổn định qua các lần restart nên tile trên đĩa vẫn dùng lại được
+    """
+    version = snapshot_versions.get(readings, "version")
+    if version is None:
+        points = np.array([[r['latitude'], r['longitude'], r['aqi']] for r in readings], dtype=float)
+        version = hashlib.sha1(points.tobytes()).hexdigest()[:16]
+        snapshot_versions.put(readings, "version", version)
+    return version
+
+def load_or_render_tile(version: str, z: int, x: int, y: int, readings: Optional[List[Dict[str, Any]]]) -> bytes:
+    """Tile từ cache đĩa, chưa có thì render và lưu (chạy ngoài event loop)"""
+    tile = aqi_tile_cache.get(version, z, x, y)
+    if tile is not None:
+        return tile
+
+    if readings is None:
+        tile = empty_tile()
+    else:
+        tile = render_aqi_tile(
+            z, x, y,
+            [r['latitude'] for r in readings],
+            [r['longitude'] for r in readings],
+            [r['aqi'] for r in readings],
+            coverage=GridBounds.parse(settings.AQI_GRID_BOUNDS),
+            power=settings.AQI_GRID_IDW_POWER,
+            alpha=settings.AQI_TILE_OPACITY
+        )
+    aqi_tile_cache.put(version, z, x, y, tile)
+    return tile
+
+# GET /api/v1/aqi/tiles/{z}/{x}/{y}.png - Tile overlay AQI cho bản đồ (XYZ / Web Mercator)
+@router.get("/tiles/{z}/{x}/{y}.png")
+async def get_aqi_tile(
+    request: Request,
+    z: int = Path(..., ge=0, le=settings.AQI_TILE_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0)
+) -> Response:
+    """
+    Tile PNG 256x256 của bề mặt AQI nội suy (cùng IDW với /grid), tô màu theo color ramp của heatmap
+    Ngoài vùng AQI_GRID_BOUNDS trong suốt. Tile cache theo version snapshot trong memory và trên đĩa
+    ETag theo version snapshot: bản đồ pan/zoom lại với tile đã có -> 304
+    """
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    readings = None
+    version = EMPTY_TILE_VERSION
+    if intersects(tile_bounds(z, x, y), GridBounds.parse(settings.AQI_GRID_BOUNDS)):
+        readings = await latest_readings()
+        version = snapshot_version(readings)
+
+    etag = make_etag("aqi_tile", version, z, x, y)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    tile = aqi_tile_cache.get(version, z, x, y, memory_only=True)
+    if tile is None:
+        tile = await asyncio.to_thread(load_or_render_tile, version, z, x, y, readings)
+    return cached_bytes(tile, "image/png", etag)
+
 # GET /api/v1/aqi/locations - Lấy danh sách locations
 @router.get("/locations")
-async def get_aqi_locations() -> List[Dict[str, Any]]:
+async def get_aqi_locations(request: Request) -> List[Dict[str, Any]]:
     """
     Lấy danh sách tất cả các điểm quan trắc AQI từ bảng Dim_Location
+    Trả về từ dimension cache trong memory - không query BigQuery mỗi request
+    ETag theo lần load dimension cache
     """
     try:
-        client = get_bigquery_client()
-        
-        # Query từ bảng Dim_Location để lấy tất cả 30 điểm quận huyện
-        query = """
-        SELECT
-            location_key,
-            location_name,
-            latitude,
-            longitude
-        FROM
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Location`
-        ORDER BY location_name
-        """
-        
-        # Execute query
-        df = client.query(query).to_dataframe()
+        dimensions = await get_dimensions()
         
-        if not df.empty:
-            locations = []
-            for _, row in df.iterrows():
-                locations.append({
-                    'location_key': int(row['location_key']) if pd.notna(row['location_key']) else 0,
-                    'location_name': str(row['location_name']) if pd.notna(row['location_name']) else 'Unknown',
-                    'latitude': float(row['latitude']) if pd.notna(row['latitude']) else 0.0,
-                    'longitude': float(row['longitude']) if pd.notna(row['longitude']) else 0.0,
-                    'district': str(row['location_name']) if pd.notna(row['location_name']) else 'Unknown'  # Fallback
-                })
-            
-            print(f"✅ API Locations: Lấy được {len(locations)} điểm từ Dim_Location")
-            return locations
+        if not dimensions.locations_df.empty:
+            etag = make_etag("aqi_locations", dimensions.loaded_at)
+            if is_not_modified(request, etag):
+                return not_modified(etag)
+            return cached_json(serialize_frame(dimensions.locations_df, LOCATION_FIELDS), etag)
         else:
             print("⚠️ API Locations: Không có dữ liệu từ Dim_Location, fallback về mock data")
             # Fallback về dữ liệu mẫu
@@ -430,46 +737,22 @@ def get_mock_locations() -> List[Dict[str, Any]]:
 
 # GET /api/v1/aqi/stats - Lấy thống kê tổng quan
 @router.get("/stats")
-async def get_aqi_stats() -> Dict[str, Any]:
+async def get_aqi_stats(request: Request) -> Dict[str, Any]:
     """
     Lấy thống kê tổng quan về AQI từ 3 bảng chính
     """
     try:
-        client = get_bigquery_client()
-        
-        # Query từ 3 bảng chính theo mô hình Star Schema để lấy thống kê
-        query = """
-        SELECT
-            COUNT(DISTINCT l.location_key) as total_locations,
-            COUNT(*) as total_records,
-            AVG(f.AQI_TOTAL) as avg_aqi,
-            MIN(f.AQI_TOTAL) as min_aqi,
-            MAX(f.AQI_TOTAL) as max_aqi,
-            AVG(f.pm2_5) as avg_pm2_5,
-            AVG(f.pm10) as avg_pm10,
-            AVG(f.temperature_2m) as avg_temperature,
-            AVG(f.relative_humidity_2m) as avg_humidity
-        FROM
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Location` l
-        JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Fact_Weather_AirQuality` f
-        ON
-            l.location_key = f.location_key
-        JOIN
-            `invertible-now-462103-m3.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        WHERE
-             t.time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
-            AND f.AQI_TOTAL IS NOT NULL
-        """
-        
-        # Execute query
-        df = client.query(query).to_dataframe()
+        # Cửa sổ 24h chưa dịch (cùng giờ) và fact chưa có dữ liệu mới -> 304, không query BigQuery
+        etag = await fact_etag("aqi_stats", hours_ago(24))
+        if etag and is_not_modified(request, etag):
+            return not_modified(etag)
+
+        # Template có tham số: mốc 24h làm tròn theo giờ (dùng được result cache), lọc trên cột partition khi bảng đã partition
+        df = await run_template("aqi_stats", since=hours_ago(24))
         
         if not df.empty:
             row = df.iloc[0]
-            return {
+            return cached_json({
                 'total_locations': int(row['total_locations']) if pd.notna(row['total_locations']) else 0,
                 'total_records': int(row['total_records']) if pd.notna(row['total_records']) else 0,
                 'avg_aqi': round(float(row['avg_aqi']), 1) if pd.notna(row['avg_aqi']) else 0,
@@ -480,7 +763,7 @@ async def get_aqi_stats() -> Dict[str, Any]:
                 'avg_temperature': round(float(row['avg_temperature']), 1) if pd.notna(row['avg_temperature']) else 0,
                 'avg_humidity': round(float(row['avg_humidity']), 1) if pd.notna(row['avg_humidity']) else 0,
                 'last_updated': datetime.now().isoformat()
-            }
+            }, etag)
         else:
             # Fallback về dữ liệu mẫu
             return get_mock_stats()
@@ -511,15 +794,13 @@ async def test_three_table_connection() -> Dict[str, Any]:
     Test kết nối với 3 bảng chính: Dim_Location, Dim_Time, Fact_Weather_AirQuality
     """
     try:
-        client = get_bigquery_client()
-        
         # Test 1: Kiểm tra bảng Dim_Location
         locations_query = """
         SELECT COUNT(*) as total_locations
         FROM `invertible-now-462103-m3.weather_and_air_dataset.Dim_Location`
         """
         
-        locations_df = client.query(locations_query).to_dataframe()
+        locations_df = await run_query(locations_query, name="test_connection")
         total_locations = int(locations_df.iloc[0]['total_locations']) if not locations_df.empty else 0
         
         # Test 2: Kiểm tra bảng Dim_Time
@@ -528,7 +809,7 @@ async def test_three_table_connection() -> Dict[str, Any]:
         FROM `invertible-now-462103-m3.weather_and_air_dataset.Dim_Time`
         """
         
-        time_df = client.query(time_query).to_dataframe()
+        time_df = await run_query(time_query, name="test_connection")
         total_time_records = int(time_df.iloc[0]['total_time_records']) if not time_df.empty else 0
         
         # Test 3: Kiểm tra bảng Fact_Weather_AirQuality
@@ -537,7 +818,7 @@ async def test_three_table_connection() -> Dict[str, Any]:
         FROM `invertible-now-462103-m3.weather_and_air_dataset.Fact_Weather_AirQuality`
         """
         
-        fact_df = client.query(fact_query).to_dataframe()
+        fact_df = await run_query(fact_query, name="test_connection")
         total_fact_records = int(fact_df.iloc[0]['total_fact_records']) if not fact_df.empty else 0
         
         # Test 4: Kiểm tra JOIN giữa 3 bảng
@@ -557,7 +838,7 @@ async def test_three_table_connection() -> Dict[str, Any]:
             f.time_key = t.time_key
         """
         
-        join_df = client.query(join_query).to_dataframe()
+        join_df = await run_query(join_query, name="test_connection")
         joined_locations = int(join_df.iloc[0]['joined_locations']) if not join_df.empty else 0
         total_joined_records = int(join_df.iloc[0]['total_joined_records']) if not join_df.empty else 0
         
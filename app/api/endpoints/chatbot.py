@@ -2,13 +2,15 @@
 AI Chatbot API Endpoints
 Các endpoint liên quan đến chatbot thông minh cho chất lượng không khí
 """
+from __future__ import annotations
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import pandas as pd
+from app.core.lazy import lazy_import
 import re
 from datetime import datetime, timedelta
 from app.db.bigquery import get_bigquery_client
+pd = lazy_import("pandas")
 
 router = APIRouter()
 
@@ -2,19 +2,74 @@
 Forecast API Endpoints - LSTM Model Integration
 Các endpoint liên quan đến dự báo chất lượng không khí sử dụng mô hình LSTM
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict, Any, Optional
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+from fastapi import APIRouter, Query, Request
+from typing import Dict, Any
+from app.core.lazy import lazy_import
 from datetime import datetime, timedelta
-from app.db.bigquery import get_bigquery_client
+import hashlib
+import orjson
+from app.api.endpoints.aqi import fact_etag
+from app.core.http_cache import cached_bytes, cached_json, is_not_modified, make_etag, not_modified
+from app.core.serialization import FieldSpec, serialize_frame
+from app.db.queries import bind, hours_ago, run_template
+from app.db.dimensions import resolve_station, get_dimensions
+from app.db.rollups import daily_rollup_query, days_ago_start, fresh_rollup_version, run_with_rollup
+from app.ml.drift import get_drift_monitor
+from app.ml.forecast_store import get_forecast_store
 import random
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
 
 router = APIRouter()
 
+# Schema serialize: field -> (cột nguồn, kiểu, giá trị mặc định khi NULL)
+HOURLY_FIELDS: Dict[str, FieldSpec] = {
+    'time': ('time', 'timestamp', None),
+    'aqi': ('aqi', 'int', 0),
+    'pm2_5': ('pm2_5', 'float', 0),
+    'pm10': ('pm10', 'float', 0),
+    'temperature': ('temperature_2m', 'float', 25.0),
+    'humidity': ('relative_humidity_2m', 'float', 60.0),
+    'wind_speed': ('wind_speed_10m', 'float', 5.0),
+}
+
+DAILY_FIELDS: Dict[str, FieldSpec] = {
+    'date': ('date', 'date', None),
+    'avg_aqi': ('avg_aqi', 'int', 0),
+    'max_aqi': ('max_aqi', 'int', 0),
+    'min_aqi': ('min_aqi', 'int', 0),
+    'avg_pm2_5': ('avg_pm2_5', 'float', 0),
+    'avg_pm10': ('avg_pm10', 'float', 0),
+    'avg_temperature': ('avg_temperature', 'float', 25.0),
+    'avg_humidity': ('avg_humidity', 'float', 60.0),
+    'avg_wind_speed': ('avg_wind_speed', 'float', 5.0),
+}
+
+TRENDS_FIELDS: Dict[str, FieldSpec] = {
+    'date': ('date', 'date', None),
+    'avg_aqi': ('avg_aqi', 'int', 0),
+    'avg_pm2_5': ('avg_pm2_5', 'float', 0),
+    'avg_pm10': ('avg_pm10', 'float', 0),
+    'avg_temperature': ('avg_temperature', 'float', 25.0),
+    'avg_humidity': ('avg_humidity', 'float', 60.0),
+    'data_points': ('data_points', 'int', 0),
+}
+
+def station_location(lat: float, lng: float, station: Dict[str, Any]) -> Dict[str, Any]:
+    """Block "location" của response - tọa độ request kèm trạm gần nhất đã resolve"""
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "name": station['location_name'],
+        "district": station['location_name'],
+        "location_key": station['location_key']
+    }
+
 # GET /api/v1/forecast/hourly - Dự báo theo giờ (24 giờ tới)
 @router.get("/hourly")
 async def get_hourly_forecast(
+    request: Request,
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude")
 ) -> Dict[str, Any]:
@@ -22,68 +77,60 @@ async def get_hourly_forecast(
     Lấy dự báo theo giờ trong 24 giờ tới
     """
     try:
-        client = get_bigquery_client()
+        # Resolve tọa độ về trạm gần nhất bằng spatial index trong memory
+        station = await resolve_station(lat, lng)
+        if station is None:
+            return get_mock_hourly_forecast(lat, lng)
         
-        # Query từ 3 bảng chính theo mô hình Star Schema
-        query = f"""
-        SELECT
-            t.time as time,
-            f.pm2_5,
-            f.pm10,
-            f.temperature_2m,
-            f.relative_humidity_2m,
-            f.wind_speed_10m,
-            f.wind_direction_10m,
-            f.pressure_msl,
-            f.AQI_TOTAL as aqi
-        FROM
-            `{client.project}.weather_and_air_dataset.Dim_Location` l
-        JOIN
-            `{client.project}.weather_and_air_dataset.Fact_Weather_AirQuality` f
-        ON
-            l.location_key = f.location_key
-        JOIN
-            `{client.project}.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        WHERE
-             ABS(l.latitude - {lat}) < 0.01 
-            AND ABS(l.longitude - {lng}) < 0.01
-            AND t.time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
-        ORDER BY t.time ASC
-        LIMIT 24
-        """
+        # Dự báo LSTM tính sẵn cho toàn bộ trạm sau mỗi lần ingest - chỉ lookup theo location_key
+        store = get_forecast_store()
+        forecast_df = store.hourly(station['location_key'], hours=24)
+        if forecast_df is not None:
+            # Cùng lần refresh store -> cùng dự báo
+            etag = make_etag("forecast_hourly", lat, lng, store.model_version, store.generated_at)
+            if is_not_modified(request, etag):
+                return not_modified(etag)
+            hourly_data = serialize_frame(forecast_df, HOURLY_FIELDS, constants={
+                'location_name': station['location_name'],
+                'district': station['location_name']
+            })
+            return cached_json({
+                "forecast_type": "hourly",
+                "model": "lstm",
+                "model_version": store.model_version,
+                "location": station_location(lat, lng, station),
+                "data": hourly_data,
+                "total_hours": len(hourly_data)
+            }, etag)
+
+        # Fact chưa có dữ liệu mới kể từ lần trước client nhận -> 304, không query BigQuery
+        etag = await fact_etag("forecast_hourly_raw", lat, lng, station['location_key'], hours_ago(7 * 24))
+        if etag and is_not_modified(request, etag):
+            return not_modified(etag)
         
-        # Execute query
-        df = client.query(query).to_dataframe()
+        # Chỉ query bảng fact theo location_key/time_key - time JOIN trong memory từ dimension cache
+        dimensions = await get_dimensions()
+        df = await run_template(
+            "forecast_hourly",
+            location_key=station['location_key'],
+            **await dimensions.fact_window(hours=7 * 24)
+        )
         
         if not df.empty:
-            # Xử lý dữ liệu từ 3 bảng chính
-            hourly_data = []
-            for _, row in df.iterrows():
-                hourly_data.append({
-                    'time': row['time'].isoformat() if hasattr(row['time'], 'isoformat') else str(row['time']),
-                    'aqi': int(row['aqi']) if pd.notna(row['aqi']) else 0,
-                    'pm2_5': float(row['pm2_5']) if pd.notna(row['pm2_5']) else 0,
-                    'pm10': float(row['pm10']) if pd.notna(row['pm10']) else 0,
-                    'temperature': float(row['temperature_2m']) if pd.notna(row['temperature_2m']) else 25.0,
-                    'humidity': float(row['relative_humidity_2m']) if pd.notna(row['relative_humidity_2m']) else 60.0,
-                    'wind_speed': float(row['wind_speed_10m']) if pd.notna(row['wind_speed_10m']) else 5.0,
-                    'location_name': f'Điểm {lat:.3f}, {lng:.3f}',
-                    'district': 'Hà Nội'
-                })
+            df = await dimensions.attach_time(df)
+
+            # Serialize theo cột
+            hourly_data = serialize_frame(df, HOURLY_FIELDS, constants={
+                'location_name': station['location_name'],
+                'district': station['location_name']
+            })
             
-            return {
+            return cached_json({
                 "forecast_type": "hourly",
-                "location": {
-                    "latitude": lat,
-                    "longitude": lng,
-                    "name": f'Điểm {lat:.3f}, {lng:.3f}',
-                    "district": "Hà Nội"
-                },
+                "location": station_location(lat, lng, station),
                 "data": hourly_data,
                 "total_hours": len(hourly_data)
-            }
+            }, etag)
         else:
             # Fallback về dữ liệu mẫu nếu không có dữ liệu thực
             return get_mock_hourly_forecast(lat, lng)
@@ -131,6 +178,7 @@ def get_mock_hourly_forecast(lat: float, lng: float) -> Dict[str, Any]:
 # GET /api/v1/forecast/daily - Dự báo theo ngày (7 ngày tới)
 @router.get("/daily")
 async def get_daily_forecast(
+    request: Request,
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude")
 ) -> Dict[str, Any]:
@@ -138,72 +186,57 @@ async def get_daily_forecast(
     Lấy dự báo theo ngày trong 7 ngày tới
     """
     try:
-        client = get_bigquery_client()
+        # Resolve tọa độ về trạm gần nhất bằng spatial index trong memory
+        station = await resolve_station(lat, lng)
+        if station is None:
+            return get_mock_daily_forecast(lat, lng)
         
-        # Query từ 3 bảng chính theo mô hình Star Schema
-        query = f"""
-        SELECT
-            DATE(t.time) as date,
-            AVG(f.pm2_5) as avg_pm2_5,
-            AVG(f.pm10) as avg_pm10,
-            AVG(f.temperature_2m) as avg_temperature,
-            AVG(f.relative_humidity_2m) as avg_humidity,
-            AVG(f.wind_speed_10m) as avg_wind_speed,
-            AVG(f.AQI_TOTAL) as avg_aqi,
-            MAX(f.AQI_TOTAL) as max_aqi,
-            MIN(f.AQI_TOTAL) as min_aqi,
-            COUNT(*) as data_points
-        FROM
-            `{client.project}.weather_and_air_dataset.Dim_Location` l
-        JOIN
-            `{client.project}.weather_and_air_dataset.Fact_Weather_AirQuality` f
-        ON
-            l.location_key = f.location_key
-        JOIN
-            `{client.project}.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        WHERE
-             ABS(l.latitude - {lat}) < 0.01 
-            AND ABS(l.longitude - {lng}) < 0.01
-            AND t.time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
-        GROUP BY DATE(t.time)
-        ORDER BY date ASC
-        LIMIT 7
-        """
+        # Dự báo LSTM tính sẵn (gộp theo ngày) - chỉ lookup theo location_key
+        store = get_forecast_store()
+        forecast_df = store.daily(station['location_key'])
+        if forecast_df is not None:
+            etag = make_etag("forecast_daily", lat, lng, store.model_version, store.generated_at)
+            if is_not_modified(request, etag):
+                return not_modified(etag)
+            daily_data = serialize_frame(forecast_df, DAILY_FIELDS, constants={
+                'location_name': station['location_name'],
+                'district': station['location_name']
+            })
+            return cached_json({
+                "forecast_type": "daily",
+                "model": "lstm",
+                "model_version": store.model_version,
+                "location": station_location(lat, lng, station),
+                "data": daily_data,
+                "total_days": len(daily_data)
+            }, etag)
+
+        # Routing quyết định trước để ETag có version agg_daily khi body đọc từ rollup
+        rollup_version = await fresh_rollup_version()
+        etag = await fact_etag("forecast_daily_raw", lat, lng, station['location_key'], days_ago_start(7), rollup_version)
+        if etag and is_not_modified(request, etag):
+            return not_modified(etag)
         
-        # Execute query
-        df = client.query(query).to_dataframe()
+        # Query routing: đọc agg_daily nếu có, fallback về query raw (fact JOIN Dim_Time)
+        df = await run_with_rollup(
+            daily_rollup_query(station['location_key'], days=7, limit=7),
+            bind("forecast_daily_raw", location_key=station['location_key'], since=days_ago_start(7)),
+            use_rollup=rollup_version is not None
+        )
         
         if not df.empty:
-            # Xử lý dữ liệu thực từ BigQuery
-            daily_data = []
-            for _, row in df.iterrows():
-                daily_data.append({
-                    'date': row['date'].isoformat() if hasattr(row['date'], 'isoformat') else str(row['date']),
-                    'avg_aqi': int(row['avg_aqi']) if pd.notna(row['avg_aqi']) else 0,
-                    'max_aqi': int(row['max_aqi']) if pd.notna(row['max_aqi']) else 0,
-                    'min_aqi': int(row['min_aqi']) if pd.notna(row['min_aqi']) else 0,
-                    'avg_pm2_5': float(row['avg_pm2_5']) if pd.notna(row['avg_pm2_5']) else 0,
-                    'avg_pm10': float(row['avg_pm10']) if pd.notna(row['avg_pm10']) else 0,
-                    'avg_temperature': float(row['avg_temperature']) if pd.notna(row['avg_temperature']) else 25.0,
-                    'avg_humidity': float(row['avg_humidity']) if pd.notna(row['avg_humidity']) else 60.0,
-                    'avg_wind_speed': float(row['avg_wind_speed']) if pd.notna(row['avg_wind_speed']) else 5.0,
-                    'location_name': row['location_name'] if pd.notna(row['location_name']) else 'Unknown',
-                    'district': row['district'] if pd.notna(row['district']) else 'Unknown'
-                })
+            # Serialize theo cột - tên location lấy từ trạm đã resolve
+            daily_data = serialize_frame(df, DAILY_FIELDS, constants={
+                'location_name': station['location_name'],
+                'district': station['location_name']
+            })
             
-            return {
+            return cached_json({
                 "forecast_type": "daily",
-                "location": {
-                    "latitude": lat,
-                    "longitude": lng,
-                    "name": daily_data[0]['location_name'] if daily_data else "Unknown",
-                    "district": daily_data[0]['district'] if daily_data else "Unknown"
-                },
+                "location": station_location(lat, lng, station),
                 "data": daily_data,
                 "total_days": len(daily_data)
-            }
+            }, etag)
         else:
             # Fallback về dữ liệu mẫu nếu không có dữ liệu thực
             return get_mock_daily_forecast(lat, lng)
@@ -250,66 +283,53 @@ def get_mock_daily_forecast(lat: float, lng: float) -> Dict[str, Any]:
         "total_days": 7
     }
 
+# GET /api/v1/forecast/drift - Sai số dự báo đã phục vụ so với giá trị thực
+@router.get("/drift")
+async def get_forecast_drift(request: Request) -> Dict[str, Any]:
+    """
+    MAE/MAPE/R² rolling theo trạm của model đang phục vụ và trạng thái yêu cầu retrain
+    ETag theo nội dung metric (thay đổi khi có giá trị thực mới được so với dự báo)
+    """
+    body = orjson.dumps(get_drift_monitor().snapshot(), option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    etag = make_etag("forecast_drift", hashlib.sha1(body).hexdigest())
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return cached_bytes(body, "application/json", etag)
+
 # GET /api/v1/forecast/trends - Phân tích xu hướng
 @router.get("/trends")
 async def get_aqi_trends(
+    request: Request,
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude"),
-    days: int = Query(7, description="Number of days to analyze")
+    days: int = Query(7, ge=1, le=365, description="Number of days to analyze")
 ) -> Dict[str, Any]:
     """
     Phân tích xu hướng chất lượng không khí trong N ngày qua
     """
     try:
-        client = get_bigquery_client()
-        
-        # Query từ 3 bảng chính theo mô hình Star Schema
-        query = f"""
-        SELECT
-            DATE(t.time) as date,
-            AVG(f.pm2_5) as avg_pm2_5,
-            AVG(f.pm10) as avg_pm10,
-            AVG(f.temperature_2m) as avg_temperature,
-            AVG(f.relative_humidity_2m) as avg_humidity,
-            COUNT(*) as data_points,
-            AVG(f.AQI_TOTAL) as avg_aqi
-        FROM
-            `{client.project}.weather_and_air_dataset.Dim_Location` l
-        JOIN
-            `{client.project}.weather_and_air_dataset.Fact_Weather_AirQuality` f
-        ON
-            l.location_key = f.location_key
-        JOIN
-            `{client.project}.weather_and_air_dataset.Dim_Time` t
-        ON
-            f.time_key = t.time_key
-        WHERE
-             ABS(l.latitude - {lat}) < 0.01 
-            AND ABS(l.longitude - {lng}) < 0.01
-            AND t.time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
-        GROUP BY DATE(t.time)
-        ORDER BY date ASC
-        """
+        # Resolve tọa độ về trạm gần nhất bằng spatial index trong memory
+        station = await resolve_station(lat, lng)
+        if station is None:
+            return get_mock_trends(lat, lng, days)
+
+        # Cửa sổ N ngày chưa dịch, fact và agg_daily (khi đọc rollup) chưa có dữ liệu mới -> 304, không query BigQuery
+        rollup_version = await fresh_rollup_version()
+        etag = await fact_etag("forecast_trends", lat, lng, station['location_key'], days, days_ago_start(days), rollup_version)
+        if etag and is_not_modified(request, etag):
+            return not_modified(etag)
         
-        # Execute query
-        df = client.query(query).to_dataframe()
+        # Query routing: đọc agg_daily nếu có, fallback về query raw (fact JOIN Dim_Time)
+        df = await run_with_rollup(
+            daily_rollup_query(station['location_key'], days=days),
+            bind("forecast_trends_raw", location_key=station['location_key'], since=days_ago_start(days)),
+            use_rollup=rollup_version is not None
+        )
         
         if not df.empty:
-            # Xử lý dữ liệu từ 3 bảng chính
-            trends_data = []
-            total_data_points = 0
-            
-            for _, row in df.iterrows():
-                trends_data.append({
-                    'date': row['date'].isoformat() if hasattr(row['date'], 'isoformat') else str(row['date']),
-                    'avg_aqi': int(row['avg_aqi']) if pd.notna(row['avg_aqi']) else 0,
-                    'avg_pm2_5': float(row['avg_pm2_5']) if pd.notna(row['avg_pm2_5']) else 0,
-                    'avg_pm10': float(row['avg_pm10']) if pd.notna(row['avg_pm10']) else 0,
-                    'avg_temperature': float(row['avg_temperature']) if pd.notna(row['avg_temperature']) else 25.0,
-                    'avg_humidity': float(row['avg_humidity']) if pd.notna(row['avg_humidity']) else 60.0,
-                    'data_points': int(row['data_points']) if pd.notna(row['data_points']) else 0
-                })
-                total_data_points += int(row['data_points']) if pd.notna(row['data_points']) else 0
+            # Serialize theo cột
+            trends_data = serialize_frame(df, TRENDS_FIELDS)
+            total_data_points = sum(d['data_points'] for d in trends_data)
             
             # Tính toán xu hướng
             if len(trends_data) > 1:
@@ -321,14 +341,9 @@ async def get_aqi_trends(
                 trend_direction = "không đủ dữ liệu"
                 trend_percentage = 0
             
-            return {
+            return cached_json({
                 "trends_type": "aqi_analysis",
-                "location": {
-                    "latitude": lat,
-                    "longitude": lng,
-                    "name": "Trạm Cầu Giấy",
-                    "district": "Cầu Giấy"
-                },
+                "location": station_location(lat, lng, station),
                 "analysis_period": f"{days} ngày",
                 "total_data_points": total_data_points,
                 "trend_direction": trend_direction,
@@ -339,7 +354,7 @@ async def get_aqi_trends(
                     "max_aqi": max(d['avg_aqi'] for d in trends_data),
                     "min_aqi": min(d['avg_aqi'] for d in trends_data)
                 }
-            }
+            }, etag)
         else:
             # Fallback về dữ liệu mẫu nếu không có dữ liệu thực
             return get_mock_trends(lat, lng, days)
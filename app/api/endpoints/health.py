@@ -2,11 +2,25 @@
 Health Check Endpoints
 Kiểm tra tình trạng hệ thống và các dependencies
 """
-from fastapi import APIRouter
-from app.db.bigquery import bigquery_health_check
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.core.config import settings
+from app.core.lazy import import_time_profile, startup_report
+from app.db.bigquery import bigquery_health_check, query_stats
+from app.api.endpoints.aqi import latest_aqi_cache
+from app.ml.forecast_engine import get_forecast_engine
+from app.ml.forecast_store import get_forecast_store
 
 router = APIRouter()
 
+# Profile import lạnh của app - chạy subprocess tốn vài giây nên chỉ chạy 1 lần mỗi process
+_import_profile: Optional[Dict[str, Any]] = None
+_import_profile_lock = asyncio.Lock()
+# Đủ cho mọi giá trị top của /debug/startup
+_IMPORT_PROFILE_TOP = 200
+
 @router.get("/health")
 async def detailed_health_check():
     """
@@ -53,4 +67,54 @@ async def readiness_check():
             "ready": False,
             "message": "System not ready - BigQuery connection failed",
             "error": str(e)
-        } 
\ No newline at end of file
+        }
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Thống kê BigQuery job theo từng named query (cache hit, bytes billed, slot, latency)
+    kèm cache snapshot AQI - xem endpoint nào tốn chi phí/latency nhất
+    """
+    queries = query_stats.snapshot()
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "bigquery": {
+            "totals": {
+                "jobs": sum(q["count"] for q in queries.values()),
+                "cache_hits": sum(q["cache_hits"] for q in queries.values()),
+                "bytes_billed": sum(q["bytes_billed"] for q in queries.values()),
+                "estimated_cost_usd": round(sum(q["estimated_cost_usd"] for q in queries.values()), 6),
+                "slot_millis": sum(q["slot_millis"] for q in queries.values())
+            },
+            "queries": queries
+        },
+        "caches": {
+            "latest_aqi_snapshot": latest_aqi_cache.stats(),
+            "forecast_store": get_forecast_store().stats()
+        },
+        "forecast_model": get_forecast_engine().info()
+    }
+
+@router.get("/debug/startup")
+async def startup_profile(
+    top: int = Query(25, ge=1, le=_IMPORT_PROFILE_TOP, description="Số module tốn thời gian nhất")
+):
+    """
+    Thời gian startup của process hiện tại + profile `python -X importtime` của import lạnh `main`
+    Chỉ bật khi STARTUP_PROFILE_ENABLED=true (mặc định tắt) - subprocess chạy tối đa 1 lần mỗi process
+    """
+    global _import_profile
+    if not settings.STARTUP_PROFILE_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    async with _import_profile_lock:
+        if _import_profile is None:
+            _import_profile = await asyncio.to_thread(import_time_profile, "main", _IMPORT_PROFILE_TOP)
+    cached = _import_profile
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "process": startup_report(),
+        "import_profile": {**cached, "top": cached["top"][:top]}
+    }
@@ -0,0 +1,168 @@
+"""
+AQI Engine - Tính chỉ số AQI thành phần và AQI tổng từ nồng độ (vectorized)
+- Bảng breakpoint US EPA (2024) và Việt Nam VN_AQI (QĐ 1459/QĐ-TCMT)
+- Nội suy tuyến tính trên cả mảng: np.searchsorted tìm đoạn breakpoint cho mọi giá trị cùng lúc
+- NowCast 12 giờ cho bụi (PM2.5, PM10): trọng số w = max(c_min / c_max, 0.5) trên cửa sổ trượt
+Nồng độ đầu vào là µg/m³ (như Staging_RawData / Open-Meteo), tự đổi sang ppb/ppm cho bảng EPA
+"""
+from __future__ import annotations
+import functools
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+from app.core.lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+POLLUTANTS = ("pm2_5", "pm10", "o3", "no2", "so2", "co")
+# Bụi dùng NowCast khi tính AQI giờ (EPA và VN_AQI)
+NOWCAST_POLLUTANTS = ("pm2_5", "pm10")
+NOWCAST_HOURS = 12
+AQI_MAX = 500
+
+# µg/m³ -> ppb ở 25°C, 1 atm: ppb = µg/m³ × 24.45 / khối lượng mol
+_MOLAR_VOLUME = 24.45
+_PPB = {"o3": _MOLAR_VOLUME / 48.00, "no2": _MOLAR_VOLUME / 46.01, "so2": _MOLAR_VOLUME / 64.07}
+_PPM_CO = _MOLAR_VOLUME / 28.01 / 1000
+
+class _Table(NamedTuple):
+    """Bảng breakpoint của 1 chất: các đoạn [c_lo, c_hi] -> [i_lo, i_hi]"""
+    segments: Tuple[Tuple[float, float, int, int], ...]
+    # Hệ số đổi từ µg/m³ sang đơn vị của bảng
+    factor: float = 1.0
+    # Số chữ số thập phân giữ lại (cắt bớt) trước khi tra bảng - None: không cắt
+    decimals: Optional[int] = None
+
+def _continuous(concentrations: Sequence[float], indices: Sequence[int]) -> Tuple[Tuple[float, float, int, int], ...]:
+    """Bảng dạng mốc liên tục (VN_AQI: BP_i -> I_i) thành các đoạn"""
+    return tuple(
+        (concentrations[i], concentrations[i + 1], indices[i], indices[i + 1])
+        for i in range(len(concentrations) - 1)
+    )
+
+_EPA_INDEX = ((0, 50), (51, 100), (101, 150), (151, 200), (201, 300), (301, 500))
+
+def _epa(concentrations: Sequence[Tuple[float, float]], index=_EPA_INDEX) -> Tuple[Tuple[float, float, int, int], ...]:
+    return tuple((c_lo, c_hi, i_lo, i_hi) for (c_lo, c_hi), (i_lo, i_hi) in zip(concentrations, index))
+
+_VN_INDEX = (0, 50, 100, 150, 200, 300, 400, 500)
+
+STANDARDS: Dict[str, Dict[str, _Table]] = {
+    # US EPA - PM2.5 theo bản sửa đổi 2024, NO2/SO2 1h, CO 8h
+    # O3: bảng 8h tới 200 ppb (AQI 300), mốc 405-604 ppb của bảng 1h cho AQI 301-500 - giữa 2 bảng giữ AQI 300
+    "EPA": {
+        "pm2_5": _Table(_epa(((0.0, 9.0), (9.1, 35.4), (35.5, 55.4), (55.5, 125.4), (125.5, 225.4), (225.5, 325.4))), decimals=1),
+        "pm10": _Table(_epa(((0, 54), (55, 154), (155, 254), (255, 354), (355, 424), (425, 604))), decimals=0),
+        "o3": _Table(_epa(((0, 54), (55, 70), (71, 85), (86, 105), (106, 200), (405, 604))), factor=_PPB["o3"], decimals=0),
+        "no2": _Table(_epa(((0, 53), (54, 100), (101, 360), (361, 649), (650, 1249), (1250, 2049))), factor=_PPB["no2"], decimals=0),
+        "so2": _Table(_epa(((0, 35), (36, 75), (76, 185), (186, 304), (305, 604), (605, 1004))), factor=_PPB["so2"], decimals=0),
+        "co": _Table(_epa(((0.0, 4.4), (4.5, 9.4), (9.5, 12.4), (12.5, 15.4), (15.5, 30.4), (30.5, 50.4))), factor=_PPM_CO, decimals=1),
+    },
+    # Việt Nam - QĐ 1459/QĐ-TCMT (2019), AQI giờ, đơn vị µg/m³
+    "VN_AQI": {
+        "pm2_5": _Table(_continuous((0, 25, 50, 80, 150, 250, 350, 500), _VN_INDEX)),
+        "pm10": _Table(_continuous((0, 50, 150, 250, 350, 420, 500, 600), _VN_INDEX)),
+        "o3": _Table(_continuous((0, 160, 200, 300, 400, 800, 1000, 1200), _VN_INDEX)),
+        "no2": _Table(_continuous((0, 100, 200, 700, 1200, 2350, 3100, 3850), _VN_INDEX)),
+        "so2": _Table(_continuous((0, 125, 350, 550, 800, 1600, 2100, 2630), _VN_INDEX)),
+        "co": _Table(_continuous((0, 10000, 30000, 45000, 60000, 90000, 120000, 150000), _VN_INDEX)),
+    },
+}
+
+@functools.lru_cache(maxsize=None)
+def _arrays(standard: str, pollutant: str):
+    """Mảng numpy của bảng breakpoint (tạo 1 lần, numpy chỉ import khi thực sự tính AQI)"""
+    try:
+        table = STANDARDS[standard][pollutant]
+    except KeyError:
+        raise ValueError(f"Unknown AQI standard/pollutant: {standard}/{pollutant}") from None
+    c_lo, c_hi, i_lo, i_hi = (np.array(column, dtype=float) for column in zip(*table.segments))
+    return c_lo, c_hi, i_lo, i_hi, table
+
+def sub_index(concentrations, pollutant: str, standard: str = "VN_AQI") -> np.ndarray:
+    """
+    AQI thành phần của 1 chất cho cả mảng nồng độ (µg/m³), làm tròn tới số nguyên
+    NaN / âm -> NaN, vượt mốc cao nhất -> AQI_MAX
+    """
+    c_lo, c_hi, i_lo, i_hi, table = _arrays(standard, pollutant)
+    values = np.asarray(concentrations, dtype=float) * table.factor
+    if table.decimals is not None:
+        scale = 10.0 ** table.decimals
+        # + 1e-9: tránh 35.4 * 10 = 353.99999 bị cắt thành 35.3
+        values = np.floor(values * scale + 1e-9) / scale
+
+    # Đoạn đầu tiên có c_hi >= giá trị
+    segment = np.minimum(np.searchsorted(c_hi, values, side="left"), len(c_hi) - 1)
+    lo, hi = c_lo[segment], c_hi[segment]
+    index = i_lo[segment] + (i_hi[segment] - i_lo[segment]) * (values - lo) / (hi - lo)
+    # Giá trị rơi vào khe giữa 2 đoạn (O3 EPA) giữ mức cao nhất của đoạn trước
+    index = np.where(values < lo, i_hi[np.maximum(segment - 1, 0)], index)
+    index = np.where(values > c_hi[-1], AQI_MAX, index)
+    with np.errstate(invalid="ignore"):
+        return np.where(np.isnan(values) | (values < 0), np.nan, np.rint(index))
+
+def nowcast(concentrations, hours: int = NOWCAST_HOURS) -> np.ndarray:
+    """
+    NowCast theo trục cuối (giờ liên tiếp, cũ -> mới) cho mảng 1 chiều hoặc (trạm, giờ)
+    Mỗi giờ dùng `hours` giờ gần nhất: w = max(c_min / c_max, 0.5), NowCast = Σ w^k c_k / Σ w^k (k = 0 là giờ hiện tại)
+    Cần ít nhất 2 trong 3 giờ gần nhất có dữ liệu, không thì NaN
+    """
+    values = np.asarray(concentrations, dtype=float)
+    padded = np.concatenate([np.full(values.shape[:-1] + (hours - 1,), np.nan), values], axis=-1)
+    # (..., giờ, hours) - cửa sổ đảo ngược để cột 0 là giờ hiện tại
+    windows = np.lib.stride_tricks.sliding_window_view(padded, hours, axis=-1)[..., ::-1]
+    valid = ~np.isnan(windows)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c_min = np.where(valid, windows, np.inf).min(axis=-1)
+        c_max = np.where(valid, windows, -np.inf).max(axis=-1)
+        weight = np.clip(np.where(c_max > 0, c_min / c_max, 1.0), 0.5, 1.0)
+        powers = weight[..., None] ** np.arange(hours)
+        powers = np.where(valid, powers, 0.0)
+        result = (powers * np.where(valid, windows, 0.0)).sum(axis=-1) / powers.sum(axis=-1)
+
+    return np.where(valid[..., :3].sum(axis=-1) >= 2, result, np.nan)
+
+def overall_aqi(sub_indices: Dict[str, np.ndarray]) -> np.ndarray:
+    """AQI tổng = AQI thành phần lớn nhất (NaN khi không chất nào có dữ liệu)"""
+    stacked = np.vstack([np.asarray(values, dtype=float) for values in sub_indices.values()])
+    return np.fmax.reduce(stacked, axis=0)
+
+def _hourly_grid(frame: pd.DataFrame, station: str, time: str) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+    """Vị trí (trạm, giờ) của từng dòng trên lưới trạm x giờ liên tục"""
+    rows, stations = pd.factorize(frame[station])
+    hours = pd.to_datetime(frame[time], utc=True).dt.floor("h")
+    cols = ((hours - hours.min()) // pd.Timedelta(hours=1)).to_numpy(dtype="int64")
+    return rows, cols, (len(stations), int(cols.max()) + 1)
+
+def _as_int64(values: np.ndarray) -> pd.api.extensions.ExtensionArray:
+    missing = np.isnan(values)
+    return pd.arrays.IntegerArray(np.where(missing, 0, values).astype("int64"), missing)
+
+def compute_aqi(
+    frame: pd.DataFrame,
+    standard: str = "VN_AQI",
+    use_nowcast: bool = True,
+    station: str = "location_key",
+    time: str = "time"
+) -> pd.DataFrame:
+    """
+    Thêm cột aqi_<chất> và aqi_overall (Int64, <NA> khi thiếu dữ liệu) cho các chất có trong frame
+    use_nowcast: PM2.5/PM10 dùng NowCast 12h theo từng trạm (cần cột station và time)
+    """
+    present = [pollutant for pollutant in POLLUTANTS if pollutant in frame]
+    if not present:
+        raise ValueError(f"Frame has no pollutant columns: {POLLUTANTS}")
+
+    grid = None
+    sub_indices = {}
+    for pollutant in present:
+        values = frame[pollutant].to_numpy(dtype=float, na_value=np.nan)
+        if use_nowcast and pollutant in NOWCAST_POLLUTANTS and len(frame):
+            # Trải ra lưới (trạm, giờ) - giờ thiếu là NaN, trùng (trạm, giờ) giữ dòng sau cùng
+            rows, cols, shape = grid = grid or _hourly_grid(frame, station, time)
+            hourly = np.full(shape, np.nan)
+            hourly[rows, cols] = values
+            values = nowcast(hourly)[rows, cols]
+        sub_indices[f"aqi_{pollutant}"] = sub_index(values, pollutant, standard)
+    sub_indices["aqi_overall"] = overall_aqi(sub_indices)
+
+    return frame.assign(**{column: _as_int64(values) for column, values in sub_indices.items()})
@@ -27,7 +27,73 @@ class Settings(BaseSettings):
     GOOGLE_CLOUD_PROJECT: str = os.getenv("GOOGLE_CLOUD_PROJECT", "invertible-now-462103-m3")
     BIGQUERY_DATASET: str = os.getenv("BIGQUERY_DATASET", "weather_and_air_dataset")
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "credentials/invertible-now-462103-m3-23f2fe58ae65.json")
-    
+
+    # Cache snapshot AQI mới nhất (giây) - dữ liệu fact cập nhật tối đa 1 lần/giờ
+    AQI_SNAPSHOT_TTL_SECONDS: int = int(os.getenv("AQI_SNAPSHOT_TTL_SECONDS", "300"))
+    # Cửa sổ tìm bản ghi mới nhất của mỗi trạm (giờ) - trạm không có dữ liệu trong cửa sổ dùng dữ liệu mẫu
+    AQI_SNAPSHOT_LOOKBACK_HOURS: int = int(os.getenv("AQI_SNAPSHOT_LOOKBACK_HOURS", "72"))
+    # Chu kỳ đọc lại metadata bảng fact (thời điểm sửa đổi cuối) làm version cho ETag (giây)
+    FACT_VERSION_TTL_SECONDS: int = int(os.getenv("FACT_VERSION_TTL_SECONDS", "60"))
+
+    # Async query facade - số thread tối đa chạy BigQuery job và timeout mỗi query (giây)
+    BIGQUERY_MAX_CONCURRENT_QUERIES: int = int(os.getenv("BIGQUERY_MAX_CONCURRENT_QUERIES", "8"))
+    BIGQUERY_QUERY_TIMEOUT_SECONDS: float = float(os.getenv("BIGQUERY_QUERY_TIMEOUT_SECONDS", "30"))
+
+    # Số row mỗi page khi stream kết quả lớn (NDJSON / Arrow)
+    BIGQUERY_STREAM_PAGE_SIZE: int = int(os.getenv("BIGQUERY_STREAM_PAGE_SIZE", "5000"))
+    # Tải kết quả query qua BigQuery Storage Read API (Arrow/gRPC) thay vì REST tabledata API
+    BIGQUERY_USE_STORAGE_API: bool = os.getenv("BIGQUERY_USE_STORAGE_API", "true").lower() == "true"
+
+    # Rollup tables (agg_hourly / agg_daily) cho endpoint daily/trends
+    # Chỉ bật sau khi đã backfill (scripts/refresh_rollups.py --backfill) và có lịch refresh
+    # (ROLLUP_REFRESH_INTERVAL_MINUTES hoặc cron) - rollup cũ hơn bảng fact luôn bị bỏ qua, đọc raw
+    ROLLUPS_ENABLED: bool = os.getenv("ROLLUPS_ENABLED", "false").lower() == "true"
+    ROLLUP_LOOKBACK_DAYS: int = int(os.getenv("ROLLUP_LOOKBACK_DAYS", "2"))
+    ROLLUP_REFRESH_INTERVAL_MINUTES: int = int(os.getenv("ROLLUP_REFRESH_INTERVAL_MINUTES", "0"))  # 0 = chạy bằng scripts/refresh_rollups.py
+
+    # Ingestion vào bảng fact: flush buffer khi đủ số dòng hoặc dòng cũ nhất đã chờ quá N giây
+    INGEST_BATCH_ROWS: int = int(os.getenv("INGEST_BATCH_ROWS", "5000"))
+    INGEST_FLUSH_SECONDS: int = int(os.getenv("INGEST_FLUSH_SECONDS", "300"))
+
+    # Cột TIMESTAMP partition của Fact_Weather_AirQuality (scripts/partition_fact_table.py) - rỗng khi bảng chưa partition
+    # Khi đặt, query lọc trực tiếp trên cột này để BigQuery chỉ quét partition của N ngày gần nhất
+    FACT_PARTITION_COLUMN: str = os.getenv("FACT_PARTITION_COLUMN", "")
+
+    # Chuẩn tính AQI từ nồng độ (app/core/aqi_calc.py): VN_AQI hoặc EPA
+    AQI_STANDARD: str = os.getenv("AQI_STANDARD", "VN_AQI")
+
+    # Lưới nội suy AQI (/aqi/grid): vùng phủ "lat_min,lng_min,lat_max,lng_max" (mặc định Hà Nội), số cột mặc định/tối đa,
+    # số mũ IDW và số bề mặt giữ trong cache cho mỗi snapshot
+    AQI_GRID_BOUNDS: str = os.getenv("AQI_GRID_BOUNDS", "20.55,105.28,21.40,106.03")
+    AQI_GRID_SIZE: int = int(os.getenv("AQI_GRID_SIZE", "128"))
+    AQI_GRID_MAX_SIZE: int = int(os.getenv("AQI_GRID_MAX_SIZE", "1024"))
+    AQI_GRID_IDW_POWER: float = float(os.getenv("AQI_GRID_IDW_POWER", "2"))
+    AQI_GRID_CACHE_ENTRIES: int = int(os.getenv("AQI_GRID_CACHE_ENTRIES", "32"))
+
+    # Tile AQI XYZ (/aqi/tiles/{z}/{x}/{y}.png): thư mục cache trên đĩa (rỗng = chỉ cache memory),
+    # số tile giữ trong memory, số version snapshot giữ trên đĩa, zoom tối đa và độ đục (0-255)
+    AQI_TILE_CACHE_DIR: str = os.getenv("AQI_TILE_CACHE_DIR", "cache/tiles")
+    AQI_TILE_CACHE_ENTRIES: int = int(os.getenv("AQI_TILE_CACHE_ENTRIES", "2048"))
+    AQI_TILE_CACHE_VERSIONS: int = int(os.getenv("AQI_TILE_CACHE_VERSIONS", "3"))
+    AQI_TILE_MAX_ZOOM: int = int(os.getenv("AQI_TILE_MAX_ZOOM", "18"))
+    AQI_TILE_OPACITY: int = int(os.getenv("AQI_TILE_OPACITY", "180"))
+
+    # Bán kính tối đa (km) khi resolve lat/lng về trạm quan trắc gần nhất
+    NEAREST_STATION_MAX_KM: float = float(os.getenv("NEAREST_STATION_MAX_KM", "10"))
+
+    # Dimension cache (Dim_Location + cửa sổ Dim_Time) - preload khi khởi động, refresh định kỳ
+    DIM_TIME_WINDOW_DAYS: int = int(os.getenv("DIM_TIME_WINDOW_DAYS", "8"))
+    DIMENSION_REFRESH_MINUTES: int = int(os.getenv("DIMENSION_REFRESH_MINUTES", "60"))
+
+    # Forecast store - chu kỳ kiểm tra dữ liệu fact mới để tính lại dự báo cho tất cả trạm (0 = tắt)
+    FORECAST_REFRESH_MINUTES: int = int(os.getenv("FORECAST_REFRESH_MINUTES", "10"))
+    # Chu kỳ kiểm tra version ACTIVE trong model registry để hot-swap model (0 = tắt)
+    MODEL_RELOAD_SECONDS: int = int(os.getenv("MODEL_RELOAD_SECONDS", "60"))
+    # Import pandas/numpy/BigQuery ở thread nền ngay sau startup thay vì ở request đầu tiên
+    WARMUP_IMPORTS_ON_STARTUP: bool = os.getenv("WARMUP_IMPORTS_ON_STARTUP", "true").lower() == "true"
+    # Bật /api/v1/debug/startup (profile import chạy subprocess) - chỉ dùng khi debug, mặc định tắt
+    STARTUP_PROFILE_ENABLED: bool = os.getenv("STARTUP_PROFILE_ENABLED", "false").lower() == "true"
+
     # Environment
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
@@ -0,0 +1,70 @@
+"""
+HTTP Conditional Responses - ETag / Last-Modified cho các endpoint đọc dữ liệu
+- ETag tính từ version dữ liệu (time_key mới nhất của fact, version snapshot...) + tham số request,
+  nên kiểm tra If-None-Match được TRƯỚC khi query BigQuery và serialize
+- Khớp -> 304 Not Modified (body rỗng), client dùng lại bản đã có
+- Cache-Control: no-cache -> browser luôn hỏi lại server (kèm If-None-Match) thay vì tự dùng bản cũ
+"""
+from __future__ import annotations
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag từ các thành phần xác định nội dung (tên endpoint, tham số, version dữ liệu)"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def _opaque(etag: str) -> str:
+    # So sánh weak (RFC 7232): bỏ tiền tố W/
+    return etag[2:] if etag.startswith("W/") else etag
+
+def _http_date(value: datetime) -> datetime:
+    value = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Request có bản còn mới: If-None-Match khớp ETag, hoặc (khi không gửi If-None-Match)
+    If-Modified-Since không cũ hơn last_modified
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {_opaque(tag.strip()) for tag in if_none_match.split(",")}
+        return _opaque(etag) in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return _http_date(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_http_date(last_modified), usegmt=True)
+    return headers
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+def cached_json(content: Any, etag: Optional[str], last_modified: Optional[datetime] = None) -> Response:
+    """Response JSON (orjson) kèm ETag / Last-Modified - etag None: trả về không có validator (dữ liệu mẫu)"""
+    return ORJSONResponse(content, headers=validator_headers(etag, last_modified) if etag else None)
+
+def cached_bytes(
+    body: bytes,
+    media_type: str,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Response với body đã encode sẵn (snapshot, grid, tile) kèm ETag / Last-Modified"""
+    return Response(content=body, media_type=media_type, headers={**(headers or {}), **validator_headers(etag, last_modified)})
@@ -0,0 +1,62 @@
+"""
+Imaging - Encode mảng pixel NumPy thành PNG chỉ dùng thư viện chuẩn (zlib), không cần Pillow
+và tô màu giá trị theo color ramp (tile AQI)
+"""
+from __future__ import annotations
+import struct
+import zlib
+from typing import Sequence, Tuple
+from app.core.lazy import lazy_import
+np = lazy_import("numpy")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Số kênh -> PNG color type: gray, gray + alpha, RGB, RGBA
+_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+def encode_png(pixels: np.ndarray, compress_level: int = 6) -> bytes:
+    """
+    PNG 8 bit từ mảng uint8 (height, width) hoặc (height, width, channels) với channels 1-4
+    Mỗi hàng dùng filter 0 (None) - dữ liệu lưới/tile mượt nên zlib đã nén tốt
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    height, width, channels = pixels.shape
+    if channels not in _COLOR_TYPES:
+        raise ValueError(f"Unsupported channel count: {channels}")
+
+    # Thêm byte filter (0) ở đầu mỗi hàng trong 1 lần ghép mảng
+    rows = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * channels)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, _COLOR_TYPES[channels], 0, 0, 0)
+    return b"".join([
+        PNG_SIGNATURE,
+        _chunk(b"IHDR", header),
+        _chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level)),
+        _chunk(b"IEND", b""),
+    ])
+
+def parse_hex_color(color: str) -> Tuple[int, int, int]:
+    """'#RRGGBB' -> (r, g, b)"""
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+def colorize(intensity: np.ndarray, stops: Sequence[Tuple[float, str]], alpha: int = 255) -> np.ndarray:
+    """
+    Tô màu mảng cường độ 0..1 theo color ramp [(vị trí, '#RRGGBB'), ...] (nội suy tuyến tính từng kênh)
+    -> RGBA uint8 (..., 4), NaN -> trong suốt
+    """
+    positions = [position for position, _ in stops]
+    colors = np.array([parse_hex_color(color) for _, color in stops], dtype=float)
+    values = np.clip(np.nan_to_num(intensity, nan=0.0), 0.0, 1.0)
+
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.rint(np.interp(values, positions, colors[:, channel]))
+    rgba[..., 3] = np.where(np.isnan(intensity), 0, alpha)
+    return rgba
@@ -0,0 +1,104 @@
+"""
+Spatial Interpolation - Nội suy AQI từ các trạm quan trắc ra lưới lat/lng (IDW)
+Tính trên server thay cho heatmap phía client: NumPy broadcasting (ô lưới x trạm), chia theo khối hàng để giới hạn bộ nhớ
+"""
+from __future__ import annotations
+import math
+from typing import NamedTuple, Optional, Sequence, Tuple
+from app.core.lazy import lazy_import
+np = lazy_import("numpy")
+
+# Km trên 1 độ vĩ - đủ chính xác ở quy mô 1 thành phố (xấp xỉ equirectangular)
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LNG_EQUATOR = 111.320
+
+# Số phần tử tối đa của mảng khoảng cách (ô lưới x trạm) mỗi khối hàng
+_MAX_BLOCK_ELEMENTS = 4_000_000
+
+# uint8: 0..254 tuyến tính theo [0, scale], 255 = không có dữ liệu
+NO_DATA_UINT8 = 255
+
+class GridBounds(NamedTuple):
+    lat_min: float
+    lng_min: float
+    lat_max: float
+    lng_max: float
+
+    @classmethod
+    def parse(cls, text: str) -> "GridBounds":
+        """'lat_min,lng_min,lat_max,lng_max' -> GridBounds, ValueError nếu sai định dạng"""
+        values = [float(part) for part in text.split(",")]
+        if len(values) != 4:
+            raise ValueError("bounds must be lat_min,lng_min,lat_max,lng_max")
+        bounds = cls(*values)
+        if not (-90 <= bounds.lat_min < bounds.lat_max <= 90 and -180 <= bounds.lng_min < bounds.lng_max <= 180):
+            raise ValueError(f"Invalid bounds: {text}")
+        return bounds
+
+    def __str__(self) -> str:
+        return ",".join(f"{value:g}" for value in self)
+
+    def aspect_height(self, width: int) -> int:
+        """Số hàng để ô lưới gần vuông (theo km) với width cột"""
+        lat_km = (self.lat_max - self.lat_min) * KM_PER_DEG_LAT
+        lng_km = (self.lng_max - self.lng_min) * KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians((self.lat_min + self.lat_max) / 2))
+        return max(1, round(width * lat_km / lng_km))
+
+def grid_axes(bounds: GridBounds, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Tâm ô lưới: lats (height, hàng đầu là phía bắc như ảnh), lngs (width)"""
+    lat_step = (bounds.lat_max - bounds.lat_min) / height
+    lng_step = (bounds.lng_max - bounds.lng_min) / width
+    lats = bounds.lat_max - (np.arange(height) + 0.5) * lat_step
+    lngs = bounds.lng_min + (np.arange(width) + 0.5) * lng_step
+    return lats, lngs
+
+def idw_grid(
+    station_lats: Sequence[float],
+    station_lngs: Sequence[float],
+    values: Sequence[float],
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    power: float = 2.0,
+    max_distance_km: Optional[float] = None
+) -> np.ndarray:
+    """
+    Nội suy IDW lên lưới chữ nhật (lats x lngs) -> mảng float32 (len(lats), len(lngs))
+    Trạm thiếu giá trị bị bỏ qua; ô xa hơn max_distance_km so với mọi trạm là NaN
+    """
+    station_lats = np.asarray(station_lats, dtype=float)
+    station_lngs = np.asarray(station_lngs, dtype=float)
+    values = np.asarray(values, dtype=float)
+    valid = ~(np.isnan(station_lats) | np.isnan(station_lngs) | np.isnan(values))
+    station_lats, station_lngs, values = station_lats[valid], station_lngs[valid], values[valid]
+
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    result = np.full((len(lats), len(lngs)), np.nan, dtype=np.float32)
+    if not len(values):
+        return result
+
+    # Toạ độ phẳng (km) quanh vĩ độ trung bình
+    km_per_deg_lng = KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(float(np.mean(lats))))
+    station_x = station_lngs * km_per_deg_lng
+    station_y = station_lats * KM_PER_DEG_LAT
+    grid_x = (lngs * km_per_deg_lng)[None, :, None]
+
+    # IDW với d² trực tiếp: w = 1 / d^power = d2^(-power / 2), không cần sqrt
+    half_power = power / 2
+    block_rows = max(1, _MAX_BLOCK_ELEMENTS // (len(lngs) * len(values)))
+    for start in range(0, len(lats), block_rows):
+        grid_y = (lats[start:start + block_rows] * KM_PER_DEG_LAT)[:, None, None]
+        d2 = (grid_x - station_x) ** 2 + (grid_y - station_y) ** 2
+        # Ô trùng vị trí trạm: khoảng cách ~0 -> trọng số áp đảo, lấy đúng giá trị trạm
+        weights = np.maximum(d2, 1e-12) ** -half_power
+        block = (weights * values).sum(axis=-1) / weights.sum(axis=-1)
+        if max_distance_km is not None:
+            block = np.where(d2.min(axis=-1) <= max_distance_km ** 2, block, np.nan)
+        result[start:start + block_rows] = block
+    return result
+
+def quantize_uint8(grid: np.ndarray, scale: float) -> np.ndarray:
+    """Lượng tử hoá về 0..254 trên [0, scale] (giá trị = byte * scale / 254), NaN -> NO_DATA_UINT8"""
+    with np.errstate(invalid="ignore"):
+        levels = np.rint(np.clip(grid, 0, scale) * (254 / scale))
+    return np.where(np.isnan(grid), NO_DATA_UINT8, levels).astype(np.uint8)
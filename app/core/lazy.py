@@ -0,0 +1,143 @@
+"""
+Lazy Imports & Startup Profiling
+- lazy_import: module nặng (pandas, numpy, google-cloud-bigquery, pyarrow...) chỉ thực sự được import
+  ở lần truy cập thuộc tính đầu tiên - /health trả lời ngay khi container vừa boot
+  Import thật đi qua importlib.import_module: thread khác đang import dở thì chờ (module lock của importlib),
+  không bao giờ thấy module mới khởi tạo một nửa
+- warm_up_imports: import trước các module nặng ở thread nền sau khi app đã sẵn sàng
+- import_time_profile: chạy `python -X importtime` ở subprocess để so sánh chi phí import
+"""
+import os
+import re
+import sys
+import time
+import subprocess
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+
+# Module nặng được warm-up ở background theo thứ tự (module sau dùng module trước)
+HEAVY_MODULES = [
+    "numpy",
+    "pandas",
+    "pyarrow",
+    "google.cloud.bigquery",
+    "db_dtypes",
+]
+
+# Thời điểm bắt đầu import app - dùng để đo thời gian startup
+PROCESS_STARTED_AT = time.perf_counter()
+_startup_marks: Dict[str, float] = {}
+
+class LazyModule(ModuleType):
+    """
+    Placeholder của module chưa import: truy cập thuộc tính đầu tiên mới import thật rồi chuyển tiếp
+    Không đăng ký vào sys.modules - `import x` ở nơi khác vẫn nhận module thật
+    """
+
+    def __getattr__(self, attr: str) -> Any:
+        module = self.__dict__.get("_lazy_target")
+        if module is None:
+            # import_module chỉ trả về khi module đã chạy xong (thread khác đang import thì chờ)
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_target"] = module
+        return getattr(module, attr)
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Trả về module dạng lazy: code của module chỉ chạy khi truy cập thuộc tính đầu tiên
+    Module đã import rồi thì trả về luôn
+    """
+    module = sys.modules.get(name)
+    if module is not None and not _is_initializing(module):
+        return module
+
+    parent = name.rpartition(".")[0]
+    if parent:
+        # Package cha (google.cloud...) nhẹ - import bình thường để find_spec tìm được module con
+        importlib.import_module(parent)
+
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
+
+def _is_initializing(module: ModuleType) -> bool:
+    return getattr(getattr(module, "__spec__", None), "_initializing", False)
+
+def is_loaded(name: str) -> bool:
+    """Module đã thực sự được import xong"""
+    module = sys.modules.get(name)
+    return module is not None and not _is_initializing(module)
+
+def mark_startup(event: str) -> None:
+    """Ghi mốc thời gian startup (giây kể từ lúc import app)"""
+    _startup_marks[event] = round(time.perf_counter() - PROCESS_STARTED_AT, 4)
+
+def warm_up_imports(modules: Optional[List[str]] = None) -> Dict[str, float]:
+    """Import thật các module nặng (chạy trong thread nền), trả về thời gian từng module"""
+    timings: Dict[str, float] = {}
+    for name in modules or HEAVY_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"⚠️ Warm-up import {name} failed: {e}")
+            continue
+        timings[name] = round(time.perf_counter() - started, 4)
+    mark_startup("warm_up_done")
+    print(f"✅ Warm-up imports done: {timings}")
+    return timings
+
+def startup_report() -> Dict[str, Any]:
+    """Mốc startup + trạng thái load của các module nặng"""
+    return {
+        "marks_seconds": dict(_startup_marks),
+        "heavy_modules_loaded": {name: is_loaded(name) for name in HEAVY_MODULES},
+    }
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+_MODULE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+def import_time_profile(module: str = "main", top: int = 25, cwd: Optional[str] = None, timeout: float = 120) -> Dict[str, Any]:
+    """
+    Chạy `python -X importtime -c "import <module>"` trong process mới (import lạnh)
+    Trả về tổng thời gian và các module tốn nhiều nhất (cumulative, micro giây)
+    """
+    if not _MODULE_NAME.match(module):
+        raise ValueError(f"Invalid module name: {module}")
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd or os.getcwd(),
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    wall = time.perf_counter() - started
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({
+                "module": name,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": len(indent) // 2,
+            })
+
+    top_level = [e for e in entries if e["depth"] == 0]
+    heaviest = sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top]
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode != 0 and result.stderr else None,
+        "wall_seconds": round(wall, 3),
+        "total_import_us": sum(e["cumulative_us"] for e in top_level),
+        "modules_imported": len(entries),
+        "heavy_modules_imported": [name for name in HEAVY_MODULES if any(e["module"] == name for e in entries)],
+        "top": heaviest,
+    }
@@ -30,6 +30,22 @@ class MLSettings(BaseSettings):
     LSTM_MODEL_NAME: str = "aqi_lstm_model.h5"
     SCALER_MODEL_NAME: str = "aqi_scaler.pkl"
     
+    # Inference runtime (ONNX Runtime, CPU) - model export từ model.keras bằng scripts/export_forecast_model.py
+    ONNX_MODEL_NAME: str = "aqi_lstm.onnx"
+    SCALER_PARAMS_NAME: str = "aqi_scaler.json"   # MinMaxScaler params + metadata (không cần sklearn khi chạy)
+    INFERENCE_THREADS: int = 1
+    
+    # Backtest / model selection (ARIMA walk-forward)
+    ARIMA_ORDER: tuple = (1, 0, 2)       # Order dùng trong notebook
+    BACKTEST_REFIT_EVERY: int = 168      # Refit mỗi 7 ngày dữ liệu test, giữa các lần refit chỉ cập nhật state
+    BACKTEST_WORKERS: int = 0            # Số process song song (0 = số CPU)
+    
+    # Drift monitoring (dự báo đã phục vụ vs giá trị thực)
+    DRIFT_HORIZON_HOURS: int = 24        # Chỉ đánh giá dự báo trong N giờ đầu
+    DRIFT_HALF_LIFE_HOURS: float = 168   # Trọng số quan sát giảm một nửa sau 7 ngày
+    DRIFT_MIN_SAMPLES: int = 24          # Số cặp tối thiểu mỗi trạm trước khi so ngưỡng
+    RETRAIN_COOLDOWN_HOURS: int = 24     # Yêu cầu retrain tối đa 1 lần/ngày (model_update_frequency)
+    
     # Feature Configuration
     FEATURE_COLUMNS: list = [
         'pm2_5', 'temperature_2m', 'relative_humidity_2m',
@@ -0,0 +1,185 @@
+"""
+DataFrame / Arrow Serialization
+Chuyển kết quả BigQuery (DataFrame hoặc Arrow Table/RecordBatch) sang JSON theo từng cột (vectorized) thay vì iterrows
+"""
+from __future__ import annotations
+import io
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.core.lazy import lazy_import
+import orjson
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+
+# FieldSpec: (cột nguồn trong DataFrame, kiểu dữ liệu đầu ra, giá trị mặc định khi NULL)
+# Kiểu hỗ trợ: "float", "int", "str", "timestamp", "date"
+FieldSpec = Tuple[str, str, Any]
+
+def _convert_column(column: pd.Series, kind: str, default: Any) -> List[Any]:
+    """Chuyển 1 cột sang list giá trị Python theo kiểu yêu cầu, áp dụng default cho NULL"""
+    if kind == "float":
+        values = pd.to_numeric(column, errors="coerce").astype("float64")
+        return values.fillna(default).tolist()
+
+    if kind == "int":
+        # Giữ nguyên hành vi int(x) - cắt phần thập phân của các giá trị AVG
+        values = pd.to_numeric(column, errors="coerce").astype("float64")
+        return values.fillna(default).astype("int64").tolist()
+
+    if kind == "str":
+        return column.astype(object).where(column.notna(), default).astype(str).tolist()
+
+    if kind == "timestamp":
+        return _isoformat_timestamps(column, default)
+
+    if kind == "date":
+        if pd.api.types.is_datetime64_any_dtype(column):
+            text = pd.Series(np.datetime_as_string(column.to_numpy(dtype="datetime64[D]"), unit="D"), index=column.index)
+        else:
+            text = column.astype(str)
+        return text.where(column.notna(), default).tolist()
+
+    raise ValueError(f"Unsupported field kind: {kind}")
+
+def _isoformat_timestamps(column: pd.Series, default: Any) -> List[Any]:
+    """isoformat() cho cả cột timestamp trong 1 lần gọi numpy"""
+    if not pd.api.types.is_datetime64_any_dtype(column):
+        # Cột object (string hoặc datetime lẫn lộn) - fallback từng giá trị
+        return [
+            value.isoformat() if hasattr(value, "isoformat") else (default if pd.isna(value) else str(value))
+            for value in column
+        ]
+
+    suffix = ""
+    values = column
+    if column.dt.tz is not None:
+        # BigQuery TIMESTAMP luôn là UTC - giữ định dạng giống datetime.isoformat()
+        values = column.dt.tz_convert("UTC").dt.tz_localize(None)
+        suffix = "+00:00"
+
+    text = np.datetime_as_string(values.to_numpy(dtype="datetime64[s]"), unit="s")
+    if suffix:
+        text = np.char.add(text, suffix)
+
+    return pd.Series(text, index=column.index, dtype=object).where(column.notna(), default).tolist()
+
+def serialize_frame(
+    df: pd.DataFrame,
+    fields: Dict[str, FieldSpec],
+    constants: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Chuyển DataFrame sang list records theo schema fields
+    Mỗi cột được convert 1 lần (fillna/astype), sau đó ghép thành dict theo hàng
+    constants: các field có giá trị cố định cho mọi record (vd: location_name của request)
+    """
+    if df.empty:
+        return []
+
+    columns = {name: _convert_column(df[source], kind, default) for name, (source, kind, default) in fields.items()}
+    if constants:
+        for name, value in constants.items():
+            columns[name] = [value] * len(df)
+
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+def _convert_arrow_column(column: pa.ChunkedArray, kind: str, default: Any) -> List[Any]:
+    """Bản Arrow của _convert_column (pyarrow.compute) - cùng kết quả, không chuyển sang pandas"""
+    # Import tại chỗ - lazy_import module con sẽ import luôn package pyarrow khi khởi động
+    import pyarrow.compute as pc
+
+    column_type = column.type
+
+    if kind in ("float", "int"):
+        values = pc.cast(column, pa.float64())
+        if default is not None:
+            # NaN và NULL đều nhận default như fillna của pandas
+            values = pc.fill_null(pc.if_else(pc.is_nan(values), pa.scalar(float(default)), values), float(default))
+        if kind == "int":
+            # safe=False: cắt phần thập phân giống int(x)
+            values = pc.cast(values, pa.int64(), safe=False)
+        return values.to_pylist()
+
+    if kind == "str":
+        if pa.types.is_string(column_type) or pa.types.is_large_string(column_type):
+            return pc.fill_null(column, str(default)).to_pylist()
+        return [str(default) if value is None else str(value) for value in column.to_pylist()]
+
+    if kind in ("timestamp", "date") and pa.types.is_timestamp(column_type):
+        # Bỏ phần lẻ giây (giống datetime64[s]); TIMESTAMP có tz -> định dạng theo UTC
+        tz = "UTC" if column_type.tz is not None else None
+        values = pc.cast(column, pa.timestamp("s", tz=tz), safe=False)
+        if kind == "date":
+            text = pc.strftime(values, format="%Y-%m-%d")
+        else:
+            text = pc.strftime(values, format="%Y-%m-%dT%H:%M:%S+00:00" if tz else "%Y-%m-%dT%H:%M:%S")
+        return (text if default is None else pc.fill_null(text, default)).to_pylist()
+
+    if kind == "date" and pa.types.is_date(column_type):
+        text = pc.cast(column, pa.string())
+        return (text if default is None else pc.fill_null(text, default)).to_pylist()
+
+    if kind in ("timestamp", "date"):
+        # Cột string / kiểu khác - fallback từng giá trị như bản pandas
+        return [
+            default if value is None else value.isoformat() if kind == "timestamp" and hasattr(value, "isoformat") else str(value)
+            for value in column.to_pylist()
+        ]
+
+    raise ValueError(f"Unsupported field kind: {kind}")
+
+def serialize_table(
+    table: Union[pa.Table, pa.RecordBatch],
+    fields: Dict[str, FieldSpec],
+    constants: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Giống serialize_frame nhưng đọc trực tiếp Arrow Table/RecordBatch (kết quả run_query_arrow / Storage Read API)
+    """
+    if table.num_rows == 0:
+        return []
+
+    columns = {
+        name: _convert_arrow_column(table.column(source), kind, default)
+        for name, (source, kind, default) in fields.items()
+    }
+    if constants:
+        for name, value in constants.items():
+            columns[name] = [value] * table.num_rows
+
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+def to_json_bytes(records: Any) -> bytes:
+    """Serialize records sang JSON bytes bằng orjson"""
+    return orjson.dumps(records, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+def iter_ndjson(batches: Iterable[pa.RecordBatch], fields: Dict[str, FieldSpec]) -> Iterator[bytes]:
+    """
+    Stream NDJSON theo từng Arrow RecordBatch (mỗi record 1 dòng JSON)
+    Mỗi batch được serialize theo cột bằng serialize_table, memory chỉ giữ 1 batch tại một thời điểm
+    """
+    for batch in batches:
+        records = serialize_table(batch, fields)
+        if records:
+            yield b"".join(to_json_bytes(record) + b"\n" for record in records)
+
+def iter_arrow_ipc(batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    """
+    Stream Arrow IPC (streaming format) - ghi từng RecordBatch ngay khi nhận được
+    """
+    buffer = io.BytesIO()
+    writer = None
+
+    for batch in batches:
+        if writer is None:
+            writer = pa.ipc.new_stream(buffer, batch.schema)
+        writer.write_batch(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if writer is not None:
+        writer.close()
+        yield buffer.getvalue()
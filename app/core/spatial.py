@@ -0,0 +1,103 @@
+"""
+Spatial Index - Tìm trạm quan trắc gần nhất cho tọa độ lat/lng
+Grid index trong memory thay cho điều kiện ABS(latitude - lat) < 0.01 trong BigQuery
+"""
+from __future__ import annotations
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core.lazy import lazy_import
+np = lazy_import("numpy")
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Khoảng cách (km) từ 1 điểm tới mảng các điểm"""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class LocationIndex:
+    """
+    Grid index cho các trạm trong Dim_Location
+    - Mỗi trạm được gán vào 1 ô lưới cell_size_deg x cell_size_deg
+    - Truy vấn chỉ tính khoảng cách với các trạm trong các vòng ô quanh điểm cần tìm
+    """
+
+    def __init__(self, locations: Iterable[Dict[str, Any]], cell_size_deg: float = 0.1):
+        self.cell_size_deg = cell_size_deg
+        self.locations: List[Dict[str, Any]] = list(locations)
+        self.by_key: Dict[int, Dict[str, Any]] = {int(loc['location_key']): loc for loc in self.locations}
+
+        self._lats = np.array([loc['latitude'] for loc in self.locations], dtype=float)
+        self._lngs = np.array([loc['longitude'] for loc in self.locations], dtype=float)
+
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (lat, lng) in enumerate(zip(self._lats, self._lngs)):
+            self._cells.setdefault(self._cell(lat, lng), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size_deg), math.floor(lng / self.cell_size_deg))
+
+    def _ring(self, center: Tuple[int, int], radius: int) -> List[int]:
+        """Index các trạm nằm trên vòng ô cách ô trung tâm đúng radius ô"""
+        row, col = center
+        found: List[int] = []
+        for r in range(row - radius, row + radius + 1):
+            for c in range(col - radius, col + radius + 1):
+                if max(abs(r - row), abs(c - col)) == radius:
+                    found.extend(self._cells.get((r, c), ()))
+        return found
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 1,
+        max_distance_km: Optional[float] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        k trạm gần nhất (kèm khoảng cách km), bỏ qua trạm xa hơn max_distance_km
+        """
+        if not self.locations:
+            return []
+
+        center = self._cell(lat, lng)
+        # 1 ô theo kinh độ ngắn hơn theo vĩ độ - dùng cạnh ngắn nhất để biết khi nào dừng mở rộng
+        cell_km = self.cell_size_deg * 111.32 * max(math.cos(math.radians(lat)), 0.01)
+        max_radius = max(
+            max(abs(r - center[0]), abs(c - center[1])) for r, c in self._cells
+        )
+
+        candidates: List[int] = []
+        for radius in range(0, max_radius + 1):
+            candidates.extend(self._ring(center, radius))
+            # Điểm ngoài vòng radius cách ít nhất radius * cell_km
+            if len(candidates) >= k:
+                distances = haversine_km(lat, lng, self._lats[candidates], self._lngs[candidates])
+                kth = np.sort(distances)[k - 1]
+                if kth <= radius * cell_km:
+                    break
+            if max_distance_km is not None and radius * cell_km > max_distance_km:
+                break
+
+        if not candidates:
+            return []
+
+        idx = np.array(candidates)
+        distances = haversine_km(lat, lng, self._lats[idx], self._lngs[idx])
+        order = np.argsort(distances)[:k]
+
+        return [
+            (self.locations[idx[i]], float(distances[i]))
+            for i in order
+            if max_distance_km is None or distances[i] <= max_distance_km
+        ]
+
+    def nearest_one(self, lat: float, lng: float, max_distance_km: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Trạm gần nhất trong bán kính cho phép, None nếu không có"""
+        result = self.nearest(lat, lng, k=1, max_distance_km=max_distance_km)
+        return result[0][0] if result else None
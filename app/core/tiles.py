@@ -0,0 +1,178 @@
+"""
+AQI Map Tiles - Render tile XYZ (Web Mercator, 256 px) của bề mặt AQI nội suy và cache tile PNG
+- Tile = lưới IDW tại tâm từng pixel (hàng pixel cùng vĩ độ, cột cùng kinh độ) tô màu theo color ramp heatmap
+- Cache 2 tầng: LRU trong memory + file trên đĩa <dir>/<version>/<z>/<x>/<y>.png
+- Khóa theo version của snapshot: dữ liệu mới -> version mới, tile của version cũ không bị dùng lại và bị dọn dần
+"""
+from __future__ import annotations
+import os
+import math
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+from app.core.lazy import lazy_import
+from app.core.imaging import colorize, encode_png
+from app.core.interpolation import GridBounds, idw_grid
+np = lazy_import("numpy")
+
+TILE_SIZE = 256
+
+# Color ramp của heatmap (HEATMAP_FEATURE_GUIDE.md) - vị trí là AQI / AQI_RAMP_MAX
+AQI_COLOR_RAMP: Sequence[Tuple[float, str]] = (
+    (0.0, "#00FF00"),   # Tốt
+    (0.17, "#FFFF00"),  # Trung bình
+    (0.33, "#FF8C00"),  # Kém
+    (0.5, "#FF0000"),   # Xấu
+    (0.67, "#8B008B"),  # Rất xấu
+    (1.0, "#800000"),   # Nguy hại
+)
+AQI_RAMP_MAX = 300
+
+# Version dùng cho tile nằm ngoài vùng phủ - không phụ thuộc dữ liệu
+EMPTY_TILE_VERSION = "empty"
+
+def tile_axes(z: int, x: int, y: int, size: int = TILE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Vĩ độ của từng hàng pixel (bắc -> nam) và kinh độ của từng cột pixel của tile z/x/y"""
+    world = size * 2 ** z
+    offsets = np.arange(size) + 0.5
+    lngs = (x * size + offsets) / world * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y * size + offsets) / world))))
+    return lats, lngs
+
+def tile_bounds(z: int, x: int, y: int) -> GridBounds:
+    """Khung lat/lng của tile"""
+    n = 2 ** z
+    lat_north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return GridBounds(lat_south, x / n * 360.0 - 180.0, lat_north, (x + 1) / n * 360.0 - 180.0)
+
+def intersects(a: GridBounds, b: GridBounds) -> bool:
+    return a.lat_min < b.lat_max and b.lat_min < a.lat_max and a.lng_min < b.lng_max and b.lng_min < a.lng_max
+
+def render_aqi_tile(
+    z: int,
+    x: int,
+    y: int,
+    station_lats: Sequence[float],
+    station_lngs: Sequence[float],
+    values: Sequence[float],
+    coverage: GridBounds,
+    power: float = 2.0,
+    alpha: int = 180
+) -> bytes:
+    """PNG RGBA của tile: AQI nội suy tô màu theo AQI_COLOR_RAMP, ngoài vùng phủ trong suốt"""
+    lats, lngs = tile_axes(z, x, y)
+    grid = idw_grid(station_lats, station_lngs, values, lats, lngs, power=power)
+
+    inside = (
+        ((lats >= coverage.lat_min) & (lats <= coverage.lat_max))[:, None]
+        & ((lngs >= coverage.lng_min) & (lngs <= coverage.lng_max))[None, :]
+    )
+    intensity = np.where(inside, grid / AQI_RAMP_MAX, np.nan)
+    return encode_png(colorize(intensity, AQI_COLOR_RAMP, alpha=alpha))
+
+def empty_tile() -> bytes:
+    """Tile trong suốt hoàn toàn"""
+    return encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+class TileCache:
+    """
+    Cache tile PNG theo (version, z, x, y): LRU trong memory, tùy chọn lưu file trên đĩa
+    Đĩa giữ tối đa keep_versions version gần nhất (theo thời gian tạo thư mục) - version cũ hơn bị xóa
+    Dùng từ nhiều thread (render chạy ngoài event loop)
+    """
+
+    def __init__(self, max_entries: int, directory: Optional[str] = None, keep_versions: int = 3):
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self.keep_versions = keep_versions
+        self._entries: "OrderedDict[Tuple[str, int, int, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+
+    def _path(self, version: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.directory, version, str(z), str(x), f"{y}.png")
+
+    def get(self, version: str, z: int, x: int, y: int, memory_only: bool = False) -> Optional[bytes]:
+        """Tile đã cache (memory rồi tới đĩa), None nếu chưa có. memory_only: không đọc đĩa (gọi từ event loop)"""
+        key = (version, z, x, y)
+        with self._lock:
+            tile = self._entries.get(key)
+            if tile is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return tile
+        if memory_only:
+            return None
+        if not self.directory:
+            self.misses += 1
+            return None
+
+        try:
+            with open(self._path(*key), "rb") as f:
+                tile = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except OSError as e:
+            self.disk_errors += 1
+            print(f"⚠️ Tile cache read failed: {e}")
+            return None
+
+        self.disk_hits += 1
+        self._remember(key, tile)
+        return tile
+
+    def put(self, version: str, z: int, x: int, y: int, tile: bytes) -> None:
+        key = (version, z, x, y)
+        self._remember(key, tile)
+        if not self.directory:
+            return
+
+        path = self._path(*key)
+        try:
+            new_version = not os.path.isdir(os.path.join(self.directory, version))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Ghi file tạm rồi rename - request khác không đọc phải tile ghi dở
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(tile)
+            os.replace(temp_path, path)
+            if new_version:
+                self._prune_versions()
+        except OSError as e:
+            self.disk_errors += 1
+            print(f"⚠️ Tile cache write failed: {e}")
+
+    def _remember(self, key: Tuple[str, int, int, int], tile: bytes) -> None:
+        with self._lock:
+            self._entries[key] = tile
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _prune_versions(self) -> None:
+        """Xóa thư mục của các version cũ trên đĩa (giữ keep_versions gần nhất và tile rỗng)"""
+        versions = [
+            entry for entry in os.scandir(self.directory)
+            if entry.is_dir() and entry.name != EMPTY_TILE_VERSION
+        ]
+        versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in versions[self.keep_versions:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            print(f"🗑️ Removed tile cache version {entry.name}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "directory": self.directory,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "disk_errors": self.disk_errors,
+        }
@@ -2,18 +2,139 @@
 BigQuery Database Layer
 Quản lý kết nối và operations với Google BigQuery
 """
+from __future__ import annotations
 import os
 import json
 import base64
-from typing import Optional
-import pandas as pd
-from google.cloud import bigquery
-from google.oauth2 import service_account
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Callable, Any, Dict, Deque, Iterator, List, NamedTuple, Sequence
+from app.core.lazy import lazy_import
 from app.core.config import settings
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+bigquery = lazy_import("google.cloud.bigquery")
+service_account = lazy_import("google.oauth2.service_account")
+
+if TYPE_CHECKING:
+    from google.cloud.bigquery.table import RowIterator
+    from google.cloud.bigquery_storage import BigQueryReadClient
 
 # Global client instance - sẽ được khởi tạo khi cần
 _bigquery_client: Optional[bigquery.Client] = None
 
+# BigQuery Storage Read client dùng chung - tạo gRPC channel 1 lần thay vì mỗi lần to_dataframe()
+_bqstorage_client: Optional[BigQueryReadClient] = None
+_bqstorage_unavailable = False
+_bqstorage_lock = threading.Lock()
+
+# Executor giới hạn số BigQuery job chạy đồng thời - tránh block event loop của uvicorn
+_query_executor: Optional[ThreadPoolExecutor] = None
+
+# Đơn giá on-demand dùng để ước tính chi phí query (giống bigquery_cost_monitor.py)
+QUERY_COST_PER_TB_USD = 5.0
+
+# Tên mặc định cho query không đặt tên trong thống kê job
+UNNAMED_QUERY = "adhoc"
+
+class SchemaSpec(NamedTuple):
+    """Khai báo cột của bảng - chỉ tạo bigquery.SchemaField khi thực sự cần (không import thư viện lúc khởi động)"""
+    name: str
+    field_type: str
+    mode: str = "NULLABLE"
+
+def schema_fields(specs: Sequence[SchemaSpec]) -> List[bigquery.SchemaField]:
+    return [bigquery.SchemaField(spec.name, spec.field_type, mode=spec.mode) for spec in specs]
+
+class _QueryStatsEntry:
+    """Bộ đếm cộng dồn cho 1 named query"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.bytes_processed = 0
+        self.bytes_billed = 0
+        self.slot_millis = 0
+        self.queue_ms_total = 0.0
+        self.wall_ms_total = 0.0
+        self.wall_ms_max = 0.0
+        # Wall time các lần chạy gần nhất để tính percentile
+        self.recent_wall_ms: Deque[float] = deque(maxlen=512)
+
+class QueryStats:
+    """
+    Thống kê BigQuery job theo tên query: cache_hit, bytes processed/billed, slot_millis,
+    thời gian chờ trong queue (created -> started) và wall time phía app
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _QueryStatsEntry] = {}
+        # Ghi từ nhiều thread (executor + script đồng bộ)
+        self._lock = threading.Lock()
+
+    def record(self, name: str, job: Optional[bigquery.QueryJob], wall_seconds: float, error: bool = False) -> None:
+        """Ghi nhận 1 lần chạy query - đọc các thuộc tính job đã có sẵn sau result(), không gọi API thêm"""
+        wall_ms = wall_seconds * 1000
+        queue_ms = 0.0
+        if job is not None and job.created and job.started:
+            queue_ms = (job.started - job.created).total_seconds() * 1000
+
+        with self._lock:
+            entry = self._entries.setdefault(name, _QueryStatsEntry())
+            entry.count += 1
+            entry.wall_ms_total += wall_ms
+            entry.wall_ms_max = max(entry.wall_ms_max, wall_ms)
+            entry.recent_wall_ms.append(wall_ms)
+            entry.queue_ms_total += queue_ms
+
+            if error or job is None:
+                entry.errors += 1
+                return
+
+            entry.cache_hits += 1 if job.cache_hit else 0
+            entry.bytes_processed += job.total_bytes_processed or 0
+            entry.bytes_billed += job.total_bytes_billed or 0
+            entry.slot_millis += job.slot_millis or 0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregate theo từng named query, sắp xếp theo bytes billed giảm dần"""
+        with self._lock:
+            items = [(name, entry, list(entry.recent_wall_ms)) for name, entry in self._entries.items()]
+
+        result = {}
+        for name, entry, recent in sorted(items, key=lambda item: item[1].bytes_billed, reverse=True):
+            p50, p95 = np.percentile(recent, [50, 95]) if recent else (0.0, 0.0)
+            result[name] = {
+                "count": entry.count,
+                "errors": entry.errors,
+                "cache_hits": entry.cache_hits,
+                "cache_hit_ratio": round(entry.cache_hits / entry.count, 3) if entry.count else 0.0,
+                "bytes_processed": entry.bytes_processed,
+                "bytes_billed": entry.bytes_billed,
+                "estimated_cost_usd": round(entry.bytes_billed / 1024 ** 4 * QUERY_COST_PER_TB_USD, 6),
+                "slot_millis": entry.slot_millis,
+                "avg_queue_ms": round(entry.queue_ms_total / entry.count, 1) if entry.count else 0.0,
+                "avg_wall_ms": round(entry.wall_ms_total / entry.count, 1) if entry.count else 0.0,
+                "p50_wall_ms": round(float(p50), 1),
+                "p95_wall_ms": round(float(p95), 1),
+                "max_wall_ms": round(entry.wall_ms_max, 1),
+            }
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# Global job stats - hiển thị trên /metrics
+query_stats = QueryStats()
+
 def get_credentials():
     """
     Lấy credentials từ environment variable hoặc file
@@ -77,6 +198,266 @@ def get_bigquery_client() -> bigquery.Client:
     
     return _bigquery_client
 
+def get_bqstorage_client() -> Optional[BigQueryReadClient]:
+    """
+    Singleton BigQuery Storage Read client (tải kết quả dạng Arrow qua gRPC, song song nhiều stream)
+    Trả về None khi tắt BIGQUERY_USE_STORAGE_API, thiếu google-cloud-bigquery-storage
+    hoặc client hiện tại không phải BigQuery thật - khi đó kết quả tải qua REST tabledata API
+    """
+    global _bqstorage_client, _bqstorage_unavailable
+
+    if _bqstorage_client is not None or _bqstorage_unavailable or not settings.BIGQUERY_USE_STORAGE_API:
+        return _bqstorage_client
+
+    with _bqstorage_lock:
+        if _bqstorage_client is None and not _bqstorage_unavailable:
+            try:
+                from google.cloud import bigquery_storage
+
+                # Dùng lại credentials của BigQuery client (client giả lập của benchmark không có)
+                credentials = getattr(get_bigquery_client(), "_credentials", None)
+                if credentials is None:
+                    _bqstorage_unavailable = True
+                    return None
+                _bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=credentials)
+                print("✅ BigQuery Storage Read client initialized")
+            except Exception as e:
+                _bqstorage_unavailable = True
+                print(f"⚠️ BigQuery Storage API unavailable, using REST download: {e}")
+
+    return _bqstorage_client
+
+def _download_options() -> Dict[str, Any]:
+    """
+    Tham số tải kết quả cho to_dataframe()/to_arrow(): luôn dùng client Storage dùng chung
+    (mặc định thư viện tự tạo client mới cho mỗi lần gọi)
+    """
+    return {"bqstorage_client": get_bqstorage_client(), "create_bqstorage_client": False}
+
+def get_query_executor() -> ThreadPoolExecutor:
+    """
+    Singleton executor cho các lời gọi BigQuery đồng bộ
+    Số thread giới hạn bởi BIGQUERY_MAX_CONCURRENT_QUERIES
+    """
+    global _query_executor
+
+    if _query_executor is None:
+        _query_executor = ThreadPoolExecutor(
+            max_workers=settings.BIGQUERY_MAX_CONCURRENT_QUERIES,
+            thread_name_prefix="bigquery"
+        )
+
+    return _query_executor
+
+def shutdown_query_executor() -> None:
+    """Dừng executor khi app shutdown"""
+    global _query_executor
+
+    if _query_executor is not None:
+        _query_executor.shutdown(wait=False, cancel_futures=True)
+        _query_executor = None
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Chạy một hàm đồng bộ (BigQuery SDK) trên query executor thay vì event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_query_executor(), functools.partial(func, *args, **kwargs))
+
+def _cancel_job(job: bigquery.QueryJob) -> None:
+    """Huỷ BigQuery job phía server (best effort)"""
+    try:
+        job.cancel()
+        print(f"⚠️ Cancelled BigQuery job {job.job_id}")
+    except Exception as e:
+        print(f"❌ Error cancelling BigQuery job {job.job_id}: {e}")
+
+def _submit_job(query: str, job_config: Optional[bigquery.QueryJobConfig], timeout: float) -> bigquery.QueryJob:
+    """Tạo client (lần đầu) và submit job - API request của client.query cũng bị giới hạn bởi timeout (chạy trong executor thread)"""
+    return get_bigquery_client().query(query, job_config=_with_query_cache(job_config), timeout=timeout)
+
+def _cancel_when_submitted(submit: Future) -> None:
+    """Bước submit xong sau khi request đã hết deadline / bị huỷ - huỷ luôn job vừa tạo"""
+    if not submit.cancelled() and submit.exception() is None:
+        _cancel_job(submit.result())
+
+def _wait_for_dataframe(job: bigquery.QueryJob, timeout: float) -> pd.DataFrame:
+    """Chờ job hoàn thành rồi tải kết quả về DataFrame (chạy trong executor thread)"""
+    return job.result(timeout=timeout).to_dataframe(**_download_options())
+
+def _wait_for_arrow(job: bigquery.QueryJob, timeout: float) -> pa.Table:
+    """Chờ job hoàn thành rồi tải kết quả về Arrow Table - không qua pandas (chạy trong executor thread)"""
+    return job.result(timeout=timeout).to_arrow(**_download_options())
+
+def _wait_for_rows(job: bigquery.QueryJob, timeout: float, page_size: Optional[int]) -> RowIterator:
+    """Chờ job hoàn thành, trả về RowIterator chưa tải dữ liệu (chạy trong executor thread)"""
+    return job.result(timeout=timeout, page_size=page_size)
+
+def _with_query_cache(job_config: Optional[bigquery.QueryJobConfig]) -> bigquery.QueryJobConfig:
+    """Luôn bật BigQuery result cache (24h) trừ khi caller tắt rõ ràng"""
+    if job_config is None:
+        return bigquery.QueryJobConfig(use_query_cache=True)
+    if job_config.use_query_cache is None:
+        job_config.use_query_cache = True
+    return job_config
+
+async def _submit_and_wait(
+    name: str,
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig],
+    timeout: Optional[float],
+    waiter: Callable[..., Any],
+    *args
+) -> Any:
+    """
+    Submit job trên executor và chờ waiter(job, thời gian còn lại, *args) - timeout tính cho cả bước submit
+    Quá timeout hoặc request bị huỷ thì job BigQuery cũng bị cancel (kể cả job submit xong muộn)
+    Kết quả job (cache_hit, bytes, slot_millis, wall time) được ghi vào query_stats theo name
+    """
+    timeout = timeout or settings.BIGQUERY_QUERY_TIMEOUT_SECONDS
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    # Submit và chờ kết quả dùng chung 1 deadline
+    deadline = loop.time() + timeout
+    submit = None
+    job = None
+
+    try:
+        submit = get_query_executor().submit(_submit_job, query, job_config, timeout)
+        job = await asyncio.wait_for(asyncio.wrap_future(submit), timeout=timeout)
+        remaining = deadline - loop.time()
+        result = await asyncio.wait_for(run_blocking(waiter, job, remaining, *args), timeout=remaining)
+    except asyncio.TimeoutError:
+        query_stats.record(name, job, time.perf_counter() - started, error=True)
+        if job is None:
+            submit.add_done_callback(_cancel_when_submitted)
+            raise TimeoutError(f"BigQuery query {name} was not submitted within {timeout}s timeout")
+        get_query_executor().submit(_cancel_job, job)
+        raise TimeoutError(f"BigQuery job {job.job_id} exceeded {timeout}s timeout")
+    except asyncio.CancelledError:
+        # Client ngắt kết nối - không để job tiếp tục tốn slot
+        query_stats.record(name, job, time.perf_counter() - started, error=True)
+        if job is not None:
+            get_query_executor().submit(_cancel_job, job)
+        elif submit is not None:
+            submit.add_done_callback(_cancel_when_submitted)
+        raise
+    except Exception:
+        query_stats.record(name, job, time.perf_counter() - started, error=True)
+        raise
+
+    query_stats.record(name, job, time.perf_counter() - started)
+    return result
+
+async def run_query(
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig] = None,
+    timeout: Optional[float] = None,
+    name: str = UNNAMED_QUERY
+) -> pd.DataFrame:
+    """
+    Async facade cho client.query(...).to_dataframe()
+    - Submit job và chờ kết quả trên executor, event loop không bị block
+    - Quá timeout (mặc định BIGQUERY_QUERY_TIMEOUT_SECONDS) hoặc request bị huỷ thì job BigQuery cũng bị cancel
+    - name: tên query trong thống kê job (/metrics)
+    """
+    return await _submit_and_wait(name, query, job_config, timeout, _wait_for_dataframe)
+
+async def run_query_arrow(
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig] = None,
+    timeout: Optional[float] = None,
+    name: str = UNNAMED_QUERY
+) -> pa.Table:
+    """
+    Giống run_query nhưng trả về pyarrow.Table (tải qua Storage Read API nếu có)
+    Dùng cho kết quả lớn mà caller xử lý trực tiếp trên Arrow (serialize_table, iter_arrow_ipc...)
+    """
+    return await _submit_and_wait(name, query, job_config, timeout, _wait_for_arrow)
+
+async def run_query_pages(
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig] = None,
+    timeout: Optional[float] = None,
+    page_size: Optional[int] = None,
+    name: str = UNNAMED_QUERY
+) -> RowIterator:
+    """
+    Chạy query và trả về RowIterator để caller tự phân trang (.pages / to_arrow_iterable())
+    Dùng cho các response streaming - kết quả không bị materialize toàn bộ trong memory
+    """
+    page_size = page_size or settings.BIGQUERY_STREAM_PAGE_SIZE
+    return await _submit_and_wait(name, query, job_config, timeout, _wait_for_rows, page_size)
+
+def iter_arrow_batches(rows: RowIterator) -> Iterator[pa.RecordBatch]:
+    """
+    Arrow RecordBatch của RowIterator - qua Storage Read API khi có (batch theo read stream),
+    ngược lại theo từng page REST. Generator: client Storage chỉ được lấy khi bắt đầu đọc
+    """
+    yield from rows.to_arrow_iterable(bqstorage_client=get_bqstorage_client())
+
+def query_and_wait(
+    client: bigquery.Client,
+    query: str,
+    name: str = UNNAMED_QUERY,
+    job_config: Optional[bigquery.QueryJobConfig] = None
+) -> bigquery.QueryJob:
+    """
+    Bản đồng bộ cho script/background job (MERGE, DDL): client.query(...).result() kèm ghi thống kê job
+    """
+    started = time.perf_counter()
+    job = None
+    try:
+        job = client.query(query, job_config=job_config)
+        job.result()
+    except Exception:
+        query_stats.record(name, job, time.perf_counter() - started, error=True)
+        raise
+
+    query_stats.record(name, job, time.perf_counter() - started)
+    return job
+
+def _table_modified(table: str) -> datetime:
+    """Thời điểm sửa đổi cuối của bảng (get_table đọc metadata, không phải query job - chạy trong executor thread)"""
+    return get_bigquery_client().get_table(table).modified
+
+class TableVersion:
+    """
+    Version dữ liệu của 1 bảng cho ETag / routing: thời điểm sửa đổi cuối của bảng
+    - Đổi theo mọi load job / MERGE / DML, từ bất kỳ process nào - mọi worker thấy cùng 1 giá trị
+    - Metadata cache ttl_seconds; invalidate() để process vừa ghi bảng đọc lại ngay ở lần get() sau
+    - Đọc lỗi -> None (caller coi như không có version)
+    """
+
+    def __init__(self, table: str, ttl_seconds: int):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self._modified: Optional[datetime] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._checked_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < self.ttl_seconds
+
+    async def modified(self) -> Optional[datetime]:
+        if not self._is_fresh():
+            async with self._lock:
+                if not self._is_fresh():
+                    try:
+                        self._modified = await run_blocking(_table_modified, self.table)
+                    except Exception as e:
+                        print(f"⚠️ Table metadata unavailable for {self.table}: {e}")
+                        self._modified = None
+                    self._checked_at = time.monotonic()
+        return self._modified
+
+    async def get(self) -> Optional[str]:
+        modified = await self.modified()
+        return modified.isoformat() if modified is not None else None
+
 def test_connection() -> bool:
     """
     Test kết nối BigQuery
@@ -180,23 +561,12 @@ def insert_sample_data():
             {"id": 4, "name": "Chair", "description": "Office chair", "price": 150.0, "category": "Furniture"},
         ]
         
-        # Insert users
-        users_table = f"{settings.GOOGLE_CLOUD_PROJECT}.{settings.BIGQUERY_DATASET}.users"
-        for user in users_data:
-            query = f"""
-            INSERT INTO `{users_table}` (id, name, email, age, created_at)
-            VALUES ({user['id']}, '{user['name']}', '{user['email']}', {user['age']}, CURRENT_TIMESTAMP())
-            """
-            client.query(query).result()
-        
-        # Insert items
-        items_table = f"{settings.GOOGLE_CLOUD_PROJECT}.{settings.BIGQUERY_DATASET}.items"
-        for item in items_data:
-            query = f"""
-            INSERT INTO `{items_table}` (id, name, description, price, category, created_at)
-            VALUES ({item['id']}, '{item['name']}', '{item['description']}', {item['price']}, '{item['category']}', CURRENT_TIMESTAMP())
-            """
-            client.query(query).result()
+        # Upsert theo id (load job + MERGE) - chạy lại không tạo bản ghi trùng
+        from app.db.ingestion import upsert_frame
+        created_at = pd.Timestamp.now(tz="UTC")
+        for table_name, rows in (("users", users_data), ("items", items_data)):
+            frame = pd.DataFrame(rows).assign(created_at=created_at)
+            upsert_frame(frame, f"{settings.GOOGLE_CLOUD_PROJECT}.{settings.BIGQUERY_DATASET}.{table_name}", ["id"], client=client)
         
         print("✅ Sample data inserted successfully")
         return True
@@ -211,7 +581,10 @@ async def bigquery_health_check() -> dict:
     Health check cho BigQuery connection
     """
     try:
-        is_connected = test_connection()
+        is_connected = await asyncio.wait_for(
+            run_blocking(test_connection),
+            timeout=settings.BIGQUERY_QUERY_TIMEOUT_SECONDS
+        )
         
         # Kiểm tra credentials source
         credentials_source = "environment" if os.getenv("GOOGLE_APPLICATION_CREDENTIALS_BASE64") else "file"
@@ -0,0 +1,236 @@
+"""
+Dimension Cache - Dim_Location và Dim_Time trong memory
+Preload khi app khởi động, refresh định kỳ; fact query chỉ lấy location_key/time_key + measures
+và JOIN với dimension được thực hiện trong memory
+"""
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from app.core.lazy import lazy_import
+from app.core.config import settings
+from app.core.spatial import LocationIndex
+from app.db.bigquery import run_query
+from app.db.queries import fact_window, hours_ago, run_template, table_id
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+bigquery = lazy_import("google.cloud.bigquery")
+
+# Không có time_key nào sau mốc thời gian - filter time_key >= giá trị này không khớp record nào
+NO_TIME_KEY = 2 ** 63 - 1
+
+class DimensionCache:
+    """
+    Cache Dim_Location (toàn bộ ~30 trạm) và cửa sổ Dim_Time gần nhất (DIM_TIME_WINDOW_DAYS)
+    - locations / location_index: phục vụ /aqi/locations và resolve lat/lng không cần I/O
+    - time_key -> time: map vectorized cho kết quả fact query
+    """
+
+    def __init__(self):
+        self.locations: List[Dict[str, Any]] = []
+        self.location_index: Optional[LocationIndex] = None
+        self.window_start: Optional[pd.Timestamp] = None
+        self.loaded_at: Optional[datetime] = None
+        # DataFrame/Series rỗng chỉ tạo khi dùng lần đầu - khởi tạo module không import pandas
+        self._locations_df: Optional[pd.DataFrame] = None
+        # time_key -> time (datetime64 UTC, không kèm tz để so sánh nhanh)
+        self._time_series: Optional[pd.Series] = None
+        self._max_time_key: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def locations_df(self) -> pd.DataFrame:
+        if self._locations_df is None:
+            self._locations_df = pd.DataFrame()
+        return self._locations_df
+
+    @locations_df.setter
+    def locations_df(self, value: pd.DataFrame) -> None:
+        self._locations_df = value
+
+    @property
+    def _time_by_key(self) -> pd.Series:
+        if self._time_series is None:
+            self._time_series = pd.Series(dtype="datetime64[ns]")
+        return self._time_series
+
+    @_time_by_key.setter
+    def _time_by_key(self, value: pd.Series) -> None:
+        self._time_series = value
+
+    @property
+    def loaded(self) -> bool:
+        return self.location_index is not None
+
+    async def refresh(self) -> None:
+        """Load lại Dim_Location và cửa sổ Dim_Time (2 query chạy song song)"""
+        window_days = settings.DIM_TIME_WINDOW_DAYS
+        locations_query = f"""
+        SELECT
+            location_key,
+            location_name,
+            latitude,
+            longitude
+        FROM
+            `{table_id("Dim_Location")}`
+        WHERE
+            latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY location_name
+        """
+        time_query = f"""
+        SELECT
+            time_key,
+            time
+        FROM
+            `{table_id("Dim_Time")}`
+        WHERE
+            time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(window_days)} DAY)
+        """
+        window_start = pd.Timestamp(datetime.now(timezone.utc) - timedelta(days=window_days))
+        locations_df, time_df = await asyncio.gather(
+            run_query(locations_query, name="dim_location"),
+            run_query(time_query, name="dim_time_window")
+        )
+
+        if locations_df.empty:
+            raise ValueError("Dim_Location is empty")
+
+        locations_df = locations_df.assign(
+            location_key=locations_df['location_key'].astype('int64'),
+            location_name=locations_df['location_name'].fillna('Unknown').astype(str),
+            latitude=locations_df['latitude'].astype(float),
+            longitude=locations_df['longitude'].astype(float)
+        )
+        locations_df['district'] = locations_df['location_name']
+
+        time_by_key = _time_series(time_df)
+
+        # Swap toàn bộ state cùng lúc - request đang chạy không thấy cache nửa vời
+        self.locations_df = locations_df.reset_index(drop=True)
+        self.locations = locations_df[['location_key', 'location_name', 'latitude', 'longitude']].to_dict('records')
+        self.location_index = LocationIndex(self.locations)
+        self._time_by_key = time_by_key
+        self._max_time_key = int(time_by_key.index.max()) if len(time_by_key) else None
+        self.window_start = window_start
+        self.loaded_at = datetime.now()
+
+        print(f"✅ Dimension cache: {len(self.locations)} locations, {len(time_by_key)} time keys")
+
+    async def ensure_loaded(self) -> "DimensionCache":
+        """Load lần đầu nếu chưa có (chỉ 1 request chạy query)"""
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self.refresh()
+        return self
+
+    def time_key_since(self, since: datetime) -> Optional[int]:
+        """
+        time_key nhỏ nhất có time >= since (time_key tăng theo time)
+        None nếu since nằm ngoài cửa sổ Dim_Time đang cache
+        """
+        if self.window_start is None or pd.Timestamp(since) < self.window_start:
+            return None
+
+        since_utc = pd.Timestamp(since).tz_convert('UTC').tz_localize(None)
+        keys = self._time_by_key.index[self._time_by_key.to_numpy() >= since_utc.to_datetime64()]
+        if len(keys):
+            return int(keys.min())
+        # Chưa có time_key nào mới hơn trong cache - mọi key mới đều lớn hơn key lớn nhất đã biết
+        return self._max_time_key + 1 if self._max_time_key is not None else None
+
+    async def ensure_time_keys(self, keys: np.ndarray) -> None:
+        """Load thêm các time_key chưa có trong cửa sổ cache (dữ liệu cũ hoặc giờ mới ingest)"""
+        missing = pd.Index(pd.unique(keys)).difference(self._time_by_key.index)
+        if missing.empty:
+            return
+
+        query = f"""
+        SELECT time_key, time
+        FROM `{table_id("Dim_Time")}`
+        WHERE time_key IN UNNEST(@time_keys)
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter("time_keys", "INT64", [int(k) for k in missing])
+        ])
+        df = await run_query(query, job_config=job_config, name="dim_time_keys")
+        if not df.empty:
+            extra = _time_series(df)
+            self._time_by_key = pd.concat([self._time_by_key, extra]).sort_index()
+            self._time_by_key = self._time_by_key[~self._time_by_key.index.duplicated(keep='last')]
+            self._max_time_key = int(self._time_by_key.index.max())
+
+    async def attach_time(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Thêm cột time từ time_key (thay cho JOIN Dim_Time trong BigQuery)"""
+        if df.empty:
+            return df.assign(time=pd.Series(dtype="datetime64[ns, UTC]"))
+
+        keys = df['time_key'].dropna().astype('int64').to_numpy()
+        await self.ensure_time_keys(keys)
+        times = df['time_key'].map(self._time_by_key)
+        return df.assign(time=pd.to_datetime(times, utc=True))
+
+    async def since_time_key(self, hours: int) -> int:
+        """
+        time_key đầu tiên trong N giờ gần nhất (mốc làm tròn theo giờ)
+        Thay cho JOIN Dim_Time + TIMESTAMP_SUB(CURRENT_TIMESTAMP()...) - giá trị ổn định trong 1 giờ
+        nên query fact dùng được BigQuery result cache
+        """
+        since = hours_ago(hours)
+        key = self.time_key_since(since)
+        if key is not None:
+            return key
+
+        # Mốc nằm ngoài cửa sổ cache - hỏi Dim_Time
+        df = await run_template("dim_time_key_since", since=since)
+        if df.empty or pd.isna(df['time_key'].iloc[0]):
+            return NO_TIME_KEY
+        return int(df['time_key'].iloc[0])
+
+    async def fact_window(self, hours: int) -> Dict[str, Any]:
+        """Tham số cửa sổ N giờ gần nhất cho template fact (time_key + mốc partition)"""
+        return fact_window(await self.since_time_key(hours), hours_ago(hours))
+
+    def attach_locations(self, df: pd.DataFrame, keep_all_locations: bool = False) -> pd.DataFrame:
+        """
+        Thêm latitude/longitude/location_name/district từ location_key (thay cho JOIN Dim_Location)
+        keep_all_locations: giữ cả location chưa có dữ liệu fact (LEFT JOIN từ Dim_Location)
+        """
+        facts = df.assign(location_key=df['location_key'].astype('int64'))
+        if keep_all_locations:
+            return self.locations_df.merge(facts, on='location_key', how='left')
+        return facts.merge(self.locations_df, on='location_key', how='inner')
+
+def _time_series(df: pd.DataFrame) -> pd.Series:
+    """DataFrame (time_key, time) -> Series time theo index time_key"""
+    times = pd.to_datetime(df['time'], utc=True).dt.tz_localize(None)
+    return pd.Series(times.to_numpy(), index=df['time_key'].astype('int64').to_numpy()).sort_index()
+
+# Global dimension cache instance
+dimension_cache = DimensionCache()
+
+async def get_dimensions() -> DimensionCache:
+    """Dimension cache đã được load"""
+    return await dimension_cache.ensure_loaded()
+
+async def resolve_station(lat: float, lng: float) -> Optional[Dict[str, Any]]:
+    """
+    Trạm gần nhất với tọa độ (trong bán kính NEAREST_STATION_MAX_KM)
+    None nếu không có trạm nào đủ gần hoặc không load được Dim_Location
+    """
+    try:
+        dimensions = await get_dimensions()
+    except Exception as e:
+        print(f"❌ Dimension cache error: {e}")
+        return None
+
+    return dimensions.location_index.nearest_one(lat, lng, max_distance_km=settings.NEAREST_STATION_MAX_KM)
+
+async def dimension_refresh_loop(interval_minutes: int) -> None:
+    """Background task: preload dimension khi khởi động và refresh định kỳ"""
+    while True:
+        try:
+            await dimension_cache.refresh()
+        except Exception as e:
+            print(f"❌ Dimension cache refresh error: {e}")
+        await asyncio.sleep(interval_minutes * 60)
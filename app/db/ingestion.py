@@ -0,0 +1,215 @@
+"""
+Ingestion - Ghi dữ liệu quan trắc vào BigQuery theo batch
+- Quan trắc theo giờ được gom vào buffer, flush khi đủ INGEST_BATCH_ROWS hoặc quá INGEST_FLUSH_SECONDS
+- Mỗi lần flush: 1 load job Parquet vào bảng staging tạm + 1 MERGE theo khóa (location_key, time_key)
+  => idempotent (chạy lại cùng dữ liệu không tạo bản ghi trùng) và không tốn quota DML từng dòng
+- fact_version: version dữ liệu bảng fact (ETag của API) - đổi theo mọi lần ghi, kể cả backfill / sửa dữ liệu cũ
+"""
+from __future__ import annotations
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Union
+from app.core.lazy import lazy_import
+from app.core.config import settings
+from app.db.bigquery import TableVersion, get_bigquery_client, query_and_wait
+from app.db.queries import FACT_TIME_COLUMN, table_id
+pd = lazy_import("pandas")
+bigquery = lazy_import("google.cloud.bigquery")
+
+FACT_TABLE_NAME = "Fact_Weather_AirQuality"
+FACT_KEYS = ("location_key", "time_key")
+# Cột giờ quan trắc (UTC) tùy chọn trong batch - thành cột partition khi bảng fact đã partition
+OBSERVATION_TIME = "time"
+
+# Bảng staging tạm tự hết hạn nếu process chết giữa load và MERGE
+STAGING_EXPIRATION = timedelta(hours=6)
+
+def load_frame(
+    client: bigquery.Client,
+    frame: pd.DataFrame,
+    destination: str,
+    write_disposition: str = "WRITE_APPEND"
+) -> bigquery.LoadJob:
+    """Load DataFrame vào bảng bằng 1 load job Parquet (miễn phí, không tính quota DML)"""
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=write_disposition
+    )
+    job = client.load_table_from_dataframe(frame, destination, job_config=job_config)
+    job.result()
+    return job
+
+def build_merge(
+    target: str,
+    staging: str,
+    keys: Sequence[str],
+    columns: Sequence[str],
+    source_sql: Optional[str] = None,
+    target_filter: str = ""
+) -> str:
+    """
+    MERGE staging -> target theo keys: cập nhật các cột có trong batch, thêm dòng chưa có
+    source_sql: câu SELECT nguồn thay cho bảng staging (vd: JOIN thêm cột), target_filter: giới hạn partition đích
+    """
+    values = [c for c in columns if c not in keys]
+    source = f"({source_sql})" if source_sql else f"`{staging}`"
+    on = " AND ".join(f"T.{key} = S.{key}" for key in keys)
+    return f"""
+    MERGE `{target}` T
+    USING {source} S
+    ON {on}{f" AND {target_filter}" if target_filter else ""}
+    WHEN MATCHED THEN UPDATE SET
+        {", ".join(f"{c} = S.{c}" for c in values)}
+    WHEN NOT MATCHED THEN INSERT ({", ".join(columns)})
+    VALUES ({", ".join(f"S.{c}" for c in columns)})
+    """
+
+def upsert_frame(
+    frame: pd.DataFrame,
+    table: str,
+    keys: Sequence[str],
+    source_sql: Optional[str] = None,
+    extra_columns: Sequence[str] = (),
+    target_filter: str = "",
+    client: Optional[bigquery.Client] = None
+) -> int:
+    """
+    Upsert DataFrame vào table: load job vào bảng staging tạm rồi MERGE theo keys
+    Dòng trùng khóa trong batch giữ bản ghi sau cùng. Trả về số dòng MERGE ảnh hưởng
+    source_sql: SELECT nguồn ({staging} được thay bằng id bảng staging), extra_columns: cột source_sql thêm vào
+    """
+    if frame.empty:
+        return 0
+
+    client = client or get_bigquery_client()
+    frame = frame.drop_duplicates(subset=list(keys), keep="last")
+    staging = f"{table}_staging_{uuid.uuid4().hex[:12]}"
+    try:
+        load_frame(client, frame, staging, write_disposition="WRITE_TRUNCATE")
+        staging_table = client.get_table(staging)
+        staging_table.expires = datetime.now(timezone.utc) + STAGING_EXPIRATION
+        client.update_table(staging_table, ["expires"])
+
+        query = build_merge(
+            table, staging, keys, [*frame.columns, *extra_columns],
+            source_sql=source_sql.format(staging=staging) if source_sql else None,
+            target_filter=target_filter
+        )
+        job = query_and_wait(client, query, name=f"ingest_merge_{table.rsplit('.', 1)[-1]}")
+        return job.num_dml_affected_rows or 0
+    finally:
+        client.delete_table(staging, not_found_ok=True)
+
+def upsert_facts(frame: pd.DataFrame, client: Optional[bigquery.Client] = None) -> int:
+    """
+    Upsert quan trắc (location_key, time_key + measures, tùy chọn cột time) vào Fact_Weather_AirQuality
+    Bảng đã partition (FACT_PARTITION_COLUMN): ghi cột partition từ time (hoặc Dim_Time khi batch không có time)
+    và giới hạn MERGE trong khoảng thời gian của batch để chỉ quét các partition đó
+    """
+    times = pd.to_datetime(frame[OBSERVATION_TIME], utc=True) if OBSERVATION_TIME in frame else None
+    frame = frame.drop(columns=[OBSERVATION_TIME], errors="ignore")
+    if not FACT_TIME_COLUMN:
+        affected = upsert_frame(frame, table_id(FACT_TABLE_NAME), FACT_KEYS, client=client)
+    elif times is None:
+        source_sql = f"""
+            SELECT s.*, t.time AS {FACT_TIME_COLUMN}
+            FROM `{{staging}}` s
+            JOIN `{table_id("Dim_Time")}` t ON s.time_key = t.time_key
+        """
+        affected = upsert_frame(
+            frame, table_id(FACT_TABLE_NAME), FACT_KEYS,
+            source_sql=source_sql, extra_columns=[FACT_TIME_COLUMN], client=client
+        )
+    else:
+        frame = frame.assign(**{FACT_TIME_COLUMN: times})
+        target_filter = (
+            f"T.{FACT_TIME_COLUMN} BETWEEN TIMESTAMP('{times.min().isoformat()}') AND TIMESTAMP('{times.max().isoformat()}')"
+        )
+        affected = upsert_frame(frame, table_id(FACT_TABLE_NAME), FACT_KEYS, target_filter=target_filter, client=client)
+
+    # MERGE có thể chỉ sửa giờ cũ (time_key mới nhất không đổi) - đọc lại thời điểm sửa đổi của bảng ngay
+    fact_version.invalidate()
+    return affected
+
+# Version dữ liệu bảng fact cho ETag các endpoint đọc fact (thời điểm sửa đổi cuối của bảng)
+fact_version = TableVersion(table_id(FACT_TABLE_NAME), ttl_seconds=settings.FACT_VERSION_TTL_SECONDS)
+
+def get_fact_version() -> TableVersion:
+    return fact_version
+
+class FactIngestBuffer:
+    """
+    Buffer quan trắc theo giờ trước khi ghi vào bảng fact
+    add() chỉ append vào memory; flush() ghi cả buffer bằng 1 load job + 1 MERGE
+    """
+
+    def __init__(self, batch_rows: int = settings.INGEST_BATCH_ROWS, flush_seconds: float = settings.INGEST_FLUSH_SECONDS):
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self._frames: List[pd.DataFrame] = []
+        self._rows = 0
+        self._oldest: Optional[float] = None
+        # add() từ request/thread khác trong lúc flush đang chạy trên executor
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.flushes = 0
+        self.errors = 0
+
+    @property
+    def pending_rows(self) -> int:
+        return self._rows
+
+    def add(self, observations: Union[pd.DataFrame, List[Dict[str, Any]]]) -> bool:
+        """Thêm quan trắc (cần location_key, time_key), trả về True khi buffer đã đủ để flush"""
+        frame = observations if isinstance(observations, pd.DataFrame) else pd.DataFrame(observations)
+        missing = set(FACT_KEYS) - set(frame.columns)
+        if missing:
+            raise ValueError(f"Observations missing key columns: {sorted(missing)}")
+        if frame.empty:
+            return self.should_flush()
+
+        with self._lock:
+            self._frames.append(frame)
+            self._rows += len(frame)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        return self.should_flush()
+
+    def should_flush(self) -> bool:
+        if not self._rows:
+            return False
+        return self._rows >= self.batch_rows or time.monotonic() - self._oldest >= self.flush_seconds
+
+    def flush(self) -> int:
+        """Ghi toàn bộ buffer (đồng bộ). Lỗi thì đưa dữ liệu trở lại buffer để lần sau ghi lại"""
+        with self._lock:
+            frames, self._frames = self._frames, []
+            self._rows, self._oldest = 0, None
+        if not frames:
+            return 0
+
+        batch = pd.concat(frames, ignore_index=True)
+        try:
+            affected = upsert_facts(batch)
+        except Exception:
+            self.errors += 1
+            with self._lock:
+                self._frames.insert(0, batch)
+                self._rows += len(batch)
+                self._oldest = self._oldest or time.monotonic()
+            raise
+
+        self.flushes += 1
+        self.rows_written += len(batch)
+        print(f"✅ Ingested {len(batch)} observations into {FACT_TABLE_NAME} ({affected} rows merged)")
+        return affected
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_rows": self._rows,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
@@ -0,0 +1,366 @@
+"""
+Query Templates - Registry các câu SQL có tham số (ScalarQueryParameter)
+SQL text cố định cho mỗi template, giá trị request truyền qua query parameter đã chuẩn hoá
+=> cùng 1 request logic luôn sinh cùng 1 BigQuery job (dùng được BigQuery result cache)
+"""
+from __future__ import annotations
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, NamedTuple, Optional, Union
+from app.core.lazy import lazy_import
+from app.core.config import settings
+from app.db.bigquery import run_query, run_query_arrow, run_query_pages
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+bigquery = lazy_import("google.cloud.bigquery")
+
+if TYPE_CHECKING:
+    from google.cloud.bigquery.table import RowIterator
+
+def table_id(name: str) -> str:
+    """Full table id trong dataset của project"""
+    return f"{settings.GOOGLE_CLOUD_PROJECT}.{settings.BIGQUERY_DATASET}.{name}"
+
+def normalize_date(value: Union[str, date, datetime]) -> date:
+    """'YYYY-MM-DD' / datetime -> date (bỏ phần giờ), raise ValueError nếu sai định dạng"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+def normalize_timestamp(value: datetime) -> datetime:
+    """Làm tròn xuống đầu giờ (UTC) - dữ liệu fact có độ phân giải 1 giờ"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def hours_ago(hours: int) -> datetime:
+    """Mốc thời gian N giờ trước, đã làm tròn theo giờ"""
+    return normalize_timestamp(datetime.now(timezone.utc) - timedelta(hours=hours))
+
+# Chuẩn hoá giá trị theo kiểu BigQuery của parameter
+_NORMALIZERS: Dict[str, Callable[[Any], Any]] = {
+    "INT64": int,
+    "FLOAT64": float,
+    "STRING": str,
+    "BOOL": bool,
+    "DATE": normalize_date,
+    "TIMESTAMP": normalize_timestamp,
+}
+
+class BoundQuery(NamedTuple):
+    """Template đã gắn giá trị parameter - sẵn sàng submit"""
+    name: str
+    sql: str
+    job_config: bigquery.QueryJobConfig
+
+class QueryTemplate:
+    """
+    1 câu SQL cố định với các named parameter (@name)
+    params: tên parameter -> kiểu BigQuery (INT64, FLOAT64, STRING, BOOL, DATE, TIMESTAMP)
+    """
+
+    def __init__(self, name: str, sql: str, params: Dict[str, str]):
+        for param_type in params.values():
+            if param_type not in _NORMALIZERS:
+                raise ValueError(f"Unsupported parameter type: {param_type}")
+        self.name = name
+        self.sql = sql
+        self.params = params
+
+    def bind(self, **values: Any) -> BoundQuery:
+        """Gắn giá trị (đã chuẩn hoá) vào template, raise ValueError khi thiếu/thừa parameter"""
+        missing = self.params.keys() - values.keys()
+        extra = values.keys() - self.params.keys()
+        if missing or extra:
+            raise ValueError(f"Template {self.name}: missing={sorted(missing)} unexpected={sorted(extra)}")
+
+        query_parameters = [
+            bigquery.ScalarQueryParameter(param, param_type, _NORMALIZERS[param_type](values[param]))
+            for param, param_type in sorted(self.params.items())
+        ]
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters, use_query_cache=True)
+        return BoundQuery(self.name, self.sql, job_config)
+
+# Registry toàn cục: tên template -> QueryTemplate
+_templates: Dict[str, QueryTemplate] = {}
+
+def register_template(name: str, sql: str, **params: str) -> QueryTemplate:
+    """Đăng ký template (tên không được trùng)"""
+    if name in _templates:
+        raise ValueError(f"Query template already registered: {name}")
+    template = QueryTemplate(name, sql, params)
+    _templates[name] = template
+    return template
+
+def get_template(name: str) -> QueryTemplate:
+    """Lấy template theo tên, KeyError nếu chưa đăng ký"""
+    return _templates[name]
+
+def bind(name: str, **values: Any) -> BoundQuery:
+    """Shortcut: get_template(name).bind(**values)"""
+    return get_template(name).bind(**values)
+
+async def run_bound(query: BoundQuery, timeout: Optional[float] = None) -> pd.DataFrame:
+    """Chạy query đã bind qua async facade"""
+    return await run_query(query.sql, job_config=query.job_config, timeout=timeout, name=query.name)
+
+async def run_template(name: str, **values: Any) -> pd.DataFrame:
+    """Bind và chạy template, trả về DataFrame"""
+    return await run_bound(bind(name, **values))
+
+async def run_template_arrow(name: str, **values: Any) -> pa.Table:
+    """Bind và chạy template, trả về Arrow Table (không chuyển sang pandas)"""
+    query = bind(name, **values)
+    return await run_query_arrow(query.sql, job_config=query.job_config, name=query.name)
+
+async def run_template_pages(name: str, **values: Any) -> RowIterator:
+    """Bind và chạy template, trả về RowIterator cho response streaming"""
+    query = bind(name, **values)
+    return await run_query_pages(query.sql, job_config=query.job_config, name=query.name)
+
+# ---------------------------------------------------------------------------
+# Templates cho các endpoint AQI / Forecast
+# ---------------------------------------------------------------------------
+
+FACT_TABLE = table_id("Fact_Weather_AirQuality")
+DIM_TIME_TABLE = table_id("Dim_Time")
+DIM_LOCATION_TABLE = table_id("Dim_Location")
+
+# Cột TIMESTAMP partition của bảng fact sau khi chạy scripts/partition_fact_table.py (rỗng = chưa partition)
+FACT_TIME_COLUMN = settings.FACT_PARTITION_COLUMN
+
+def fact_time(alias: str = "f") -> str:
+    """Thời điểm của dòng fact: cột partition (prune được) hoặc t.time qua JOIN Dim_Time"""
+    return f"{alias}.{FACT_TIME_COLUMN}" if FACT_TIME_COLUMN else "t.time"
+
+def join_dim_time(alias: str = "f") -> str:
+    """JOIN Dim_Time để lấy t.time - bỏ khi fact đã có cột thời gian"""
+    if FACT_TIME_COLUMN:
+        return ""
+    return f"JOIN `{DIM_TIME_TABLE}` t ON {alias}.time_key = t.time_key"
+
+def fact_partition_filter(alias: str = "f") -> str:
+    """Điều kiện theo @since trên cột partition (kèm điều kiện time_key) - rỗng khi chưa partition"""
+    return f"AND {alias}.{FACT_TIME_COLUMN} >= @since" if FACT_TIME_COLUMN else ""
+
+# Tham số cửa sổ thời gian của các template lọc fact theo time_key
+FACT_WINDOW_PARAMS: Dict[str, str] = {"since_time_key": "INT64", **({"since": "TIMESTAMP"} if FACT_TIME_COLUMN else {})}
+
+def fact_window(since_time_key: int, since: datetime) -> Dict[str, Any]:
+    """
+    Giá trị cho FACT_WINDOW_PARAMS: time_key quyết định kết quả, since (<= thời điểm của since_time_key)
+    chỉ để BigQuery prune partition khi bảng đã partition
+    """
+    window: Dict[str, Any] = {"since_time_key": since_time_key}
+    if FACT_TIME_COLUMN:
+        window["since"] = since
+    return window
+
+# time_key nhỏ nhất từ một mốc thời gian - dùng khi mốc nằm ngoài cửa sổ Dim_Time đang cache
+register_template("dim_time_key_since", f"""
+    SELECT MIN(time_key) AS time_key
+    FROM `{DIM_TIME_TABLE}`
+    WHERE time >= @since
+    """, since="TIMESTAMP")
+
+# Bản ghi mới nhất của mỗi trạm trong cửa sổ gần đây - QUALIFY chỉ chạy trên các partition của cửa sổ
+register_template("aqi_latest_snapshot", f"""
+    SELECT
+        f.location_key,
+        f.time_key,
+        f.pm2_5,
+        f.pm10,
+        f.temperature_2m,
+        f.relative_humidity_2m,
+        f.wind_speed_10m,
+        f.wind_direction_10m,
+        f.pressure_msl,
+        f.AQI_TOTAL
+    FROM
+        `{FACT_TABLE}` f
+    WHERE
+        f.AQI_TOTAL IS NOT NULL
+        AND f.time_key >= @since_time_key
+        {fact_partition_filter()}
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY f.location_key ORDER BY f.time_key DESC) = 1
+    """, **FACT_WINDOW_PARAMS)
+
+register_template("aqi_detail", f"""
+    SELECT
+        f.time_key,
+        f.pm2_5,
+        f.pm10,
+        f.temperature_2m,
+        f.relative_humidity_2m,
+        f.wind_speed_10m,
+        f.wind_direction_10m,
+        f.pressure_msl,
+        f.AQI_TOTAL as AQI_TOTAL
+    FROM
+        `{FACT_TABLE}` f
+    WHERE
+        f.location_key = @location_key
+        AND f.time_key >= @since_time_key
+        {fact_partition_filter()}
+    ORDER BY f.time_key DESC
+    LIMIT 1
+    """, location_key="INT64", **FACT_WINDOW_PARAMS)
+
+# Bảng đã partition: so sánh trực tiếp cột partition với mốc đầu/cuối ngày (UTC) để prune
+_AQI_RANGE_WINDOW = (
+    f"{fact_time()} >= TIMESTAMP(@start_date) AND {fact_time()} < TIMESTAMP(DATE_ADD(@end_date, INTERVAL 1 DAY))"
+    if FACT_TIME_COLUMN else
+    "DATE(t.time) BETWEEN @start_date AND @end_date"
+)
+
+_AQI_RANGE_SQL = f"""
+    SELECT
+        l.latitude,
+        l.longitude,
+        l.location_name,
+        l.location_name as district,
+        {fact_time()} as time,
+        f.pm2_5,
+        f.pm10,
+        f.temperature_2m,
+        f.relative_humidity_2m,
+        f.wind_speed_10m,
+        f.AQI_TOTAL as AQI_TOTAL
+    FROM
+        `{DIM_LOCATION_TABLE}` l
+    JOIN
+        `{FACT_TABLE}` f
+    ON
+        l.location_key = f.location_key
+    {join_dim_time()}
+    WHERE
+        {_AQI_RANGE_WINDOW}
+        AND f.AQI_TOTAL IS NOT NULL
+    ORDER BY {fact_time()} DESC
+    """
+
+register_template("aqi_date_range", _AQI_RANGE_SQL + "LIMIT @limit\n",
+                  start_date="DATE", end_date="DATE", limit="INT64")
+
+# Export (NDJSON / Arrow) - không giới hạn số record
+register_template("aqi_date_range_export", _AQI_RANGE_SQL, start_date="DATE", end_date="DATE")
+
+# Thống kê tổng quan N giờ gần nhất (/aqi/stats)
+register_template("aqi_stats", f"""
+    SELECT
+        COUNT(DISTINCT l.location_key) as total_locations,
+        COUNT(*) as total_records,
+        AVG(f.AQI_TOTAL) as avg_aqi,
+        MIN(f.AQI_TOTAL) as min_aqi,
+        MAX(f.AQI_TOTAL) as max_aqi,
+        AVG(f.pm2_5) as avg_pm2_5,
+        AVG(f.pm10) as avg_pm10,
+        AVG(f.temperature_2m) as avg_temperature,
+        AVG(f.relative_humidity_2m) as avg_humidity
+    FROM
+        `{DIM_LOCATION_TABLE}` l
+    JOIN
+        `{FACT_TABLE}` f
+    ON
+        l.location_key = f.location_key
+    {join_dim_time()}
+    WHERE
+        {fact_time()} >= @since
+        AND f.AQI_TOTAL IS NOT NULL
+    """, since="TIMESTAMP")
+
+register_template("forecast_hourly", f"""
+    SELECT
+        f.time_key,
+        f.pm2_5,
+        f.pm10,
+        f.temperature_2m,
+        f.relative_humidity_2m,
+        f.wind_speed_10m,
+        f.wind_direction_10m,
+        f.pressure_msl,
+        f.AQI_TOTAL as aqi
+    FROM
+        `{FACT_TABLE}` f
+    WHERE
+        f.location_key = @location_key
+        AND f.time_key >= @since_time_key
+        {fact_partition_filter()}
+    ORDER BY f.time_key ASC
+    LIMIT 24
+    """, location_key="INT64", **FACT_WINDOW_PARAMS)
+
+register_template("forecast_daily_raw", f"""
+    SELECT
+        DATE({fact_time()}) as date,
+        AVG(f.pm2_5) as avg_pm2_5,
+        AVG(f.pm10) as avg_pm10,
+        AVG(f.temperature_2m) as avg_temperature,
+        AVG(f.relative_humidity_2m) as avg_humidity,
+        AVG(f.wind_speed_10m) as avg_wind_speed,
+        AVG(f.AQI_TOTAL) as avg_aqi,
+        MAX(f.AQI_TOTAL) as max_aqi,
+        MIN(f.AQI_TOTAL) as min_aqi,
+        COUNT(*) as data_points
+    FROM
+        `{FACT_TABLE}` f
+    {join_dim_time()}
+    WHERE
+        f.location_key = @location_key
+        AND {fact_time()} >= @since
+    GROUP BY DATE({fact_time()})
+    ORDER BY date ASC
+    LIMIT 7
+    """, location_key="INT64", since="TIMESTAMP")
+
+register_template("forecast_trends_raw", f"""
+    SELECT
+        DATE({fact_time()}) as date,
+        AVG(f.pm2_5) as avg_pm2_5,
+        AVG(f.pm10) as avg_pm10,
+        AVG(f.temperature_2m) as avg_temperature,
+        AVG(f.relative_humidity_2m) as avg_humidity,
+        COUNT(*) as data_points,
+        AVG(f.AQI_TOTAL) as avg_aqi
+    FROM
+        `{FACT_TABLE}` f
+    {join_dim_time()}
+    WHERE
+        f.location_key = @location_key
+        AND {fact_time()} >= @since
+    GROUP BY DATE({fact_time()})
+    ORDER BY date ASC
+    """, location_key="INT64", since="TIMESTAMP")
+
+# Input cho forecast engine: chuỗi giờ gần nhất của tất cả trạm trong 1 query
+register_template("forecast_model_inputs", f"""
+    SELECT
+        f.location_key,
+        f.time_key,
+        f.AQI_TOTAL,
+        f.pm2_5,
+        f.pm10,
+        f.temperature_2m,
+        f.relative_humidity_2m,
+        f.wind_speed_10m
+    FROM
+        `{FACT_TABLE}` f
+    WHERE
+        f.time_key >= @since_time_key
+        {fact_partition_filter()}
+    """, **FACT_WINDOW_PARAMS)
+
+# time_key mới nhất trong bảng fact - phát hiện lần ingest mới
+register_template("fact_latest_time_key", f"""
+    SELECT MAX(time_key) AS time_key
+    FROM `{FACT_TABLE}`
+    """)
+
+# AQI thực tế mới về - ghép với dự báo đã phục vụ (drift monitor)
+register_template("fact_aqi_since", f"""
+    SELECT f.location_key, f.time_key, f.AQI_TOTAL
+    FROM `{FACT_TABLE}` f
+    WHERE f.time_key >= @since_time_key
+        {fact_partition_filter()}
+    """, **FACT_WINDOW_PARAMS)
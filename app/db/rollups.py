@@ -0,0 +1,328 @@
+"""
+Rollup Tables - Bảng tổng hợp theo giờ/ngày
+Duy trì agg_hourly / agg_daily từ Fact_Weather_AirQuality bằng MERGE incremental
+và routing query của các endpoint daily/trends sang bảng rollup
+"""
+from __future__ import annotations
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+from app.core.lazy import lazy_import
+from app.core.config import settings
+from app.db.bigquery import SchemaSpec, TableVersion, get_bigquery_client, query_and_wait, run_blocking, schema_fields
+from app.db.ingestion import get_fact_version
+from app.db.queries import BoundQuery, bind, fact_time, hours_ago, join_dim_time, register_template, run_bound, table_id
+pd = lazy_import("pandas")
+bigquery = lazy_import("google.cloud.bigquery")
+exceptions = lazy_import("google.cloud.exceptions")
+
+HOURLY_TABLE = "agg_hourly"
+DAILY_TABLE = "agg_daily"
+
+# Schema bảng rollup - khóa theo location_key của Fact_Weather_AirQuality
+HOURLY_SCHEMA = [
+    SchemaSpec("location_key", "INT64", mode="REQUIRED"),
+    SchemaSpec("hour_start", "TIMESTAMP", mode="REQUIRED"),
+    SchemaSpec("date", "DATE", mode="REQUIRED"),
+
+    # Averages
+    SchemaSpec("avg_pm2_5", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_pm10", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_aqi", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_temperature", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_humidity", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_wind_speed", "FLOAT64", mode="NULLABLE"),
+
+    # Min/Max
+    SchemaSpec("min_pm2_5", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("max_pm2_5", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("min_aqi", "INT64", mode="NULLABLE"),
+    SchemaSpec("max_aqi", "INT64", mode="NULLABLE"),
+
+    # Counts
+    SchemaSpec("record_count", "INT64", mode="REQUIRED"),
+    SchemaSpec("last_updated", "TIMESTAMP", mode="REQUIRED")
+]
+
+DAILY_SCHEMA = [
+    SchemaSpec("location_key", "INT64", mode="REQUIRED"),
+    SchemaSpec("date", "DATE", mode="REQUIRED"),
+
+    # Daily statistics
+    SchemaSpec("daily_avg_aqi", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("daily_max_aqi", "INT64", mode="NULLABLE"),
+    SchemaSpec("daily_min_aqi", "INT64", mode="NULLABLE"),
+    SchemaSpec("avg_pm2_5", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_pm10", "FLOAT64", mode="NULLABLE"),
+
+    # Health impact
+    SchemaSpec("good_hours", "INT64", mode="REQUIRED"),
+    SchemaSpec("moderate_hours", "INT64", mode="REQUIRED"),
+    SchemaSpec("unhealthy_hours", "INT64", mode="REQUIRED"),
+
+    # Weather summary
+    SchemaSpec("avg_temperature", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_humidity", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("avg_wind_speed", "FLOAT64", mode="NULLABLE"),
+
+    SchemaSpec("record_count", "INT64", mode="REQUIRED"),
+    SchemaSpec("last_updated", "TIMESTAMP", mode="REQUIRED")
+]
+
+# Khi đọc rollup lỗi (bảng chưa tạo...), tạm thời đi thẳng vào query raw trong khoảng thời gian này
+ROLLUP_RETRY_AFTER_SECONDS = 600
+_rollup_unavailable_until: float = 0.0
+
+# Thời điểm MERGE cuối vào agg_daily - so với thời điểm ghi cuối của bảng fact để biết rollup còn mới không
+daily_rollup_version = TableVersion(table_id(DAILY_TABLE), ttl_seconds=settings.FACT_VERSION_TTL_SECONDS)
+
+def ensure_rollup_tables(client: bigquery.Client) -> None:
+    """
+    Tạo bảng rollup nếu chưa có
+    Partition theo ngày và cluster theo location_key để MERGE và đọc chỉ chạm vài partition
+    """
+    for name, schema, partition_field in [
+        (HOURLY_TABLE, HOURLY_SCHEMA, "hour_start"),
+        (DAILY_TABLE, DAILY_SCHEMA, "date"),
+    ]:
+        try:
+            client.get_table(table_id(name))
+        except exceptions.NotFound:
+            table = bigquery.Table(table_id(name), schema=schema_fields(schema))
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY,
+                field=partition_field
+            )
+            table.clustering_fields = ["location_key"]
+            client.create_table(table)
+            print(f"✅ Created rollup table {name}")
+
+def _source_window(lookback_days: Optional[int]) -> str:
+    """Điều kiện lọc dữ liệu nguồn cho lần refresh (None = toàn bộ lịch sử)"""
+    if lookback_days is None:
+        return "TRUE"
+    return f"{fact_time()} >= TIMESTAMP(DATE_SUB(CURRENT_DATE(), INTERVAL {int(lookback_days)} DAY))"
+
+def _target_window(column: str, lookback_days: Optional[int]) -> str:
+    """Giới hạn partition của bảng đích trong MERGE"""
+    if lookback_days is None:
+        return "TRUE"
+    if column == "date":
+        return f"T.date >= DATE_SUB(CURRENT_DATE(), INTERVAL {int(lookback_days)} DAY)"
+    return f"T.{column} >= TIMESTAMP(DATE_SUB(CURRENT_DATE(), INTERVAL {int(lookback_days)} DAY))"
+
+def build_hourly_merge(lookback_days: Optional[int]) -> str:
+    """MERGE tổng hợp theo giờ từ fact table"""
+    return f"""
+    MERGE `{table_id(HOURLY_TABLE)}` T
+    USING (
+        SELECT
+            f.location_key,
+            TIMESTAMP_TRUNC({fact_time()}, HOUR) as hour_start,
+            DATE({fact_time()}) as date,
+            AVG(f.pm2_5) as avg_pm2_5,
+            AVG(f.pm10) as avg_pm10,
+            AVG(f.AQI_TOTAL) as avg_aqi,
+            AVG(f.temperature_2m) as avg_temperature,
+            AVG(f.relative_humidity_2m) as avg_humidity,
+            AVG(f.wind_speed_10m) as avg_wind_speed,
+            MIN(f.pm2_5) as min_pm2_5,
+            MAX(f.pm2_5) as max_pm2_5,
+            CAST(MIN(f.AQI_TOTAL) AS INT64) as min_aqi,
+            CAST(MAX(f.AQI_TOTAL) AS INT64) as max_aqi,
+            COUNT(*) as record_count,
+            CURRENT_TIMESTAMP() as last_updated
+        FROM
+            `{table_id("Fact_Weather_AirQuality")}` f
+        {join_dim_time()}
+        WHERE
+            {_source_window(lookback_days)}
+        GROUP BY location_key, hour_start, date
+    ) S
+    ON T.location_key = S.location_key
+        AND T.hour_start = S.hour_start
+        AND {_target_window("hour_start", lookback_days)}
+    WHEN MATCHED THEN UPDATE SET
+        avg_pm2_5 = S.avg_pm2_5,
+        avg_pm10 = S.avg_pm10,
+        avg_aqi = S.avg_aqi,
+        avg_temperature = S.avg_temperature,
+        avg_humidity = S.avg_humidity,
+        avg_wind_speed = S.avg_wind_speed,
+        min_pm2_5 = S.min_pm2_5,
+        max_pm2_5 = S.max_pm2_5,
+        min_aqi = S.min_aqi,
+        max_aqi = S.max_aqi,
+        record_count = S.record_count,
+        last_updated = S.last_updated
+    WHEN NOT MATCHED THEN INSERT ROW
+    """
+
+def build_daily_merge(lookback_days: Optional[int]) -> str:
+    """MERGE tổng hợp theo ngày từ fact table"""
+    return f"""
+    MERGE `{table_id(DAILY_TABLE)}` T
+    USING (
+        SELECT
+            f.location_key,
+            DATE({fact_time()}) as date,
+            AVG(f.AQI_TOTAL) as daily_avg_aqi,
+            CAST(MAX(f.AQI_TOTAL) AS INT64) as daily_max_aqi,
+            CAST(MIN(f.AQI_TOTAL) AS INT64) as daily_min_aqi,
+            AVG(f.pm2_5) as avg_pm2_5,
+            AVG(f.pm10) as avg_pm10,
+            COUNTIF(f.AQI_TOTAL <= 50) as good_hours,
+            COUNTIF(f.AQI_TOTAL > 50 AND f.AQI_TOTAL <= 100) as moderate_hours,
+            COUNTIF(f.AQI_TOTAL > 100) as unhealthy_hours,
+            AVG(f.temperature_2m) as avg_temperature,
+            AVG(f.relative_humidity_2m) as avg_humidity,
+            AVG(f.wind_speed_10m) as avg_wind_speed,
+            COUNT(*) as record_count,
+            CURRENT_TIMESTAMP() as last_updated
+        FROM
+            `{table_id("Fact_Weather_AirQuality")}` f
+        {join_dim_time()}
+        WHERE
+            {_source_window(lookback_days)}
+        GROUP BY location_key, date
+    ) S
+    ON T.location_key = S.location_key
+        AND T.date = S.date
+        AND {_target_window("date", lookback_days)}
+    WHEN MATCHED THEN UPDATE SET
+        daily_avg_aqi = S.daily_avg_aqi,
+        daily_max_aqi = S.daily_max_aqi,
+        daily_min_aqi = S.daily_min_aqi,
+        avg_pm2_5 = S.avg_pm2_5,
+        avg_pm10 = S.avg_pm10,
+        good_hours = S.good_hours,
+        moderate_hours = S.moderate_hours,
+        unhealthy_hours = S.unhealthy_hours,
+        avg_temperature = S.avg_temperature,
+        avg_humidity = S.avg_humidity,
+        avg_wind_speed = S.avg_wind_speed,
+        record_count = S.record_count,
+        last_updated = S.last_updated
+    WHEN NOT MATCHED THEN INSERT ROW
+    """
+
+def refresh_rollups(lookback_days: Optional[int] = None) -> dict:
+    """
+    Cập nhật incremental agg_hourly và agg_daily
+    - lookback_days: chỉ tính lại N ngày gần nhất (mặc định ROLLUP_LOOKBACK_DAYS)
+    - lookback_days=0 hoặc âm: backfill toàn bộ lịch sử
+    MERGE idempotent - chạy lại nhiều lần cho cùng khoảng thời gian không tạo bản ghi trùng
+    """
+    global _rollup_unavailable_until
+
+    if lookback_days is None:
+        lookback_days = settings.ROLLUP_LOOKBACK_DAYS
+    window = lookback_days if lookback_days > 0 else None
+
+    client = get_bigquery_client()
+    ensure_rollup_tables(client)
+
+    result = {}
+    for name, query in [
+        (HOURLY_TABLE, build_hourly_merge(window)),
+        (DAILY_TABLE, build_daily_merge(window)),
+    ]:
+        job = query_and_wait(client, query, name=f"rollup_merge_{name}")
+        result[name] = job.num_dml_affected_rows or 0
+        print(f"✅ Rollup {name}: {result[name]} rows merged")
+
+    # Bảng rollup đã sẵn sàng - cho phép routing đọc lại ngay
+    _rollup_unavailable_until = 0.0
+    daily_rollup_version.invalidate()
+    return result
+
+async def rollup_refresh_loop(interval_minutes: int) -> None:
+    """Background task refresh rollup định kỳ (chạy từ lifespan của app)"""
+    while True:
+        try:
+            await run_blocking(refresh_rollups)
+        except Exception as e:
+            print(f"❌ Rollup refresh error: {e}")
+        await asyncio.sleep(interval_minutes * 60)
+
+# Đọc agg_daily cho các endpoint daily/trends - cột trả về trùng tên với query raw GROUP BY DATE(t.time)
+_DAILY_ROLLUP_SQL = f"""
+    SELECT
+        a.date,
+        a.avg_pm2_5,
+        a.avg_pm10,
+        a.avg_temperature,
+        a.avg_humidity,
+        a.avg_wind_speed,
+        a.daily_avg_aqi as avg_aqi,
+        a.daily_max_aqi as max_aqi,
+        a.daily_min_aqi as min_aqi,
+        a.record_count as data_points
+    FROM
+        `{table_id(DAILY_TABLE)}` a
+    WHERE
+        a.location_key = @location_key
+        AND a.date >= @since_date
+    ORDER BY date ASC
+    """
+
+register_template("rollup_daily", _DAILY_ROLLUP_SQL, location_key="INT64", since_date="DATE")
+register_template("rollup_daily_limited", _DAILY_ROLLUP_SQL + "LIMIT @limit\n",
+                  location_key="INT64", since_date="DATE", limit="INT64")
+
+def days_ago_start(days: int) -> datetime:
+    """
+    Mốc đầu ngày (00:00 UTC) của ngày N*24 giờ trước - dùng chung cho rollup (date >=) và query raw (time >=)
+    để 2 đường trả về cùng tập ngày trọn vẹn
+    """
+    return hours_ago(int(days) * 24).replace(hour=0)
+
+def daily_rollup_query(location_key: int, days: int, limit: Optional[int] = None) -> BoundQuery:
+    """Query agg_daily của 1 trạm trong N ngày gần nhất (mốc ngày tính theo UTC như DATE(t.time))"""
+    since_date = days_ago_start(days).date()
+    if limit:
+        return bind("rollup_daily_limited", location_key=location_key, since_date=since_date, limit=limit)
+    return bind("rollup_daily", location_key=location_key, since_date=since_date)
+
+async def fresh_rollup_version() -> Optional[str]:
+    """
+    Version agg_daily nếu đọc rollup được: rollup bật, không lỗi gần đây và MERGE cuối chạy sau lần ghi fact cuối
+    None -> phải đọc raw: fact có dữ liệu chưa tổng hợp (giờ mới của ngày hiện tại, backfill)
+    hoặc không đọc được metadata của 1 trong 2 bảng
+    """
+    if not settings.ROLLUPS_ENABLED or time.monotonic() < _rollup_unavailable_until:
+        return None
+
+    rollup_modified, fact_modified = await asyncio.gather(
+        daily_rollup_version.modified(), get_fact_version().modified()
+    )
+    if rollup_modified is None or fact_modified is None or rollup_modified < fact_modified:
+        return None
+    return rollup_modified.isoformat()
+
+async def run_with_rollup(
+    rollup_query: BoundQuery,
+    raw_query: BoundQuery,
+    use_rollup: Optional[bool] = None
+) -> pd.DataFrame:
+    """
+    Query routing: ưu tiên bảng rollup, fallback về query raw trên fact table
+    khi rollup bị tắt, cũ hơn bảng fact, chưa có dữ liệu hoặc đang lỗi
+    use_rollup: kết quả fresh_rollup_version() caller đã lấy (và đưa vào ETag) - None thì tự kiểm tra
+    """
+    global _rollup_unavailable_until
+
+    if use_rollup is None:
+        use_rollup = await fresh_rollup_version() is not None
+
+    if use_rollup:
+        try:
+            df = await run_bound(rollup_query)
+            if not df.empty:
+                return df
+        except Exception as e:
+            print(f"⚠️ Rollup query failed, falling back to raw fact query: {e}")
+            _rollup_unavailable_until = time.monotonic() + ROLLUP_RETRY_AFTER_SECONDS
+
+    return await run_bound(raw_query)
@@ -0,0 +1,3 @@
+"""
+Machine Learning - Forecast engine và các tiện ích cho mô hình dự báo AQI
+"""
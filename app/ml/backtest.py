@@ -0,0 +1,159 @@
+"""
+Backtest - Đánh giá walk-forward cho mô hình ARIMA theo từng trạm
+- Thay vì fit lại ARIMA(history) cho mỗi bước test (O(n²) như notebook), fit 1 lần rồi cập nhật
+  state bằng extend() (Kalman filter, giữ nguyên tham số) và chỉ refit mỗi refit_every bước
+  (warm-start từ tham số lần trước)
+- Các trạm chạy song song trên process pool; metric theo EVALUATION_CONFIG (mae, mse, mape, r2)
+"""
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from app.core.ml_config import EVALUATION_CONFIG, ml_settings
+from app.ml.preprocessing import forward_fill, to_station_tensor
+
+def regression_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """MAE, MSE, RMSE, MAPE (%) và R² - MAPE bỏ qua các điểm y_true = 0"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    mask = ~(np.isnan(y_true) | np.isnan(y_pred))
+    y_true, y_pred = y_true[mask], y_pred[mask]
+    if len(y_true) == 0:
+        return {"mae": float("nan"), "mse": float("nan"), "rmse": float("nan"), "mape": float("nan"), "r2": float("nan"), "n": 0}
+
+    errors = y_true - y_pred
+    mse = float(np.mean(errors ** 2))
+    nonzero = y_true != 0
+    variance = float(np.sum((y_true - y_true.mean()) ** 2))
+    return {
+        "mae": float(np.mean(np.abs(errors))),
+        "mse": mse,
+        "rmse": float(np.sqrt(mse)),
+        "mape": float(np.mean(np.abs(errors[nonzero] / y_true[nonzero])) * 100) if nonzero.any() else float("nan"),
+        "r2": 1.0 - float(np.sum(errors ** 2)) / variance if variance > 0 else float("nan"),
+        "n": int(len(y_true)),
+    }
+
+def meets_thresholds(metrics: Dict[str, float]) -> bool:
+    """Model đạt ngưỡng MIN_R2_SCORE / MAX_MAE / MAX_MAPE của MLSettings"""
+    return (
+        metrics.get("r2", float("nan")) >= ml_settings.MIN_R2_SCORE
+        and metrics.get("mae", float("inf")) <= ml_settings.MAX_MAE
+        and metrics.get("mape", float("inf")) <= ml_settings.MAX_MAPE
+    )
+
+def _fit_arima(history: np.ndarray, order: Tuple[int, int, int], start_params: Optional[np.ndarray] = None):
+    # Import lazy - statsmodels chỉ cần khi chạy backtest/model selection
+    from statsmodels.tsa.arima.model import ARIMA
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ARIMA(history, order=order).fit(start_params=start_params)
+
+def arima_walk_forward(
+    series: np.ndarray,
+    order: Tuple[int, int, int] = ml_settings.ARIMA_ORDER,
+    test_size: int = 24,
+    refit_every: int = ml_settings.BACKTEST_REFIT_EVERY
+) -> Dict[str, Any]:
+    """
+    Dự báo 1 bước cho từng điểm trong test_size điểm cuối của series
+    - Trong mỗi đoạn refit_every bước: extend() state với giá trị thực, không fit lại
+    - Đầu mỗi đoạn: refit trên toàn bộ history, warm-start từ tham số cũ (refit_every <= 0: không refit)
+    """
+    series = np.asarray(series, dtype=np.float64)
+    split = len(series) - test_size
+    if split <= sum(order) + 1:
+        raise ValueError(f"Not enough history for ARIMA{order}: {split} points")
+
+    results = _fit_arima(series[:split], order)
+    chunk = refit_every if refit_every > 0 else test_size
+    predictions = np.empty(test_size)
+    refits = 1
+
+    for start in range(0, test_size, chunk):
+        if start > 0 and refit_every > 0:
+            results = _fit_arima(series[:split + start], order, start_params=results.params)
+            refits += 1
+        observed = series[split + start:split + start + chunk]
+        # Giá trị fitted của đoạn extend = dự báo 1 bước, mỗi bước chỉ dùng dữ liệu trước nó
+        extended = results.extend(observed)
+        predictions[start:start + len(observed)] = extended.fittedvalues
+        results = extended
+
+    actual = series[split:]
+    return {
+        "order": tuple(order),
+        "predictions": predictions,
+        "actual": actual,
+        "refits": refits,
+        "aic": float(getattr(results, "aic", np.nan)),
+        "metrics": regression_metrics(actual, predictions),
+    }
+
+def _backtest_station(args: Tuple[int, np.ndarray, Tuple[int, int, int], int, int]) -> Dict[str, Any]:
+    """Worker cho process pool - trả về metric (không trả predictions để giảm dữ liệu pickle)"""
+    location_key, series, order, test_size, refit_every = args
+    try:
+        result = arima_walk_forward(series, order, test_size, refit_every)
+        return {"location_key": location_key, "order": result["order"], "refits": result["refits"], **result["metrics"]}
+    except Exception as e:
+        return {"location_key": location_key, "order": tuple(order), "error": str(e)}
+
+def default_workers() -> int:
+    return ml_settings.BACKTEST_WORKERS or os.cpu_count() or 1
+
+def backtest_stations(
+    series_by_station: Dict[int, np.ndarray],
+    order: Tuple[int, int, int] = ml_settings.ARIMA_ORDER,
+    test_fraction: float = EVALUATION_CONFIG["test_size"],
+    refit_every: int = ml_settings.BACKTEST_REFIT_EVERY,
+    workers: Optional[int] = None
+) -> pd.DataFrame:
+    """Walk-forward ARIMA cho nhiều trạm song song, 1 dòng metric mỗi trạm"""
+    tasks = [
+        (location_key, series, order, max(1, int(len(series) * test_fraction)), refit_every)
+        for location_key, series in series_by_station.items()
+    ]
+    workers = workers or default_workers()
+    if workers <= 1 or len(tasks) <= 1:
+        rows = [_backtest_station(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            rows = list(executor.map(_backtest_station, tasks))
+    return pd.DataFrame(rows)
+
+def station_series(df: pd.DataFrame, target: str = "AQI_TOTAL") -> Dict[int, np.ndarray]:
+    """Chuỗi giờ liên tục (forward-fill) của target cho từng trạm, bỏ phần NaN ở đầu"""
+    tensor = to_station_tensor(df, [target])
+    values = forward_fill(tensor["values"])[:, :, 0]
+    series = {}
+    for location_key, row in zip(tensor["location_keys"], values):
+        valid = np.flatnonzero(~np.isnan(row))
+        if len(valid):
+            series[location_key] = row[valid[0]:]
+    return series
+
+async def load_station_series(days: int, target: str = "AQI_TOTAL") -> Dict[int, np.ndarray]:
+    """Lấy N ngày dữ liệu fact từ BigQuery và trả về chuỗi theo trạm"""
+    from app.db.dimensions import get_dimensions
+    from app.db.queries import run_template
+
+    dimensions = await get_dimensions()
+    df = await run_template(
+        "forecast_model_inputs",
+        **await dimensions.fact_window(hours=days * 24)
+    )
+    if df.empty:
+        return {}
+    df = await dimensions.attach_time(df)
+    return station_series(df, target)
+
+def summarize(results: pd.DataFrame, metrics: Sequence[str] = ("mae", "mape", "r2")) -> Dict[str, Any]:
+    """Trung bình metric trên các trạm chạy thành công"""
+    ok = results[results["error"].isna()] if "error" in results else results
+    summary = {metric: float(ok[metric].mean()) for metric in metrics if metric in ok and len(ok)}
+    summary.update({"stations": int(len(ok)), "failed": int(len(results) - len(ok))})
+    return summary
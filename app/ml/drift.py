@@ -0,0 +1,241 @@
+"""
+Drift Monitor - Đánh giá liên tục dự báo đã phục vụ so với giá trị thực
+- Mỗi lần forecast store refresh: ghi nhận dự báo (trạm, giờ) đang phục vụ
+- Khi dòng Fact_Weather_AirQuality của giờ đó về: cập nhật accumulator của trạm
+- Accumulator kiểu Welford có trọng số giảm dần (half-life) - MAE/MAPE/R² "rolling" với bộ nhớ O(1) mỗi trạm
+- Vượt ngưỡng MIN_R2_SCORE / MAX_MAE / MAX_MAPE hoặc giảm hiệu năng quá retraining_threshold -> yêu cầu retrain
+"""
+from __future__ import annotations
+import os
+import json
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.lazy import lazy_import
+from app.core.ml_config import PRODUCTION_CONFIG, ml_settings
+from app.db.dimensions import get_dimensions
+from app.db.queries import run_template
+from app.ml.registry import METRICS_NAME, atomic_write_json, get_model_registry
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+RETRAIN_REQUEST_NAME = "RETRAIN_REQUESTED.json"
+
+class RollingAccumulator:
+    """
+    Thống kê sai số có trọng số giảm dần theo cấp số nhân (mỗi quan sát mới: trọng số cũ × decay)
+    SST theo Welford có trọng số (West 1979) để tính R² mà không giữ lại chuỗi quan sát
+    """
+
+    __slots__ = ("decay", "count", "weight", "mean", "m2", "sse", "sae", "sape", "weight_nonzero")
+
+    def __init__(self, half_life: float):
+        self.decay = 0.5 ** (1.0 / half_life) if half_life > 0 else 1.0
+        self.count = 0
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sse = 0.0
+        self.sae = 0.0
+        self.sape = 0.0
+        self.weight_nonzero = 0.0
+
+    def update(self, actual: float, predicted: float) -> None:
+        decay = self.decay
+        error = actual - predicted
+
+        self.count += 1
+        self.weight = self.weight * decay + 1.0
+        delta = actual - self.mean
+        self.mean += delta / self.weight
+        self.m2 = self.m2 * decay + delta * (actual - self.mean)
+
+        self.sse = self.sse * decay + error * error
+        self.sae = self.sae * decay + abs(error)
+        self.sape *= decay
+        self.weight_nonzero *= decay
+        if actual != 0:
+            self.sape += abs(error / actual)
+            self.weight_nonzero += 1.0
+
+    def metrics(self) -> Dict[str, float]:
+        if self.weight == 0:
+            return {"mae": math.nan, "rmse": math.nan, "mape": math.nan, "r2": math.nan, "samples": 0}
+        return {
+            "mae": self.sae / self.weight,
+            "rmse": math.sqrt(self.sse / self.weight),
+            "mape": self.sape / self.weight_nonzero * 100 if self.weight_nonzero > 0 else math.nan,
+            "r2": 1.0 - self.sse / self.m2 if self.m2 > 0 else math.nan,
+            "samples": self.count,
+        }
+
+def threshold_violations(metrics: Dict[str, float], baseline: Optional[Dict[str, float]] = None) -> List[str]:
+    """Lý do cần retrain: vượt ngưỡng tuyệt đối của MLSettings hoặc MAE xấu hơn baseline quá retraining_threshold"""
+    reasons = []
+    if metrics["r2"] < ml_settings.MIN_R2_SCORE:
+        reasons.append(f"r2 {metrics['r2']:.3f} < {ml_settings.MIN_R2_SCORE}")
+    if metrics["mae"] > ml_settings.MAX_MAE:
+        reasons.append(f"mae {metrics['mae']:.2f} > {ml_settings.MAX_MAE}")
+    if metrics["mape"] > ml_settings.MAX_MAPE:
+        reasons.append(f"mape {metrics['mape']:.1f}% > {ml_settings.MAX_MAPE}%")
+
+    baseline_mae = (baseline or {}).get("mae")
+    if baseline_mae and baseline_mae > 0:
+        degradation = metrics["mae"] / baseline_mae - 1
+        if degradation > PRODUCTION_CONFIG["retraining_threshold"]:
+            reasons.append(f"mae +{degradation:.0%} vs baseline {baseline_mae:.2f}")
+    return reasons
+
+class DriftMonitor:
+    """Ghép dự báo đã phục vụ với giá trị thực và theo dõi sai số theo trạm"""
+
+    def __init__(
+        self,
+        half_life_hours: float = ml_settings.DRIFT_HALF_LIFE_HOURS,
+        horizon_hours: int = ml_settings.DRIFT_HORIZON_HOURS,
+        min_samples: int = ml_settings.DRIFT_MIN_SAMPLES
+    ):
+        self.half_life_hours = half_life_hours
+        self.horizon_hours = horizon_hours
+        self.min_samples = min_samples
+        # (location_key, giờ dự báo) -> (AQI dự báo, số giờ dự báo trước)
+        self._pending: Dict[Tuple[int, pd.Timestamp], Tuple[float, int]] = {}
+        self._stations: Dict[int, RollingAccumulator] = {}
+        self._overall = RollingAccumulator(half_life_hours)
+        self.model_version: Optional[str] = None
+        self.baseline: Optional[Dict[str, float]] = None
+        self.retrain_requested_at: Optional[datetime] = None
+        self.retrain_reasons: Dict[int, List[str]] = {}
+
+    def _reset(self, model_version: Optional[str]) -> None:
+        """Model mới - bắt đầu lại thống kê và nạp baseline từ metrics.json của version"""
+        self._pending.clear()
+        self._stations.clear()
+        self._overall = RollingAccumulator(self.half_life_hours)
+        self.retrain_reasons = {}
+        self.model_version = model_version
+        self.baseline = None
+        registry = get_model_registry()
+        if model_version and model_version in registry.list_versions():
+            try:
+                with open(os.path.join(registry.version_dir(model_version), METRICS_NAME)) as f:
+                    self.baseline = json.load(f) or None
+            except (OSError, ValueError):
+                pass
+
+    def record_forecasts(self, forecasts: Dict[int, pd.DataFrame], model_version: Optional[str]) -> None:
+        """Ghi nhận dự báo vừa phục vụ (chỉ horizon_hours giờ đầu, giữ dự báo sớm nhất cho mỗi giờ)"""
+        if model_version != self.model_version:
+            self._reset(model_version)
+        for location_key, frame in forecasts.items():
+            head = frame.head(self.horizon_hours)
+            for lead, (time, aqi) in enumerate(zip(head['time'], head['aqi']), start=1):
+                self._pending.setdefault((int(location_key), pd.Timestamp(time).floor('h')), (float(aqi), lead))
+
+    async def collect_actuals(self) -> int:
+        """
+        Đọc lại các dòng fact trong cửa sổ và cập nhật accumulator cho dự báo tương ứng, trả về số cặp đã ghép
+        Không giữ cursor time_key: dòng về muộn (trạm gửi trễ, backfill) vẫn được ghép miễn còn trong cửa sổ;
+        mỗi dự báo bị pop khỏi _pending khi ghép nên dòng đọc lại không bị tính 2 lần
+        """
+        if not self._pending:
+            return 0
+
+        dimensions = await get_dimensions()
+        # Dự báo cũ hơn horizon_hours * 2 bị bỏ bên dưới - mốc này cũng là giới hạn partition khi đọc fact
+        df = await run_template("fact_aqi_since", **await dimensions.fact_window(hours=self.horizon_hours * 2))
+        matched = 0
+        if not df.empty:
+            df = await dimensions.attach_time(df)
+            for location_key, time, actual in zip(df['location_key'], df['time'], df['AQI_TOTAL']):
+                # Giá trị thực NULL: giữ dự báo để ghép với dòng được sửa sau
+                if pd.isna(actual):
+                    continue
+                entry = self._pending.pop((int(location_key), pd.Timestamp(time).floor('h')), None)
+                if entry is None:
+                    continue
+                predicted = entry[0]
+                station = self._stations.get(int(location_key))
+                if station is None:
+                    station = self._stations[int(location_key)] = RollingAccumulator(self.half_life_hours)
+                station.update(float(actual), predicted)
+                self._overall.update(float(actual), predicted)
+                matched += 1
+
+        # Giờ đã qua lâu mà không có dữ liệu thực (trạm mất dữ liệu) - bỏ để bộ nhớ không tăng
+        cutoff = pd.Timestamp(datetime.now(timezone.utc)) - pd.Timedelta(hours=self.horizon_hours * 2)
+        for key in [key for key in self._pending if key[1] < cutoff]:
+            del self._pending[key]
+
+        self.evaluate()
+        return matched
+
+    def evaluate(self) -> Dict[int, List[str]]:
+        """Kiểm tra ngưỡng từng trạm (đủ min_samples) và ghi yêu cầu retrain nếu có trạm vi phạm"""
+        self.retrain_reasons = {
+            location_key: reasons
+            for location_key, accumulator in self._stations.items()
+            if accumulator.count >= self.min_samples
+            for reasons in [threshold_violations(accumulator.metrics(), self.baseline)]
+            if reasons
+        }
+        if self.retrain_reasons:
+            self.request_retrain()
+        return self.retrain_reasons
+
+    def request_retrain(self) -> bool:
+        """
+        Ghi RETRAIN_REQUESTED.json vào MODEL_SAVE_PATH cho job training (tối đa 1 lần mỗi RETRAIN_COOLDOWN_HOURS)
+        """
+        now = datetime.now(timezone.utc)
+        cooldown = timedelta(hours=ml_settings.RETRAIN_COOLDOWN_HOURS)
+        if self.retrain_requested_at and now - self.retrain_requested_at < cooldown:
+            return False
+
+        request = {
+            "requested_at": now.isoformat(),
+            "model_version": self.model_version,
+            "stations": {str(key): reasons for key, reasons in self.retrain_reasons.items()},
+            "overall": self._overall.metrics(),
+        }
+        try:
+            atomic_write_json(os.path.join(get_model_registry().root, RETRAIN_REQUEST_NAME), request)
+        except OSError as e:
+            print(f"❌ Failed to write retrain request: {e}")
+            return False
+        self.retrain_requested_at = now
+        print(f"⚠️ Model drift on {len(self.retrain_reasons)} stations - retrain requested")
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Metric rolling theo trạm cho API"""
+        def clean(metrics: Dict[str, float]) -> Dict[str, Any]:
+            return {k: (None if isinstance(v, float) and not np.isfinite(v) else round(v, 4) if isinstance(v, float) else v)
+                    for k, v in metrics.items()}
+
+        return {
+            "model_version": self.model_version,
+            "half_life_hours": self.half_life_hours,
+            "horizon_hours": self.horizon_hours,
+            "pending_forecasts": len(self._pending),
+            "baseline": self.baseline,
+            "thresholds": {
+                "min_r2": ml_settings.MIN_R2_SCORE,
+                "max_mae": ml_settings.MAX_MAE,
+                "max_mape": ml_settings.MAX_MAPE,
+                "retraining_threshold": PRODUCTION_CONFIG["retraining_threshold"],
+            },
+            "overall": clean(self._overall.metrics()),
+            "stations": {key: clean(acc.metrics()) for key, acc in sorted(self._stations.items())},
+            "retrain": {
+                "needed": bool(self.retrain_reasons),
+                "requested_at": self.retrain_requested_at.isoformat() if self.retrain_requested_at else None,
+                "reasons": self.retrain_reasons,
+            },
+        }
+
+# Global monitor instance
+drift_monitor = DriftMonitor()
+
+def get_drift_monitor() -> DriftMonitor:
+    return drift_monitor
@@ -0,0 +1,296 @@
+"""
+Forecast Engine - Chạy mô hình LSTM (export sang ONNX) trên CPU bằng ONNX Runtime
+- Model và scaler được load 1 lần (lazy), không import TensorFlow khi chạy
+- Version ACTIVE trong model registry đổi -> build session mới ở thread nền rồi hot-swap
+- Dự báo cho toàn bộ trạm trong 1 batch: mỗi bước giờ là 1 lần gọi inference cho cả 30 trạm
+"""
+from __future__ import annotations
+import os
+import json
+import asyncio
+import threading
+from datetime import timedelta
+from typing import Any, Dict, NamedTuple, Optional
+from app.core.lazy import lazy_import
+from app.core.ml_config import ml_settings
+from app.db.dimensions import get_dimensions
+from app.db.queries import run_template
+from app.ml.preprocessing import forward_fill, to_station_tensor
+from app.ml.registry import ModelRegistry, get_model_registry
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Số giờ đầu dự báo được nối mượt với giá trị thực cuối cùng (giống notebook - BRIDGE_H)
+BRIDGE_HOURS = 12
+
+# Cột quan trắc gần nhất trả kèm mỗi điểm dự báo (model chỉ dự báo AQI)
+OBSERVATION_COLUMNS = ['pm2_5', 'pm10', 'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m']
+
+class LoadedModel(NamedTuple):
+    """Model đã load - thay nguyên khối khi hot-swap để forecast() luôn thấy session và scaler cùng version"""
+    version: str
+    model_dir: str
+    session: Any
+    input_name: str
+    scaler: Dict[str, Any]
+
+class ForecastEngine:
+    """
+    Wrapper cho ONNX model dự báo AQI theo giờ
+    Input model: (batch, sequence_length, 1) giá trị đã scale MinMax; output: (batch, 1) giờ kế tiếp
+    Artifact lấy từ version ACTIVE của model registry (hoặc model_dir cố định nếu truyền vào)
+    """
+
+    def __init__(self, model_dir: Optional[str] = None, registry: Optional[ModelRegistry] = None):
+        self.fixed_model_dir = model_dir
+        self.registry = registry or get_model_registry()
+        self._model: Optional[LoadedModel] = None
+        self._load_error: Optional[str] = None
+        self._failed_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_dir(self) -> str:
+        if self._model is not None:
+            return self._model.model_dir
+        return self.fixed_model_dir or self.registry.active_dir()
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, ml_settings.ONNX_MODEL_NAME)
+
+    @property
+    def scaler_path(self) -> str:
+        return os.path.join(self.model_dir, ml_settings.SCALER_PARAMS_NAME)
+
+    @property
+    def sequence_length(self) -> int:
+        scaler = self._model.scaler if self._model else None
+        if scaler and scaler.get("sequence_length"):
+            return int(scaler["sequence_length"])
+        return ml_settings.LSTM_SEQUENCE_LENGTH
+
+    def _target_version(self) -> Optional[str]:
+        """Version cần phục vụ (None = layout phẳng trong model_dir)"""
+        return None if self.fixed_model_dir else self.registry.active_version()
+
+    def _build(self, version: Optional[str]) -> LoadedModel:
+        """Tạo session mới cho 1 version - không đụng tới model đang phục vụ"""
+        # Import lazy - app vẫn chạy bình thường khi chưa cài onnxruntime
+        import onnxruntime as ort
+
+        model_dir = self.fixed_model_dir or (self.registry.version_dir(version) if version else self.registry.root)
+        with open(os.path.join(model_dir, ml_settings.SCALER_PARAMS_NAME)) as f:
+            scaler = json.load(f)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ml_settings.INFERENCE_THREADS
+        options.inter_op_num_threads = 1
+        # Version trong registry là bất biến - ORT đọc trực tiếp từ file, không copy model qua Python
+        session = ort.InferenceSession(
+            os.path.join(model_dir, ml_settings.ONNX_MODEL_NAME),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        return LoadedModel(
+            version=version or str(scaler.get("version", "default")),
+            model_dir=model_dir,
+            session=session,
+            input_name=session.get_inputs()[0].name,
+            scaler=scaler
+        )
+
+    def load(self) -> bool:
+        """Load model + scaler (lazy, chỉ 1 lần), False nếu chưa có model hoặc thiếu onnxruntime"""
+        if self._model is not None:
+            return True
+        if self._load_error is not None:
+            return False
+
+        with self._lock:
+            if self._model is not None:
+                return True
+            version = self._target_version()
+            try:
+                self._model = self._build(version)
+                print(f"✅ Forecast model loaded: {self.model_path} (version={self.version}, sequence_length={self.sequence_length})")
+                return True
+            except Exception as e:
+                self._load_error = str(e)
+                self._failed_version = version
+                print(f"⚠️ Forecast model unavailable ({self.model_path}): {e}")
+                return False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Hot-swap sang version ACTIVE mới (gọi từ thread nền)
+        Session mới được build xong rồi mới thay thế - request đang chạy tiếp tục dùng model cũ
+        """
+        version = self._target_version()
+        if version is None:
+            return False
+        current = self._model.version if self._model else None
+        if version == current or version == self._failed_version:
+            return False
+
+        with self._lock:
+            try:
+                model = self._build(version)
+            except Exception as e:
+                self._failed_version = version
+                print(f"❌ Failed to load model version {version}, keeping {current}: {e}")
+                return False
+            self._model = model
+            self._load_error = None
+            self._failed_version = None
+        print(f"✅ Forecast model hot-swapped: {current} -> {version}")
+        return True
+
+    def is_available(self) -> bool:
+        """Blocking: lần đầu sẽ load model - từ code async dùng await asyncio.to_thread(engine.load)"""
+        return self.load()
+
+    def reset(self) -> None:
+        """Bỏ model đang load - lần gọi tiếp theo sẽ load lại version active"""
+        with self._lock:
+            self._model = None
+            self._load_error = None
+            self._failed_version = None
+
+    @staticmethod
+    def _scale(scaler: Dict[str, Any], values: np.ndarray) -> np.ndarray:
+        low, high = scaler["feature_range"]
+        data_min, data_max = scaler["data_min"], scaler["data_max"]
+        scale = (high - low) / max(data_max - data_min, 1e-9)
+        return ((values - data_min) * scale + low).astype(np.float32)
+
+    @staticmethod
+    def _inverse(scaler: Dict[str, Any], values: np.ndarray) -> np.ndarray:
+        low, high = scaler["feature_range"]
+        data_min, data_max = scaler["data_min"], scaler["data_max"]
+        scale = (high - low) / max(data_max - data_min, 1e-9)
+        return (values - low) / scale + data_min
+
+    def forecast(self, histories: np.ndarray, horizon: int) -> np.ndarray:
+        """
+        Dự báo lặp theo giờ cho nhiều trạm cùng lúc
+        histories: (stations, >= sequence_length) giá trị gốc, giờ cuối cùng ở cột cuối
+        Trả về (stations, horizon) giá trị gốc
+        """
+        if not self.load():
+            raise RuntimeError(f"Forecast model unavailable: {self._load_error}")
+
+        # Giữ 1 snapshot model cho cả lần dự báo (hot-swap giữa chừng không ảnh hưởng)
+        model = self._model
+        scaler = model.scaler
+        seq = int(scaler.get("sequence_length") or ml_settings.LSTM_SEQUENCE_LENGTH)
+        histories = np.asarray(histories, dtype=np.float64)
+        window = self._scale(scaler, histories[:, -seq:])
+        low, high = scaler["feature_range"]
+
+        predictions = np.empty((window.shape[0], horizon), dtype=np.float32)
+        for step in range(horizon):
+            # 1 lần inference cho toàn bộ trạm
+            output = model.session.run(None, {model.input_name: window[:, :, np.newaxis]})[0]
+            next_values = np.clip(output.reshape(-1), low, high)
+            predictions[:, step] = next_values
+            window = np.concatenate([window[:, 1:], next_values[:, np.newaxis]], axis=1)
+
+        forecasts = self._inverse(scaler, predictions.astype(np.float64))
+
+        # Nối mượt với giá trị thực cuối để tránh "nhảy bậc" tại điểm nối lịch sử - dự báo
+        bridge = min(BRIDGE_HOURS, horizon)
+        if bridge > 0:
+            offset = histories[:, -1] - forecasts[:, 0]
+            forecasts[:, :bridge] += offset[:, np.newaxis] * np.linspace(1.0, 0.0, bridge)
+
+        return np.clip(forecasts, max(0.0, scaler["data_min"]), scaler["data_max"])
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version model đang phục vụ (tên version trong registry)"""
+        return self._model.version if self._model else None
+
+    def info(self) -> Dict[str, Any]:
+        """Trạng thái model cho monitoring"""
+        return {
+            "model_path": self.model_path,
+            "version": self.version,
+            "active_version": self._target_version(),
+            "loaded": self._model is not None,
+            "error": self._load_error,
+            "sequence_length": self.sequence_length,
+            "target": (self._model.scaler if self._model else {}).get("target", "AQI_TOTAL"),
+        }
+
+# Global engine instance
+forecast_engine = ForecastEngine()
+
+def get_forecast_engine() -> ForecastEngine:
+    return forecast_engine
+
+def build_station_histories(df: pd.DataFrame, sequence_length: int, target: str = "AQI_TOTAL") -> Dict[str, Any]:
+    """
+    Ma trận lịch sử (stations, sequence_length) theo lưới giờ chung
+    Giờ thiếu được forward-fill; trạm không đủ dữ liệu bị loại
+    """
+    tensor = to_station_tensor(df, [target])
+    if tensor["values"].shape[1] < sequence_length:
+        return {"location_keys": [], "values": np.empty((0, sequence_length)), "last_time": None}
+
+    values = forward_fill(tensor["values"])[:, -sequence_length:, 0]
+    complete = ~np.isnan(values).any(axis=1)
+
+    return {
+        "location_keys": [key for key, ok in zip(tensor["location_keys"], complete) if ok],
+        "values": values[complete],
+        "last_time": tensor["times"][-1],
+    }
+
+async def forecast_all_stations(horizon: int) -> Dict[int, pd.DataFrame]:
+    """
+    Dự báo horizon giờ tới cho toàn bộ trạm (1 query input + inference theo batch)
+    Trả về location_key -> DataFrame(time, aqi, các cột quan trắc gần nhất)
+    """
+    engine = get_forecast_engine()
+    # Lần đầu load tạo InferenceSession (đọc file, khởi tạo ORT) - chạy ngoài event loop
+    if not await asyncio.to_thread(engine.load):
+        raise RuntimeError("Forecast model unavailable")
+
+    dimensions = await get_dimensions()
+    # Lấy dư 1 ngày để forward-fill khi có giờ thiếu dữ liệu
+    df = await run_template(
+        "forecast_model_inputs",
+        **await dimensions.fact_window(hours=engine.sequence_length + 24)
+    )
+    if df.empty:
+        return {}
+    df = await dimensions.attach_time(df)
+
+    histories = build_station_histories(df, engine.sequence_length)
+    if not histories["location_keys"]:
+        return {}
+
+    # Inference chạy ngoài event loop
+    forecasts = await asyncio.to_thread(engine.forecast, histories["values"], horizon)
+
+    times = pd.date_range(histories["last_time"] + timedelta(hours=1), periods=horizon, freq='h')
+    latest = df.sort_values('time').groupby('location_key')[OBSERVATION_COLUMNS].last()
+
+    result: Dict[int, pd.DataFrame] = {}
+    for i, location_key in enumerate(histories["location_keys"]):
+        frame = pd.DataFrame({'time': times, 'aqi': np.rint(forecasts[i])})
+        if location_key in latest.index:
+            frame = frame.assign(**latest.loc[location_key].to_dict())
+        result[location_key] = frame
+    return result
+
+async def model_reload_loop(interval_seconds: int) -> None:
+    """Background task: theo dõi ACTIVE của model registry và hot-swap khi có version mới"""
+    engine = get_forecast_engine()
+    while True:
+        try:
+            await asyncio.to_thread(engine.reload_if_changed)
+        except Exception as e:
+            print(f"❌ Model reload error: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,201 @@
+"""
+Forecast Store - Dự báo 7 ngày tính sẵn cho toàn bộ trạm
+- Sau mỗi lần ingest (time_key mới nhất của fact thay đổi) hoặc khi đổi model version, chạy model 1 lần cho tất cả trạm
+- Kết quả giữ trong memory theo location_key (endpoint chỉ lookup) và ghi vào bảng riêng forecast_aqi_store
+  (forecast_aqi_next_7d vẫn do pipeline cũ ghi và các endpoint cũ đọc - không đụng tới)
+"""
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from app.core.lazy import lazy_import
+from app.db.bigquery import SchemaSpec, get_bigquery_client, run_blocking, schema_fields
+from app.db.queries import run_template, table_id
+from app.ml.drift import get_drift_monitor
+from app.ml.forecast_engine import forecast_all_stations, get_forecast_engine
+pd = lazy_import("pandas")
+bigquery = lazy_import("google.cloud.bigquery")
+
+FORECAST_TABLE = "forecast_aqi_store"
+FORECAST_HORIZON_HOURS = 7 * 24
+
+# Schema bảng dự báo - được ghi đè toàn bộ (WRITE_TRUNCATE) sau mỗi lần tính lại
+FORECAST_SCHEMA = [
+    SchemaSpec("location_key", "INT64", mode="REQUIRED"),
+    SchemaSpec("forecast_time", "TIMESTAMP", mode="REQUIRED"),
+    SchemaSpec("horizon_hours", "INT64", mode="REQUIRED"),
+    SchemaSpec("aqi", "FLOAT64", mode="NULLABLE"),
+    SchemaSpec("source_time_key", "INT64", mode="REQUIRED"),
+    SchemaSpec("model_version", "STRING", mode="NULLABLE"),
+    SchemaSpec("generated_at", "TIMESTAMP", mode="REQUIRED")
+]
+
+# Cột quan trắc gần nhất -> cột trung bình ngày (trùng tên với query daily raw/rollup)
+_DAILY_AVERAGES = {
+    'pm2_5': 'avg_pm2_5',
+    'pm10': 'avg_pm10',
+    'temperature_2m': 'avg_temperature',
+    'relative_humidity_2m': 'avg_humidity',
+    'wind_speed_10m': 'avg_wind_speed',
+}
+
+def aggregate_daily(hourly: pd.DataFrame) -> pd.DataFrame:
+    """Gộp dự báo theo giờ thành avg/max/min theo ngày (ngày UTC giống DATE(t.time))"""
+    columns = {'aqi': ['mean', 'max', 'min']}
+    columns.update({source: 'mean' for source in _DAILY_AVERAGES if source in hourly.columns})
+
+    daily = hourly.groupby(hourly['time'].dt.date).agg(columns)
+    daily.columns = [
+        {'mean': 'avg_aqi', 'max': 'max_aqi', 'min': 'min_aqi'}[stat] if source == 'aqi' else _DAILY_AVERAGES[source]
+        for source, stat in daily.columns
+    ]
+    daily['data_points'] = hourly.groupby(hourly['time'].dt.date).size()
+    return daily.rename_axis('date').reset_index()
+
+def write_forecast_table(frame: pd.DataFrame) -> int:
+    """Ghi dự báo vào BigQuery bằng load job (không tốn phí query như INSERT DML)"""
+    client = get_bigquery_client()
+    job_config = bigquery.LoadJobConfig(
+        schema=schema_fields(FORECAST_SCHEMA),
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+    )
+    job = client.load_table_from_dataframe(frame, table_id(FORECAST_TABLE), job_config=job_config)
+    job.result()
+    return len(frame)
+
+class ForecastStore:
+    """
+    Map location_key -> dự báo theo giờ / theo ngày, thay thế nguyên khối sau mỗi lần refresh
+    Đọc không cần lock: refresh build map mới rồi gán lại 1 lần
+    """
+
+    def __init__(self, horizon_hours: int = FORECAST_HORIZON_HOURS):
+        self.horizon_hours = horizon_hours
+        self._hourly: Dict[int, pd.DataFrame] = {}
+        self._daily: Dict[int, pd.DataFrame] = {}
+        self.source_time_key: Optional[int] = None
+        self.model_version: Optional[str] = None
+        self.generated_at: Optional[datetime] = None
+        self.refreshes = 0
+        self.errors = 0
+        self._lock = asyncio.Lock()
+
+    def is_ready(self) -> bool:
+        return bool(self._hourly)
+
+    def hourly(self, location_key: int, hours: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """Dự báo theo giờ của 1 trạm (hours giờ đầu), None nếu chưa có"""
+        frame = self._hourly.get(int(location_key))
+        if frame is None:
+            return None
+        return frame.head(hours) if hours else frame
+
+    def daily(self, location_key: int) -> Optional[pd.DataFrame]:
+        """Dự báo theo ngày của 1 trạm, None nếu chưa có"""
+        return self._daily.get(int(location_key))
+
+    async def latest_source_time_key(self) -> Optional[int]:
+        """time_key mới nhất trong fact - thay đổi nghĩa là vừa có lần ingest mới"""
+        df = await run_template("fact_latest_time_key")
+        if df.empty or pd.isna(df['time_key'].iloc[0]):
+            return None
+        return int(df['time_key'].iloc[0])
+
+    async def refresh(self, force: bool = False, persist: bool = True) -> bool:
+        """
+        Tính lại dự báo cho toàn bộ trạm nếu có dữ liệu mới (hoặc force=True)
+        Trả về True nếu store đã được cập nhật
+        """
+        async with self._lock:
+            engine = get_forecast_engine()
+            # load() lần đầu build InferenceSession - không chạy trên event loop
+            if not await asyncio.to_thread(engine.load):
+                return False
+
+            # Tính lại khi có dữ liệu mới hoặc model vừa hot-swap sang version khác
+            source_time_key = await self.latest_source_time_key()
+            unchanged = source_time_key == self.source_time_key and engine.version == self.model_version
+            if not force and self.is_ready() and unchanged:
+                return False
+
+            # Dữ liệu thực mới về - ghép với dự báo đã phục vụ trước đó
+            drift = get_drift_monitor()
+            try:
+                await drift.collect_actuals()
+            except Exception as e:
+                print(f"⚠️ Drift monitor update failed: {e}")
+
+            forecasts = await forecast_all_stations(horizon=self.horizon_hours)
+            if not forecasts:
+                print("⚠️ Forecast store: no station has enough history")
+                return False
+
+            daily = await asyncio.to_thread(
+                lambda: {key: aggregate_daily(frame) for key, frame in forecasts.items()}
+            )
+            generated_at = datetime.now(timezone.utc)
+
+            # Thay thế nguyên khối - request đang đọc vẫn thấy map cũ đầy đủ
+            self._hourly, self._daily = forecasts, daily
+            self.source_time_key = source_time_key
+            self.model_version = engine.version
+            self.generated_at = generated_at
+            self.refreshes += 1
+            drift.record_forecasts(forecasts, engine.version)
+            print(f"✅ Forecast store refreshed: {len(forecasts)} stations × {self.horizon_hours}h (time_key={source_time_key})")
+
+        if persist:
+            try:
+                rows = await run_blocking(write_forecast_table, self.to_table_frame())
+                print(f"✅ Wrote {rows} rows to {FORECAST_TABLE}")
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Failed to write {FORECAST_TABLE}: {e}")
+        return True
+
+    def to_table_frame(self) -> pd.DataFrame:
+        """Dự báo hiện tại theo schema bảng FORECAST_TABLE"""
+        frames = [
+            pd.DataFrame({
+                'location_key': location_key,
+                'forecast_time': frame['time'],
+                'horizon_hours': range(1, len(frame) + 1),
+                'aqi': frame['aqi'].astype(float),
+            })
+            for location_key, frame in self._hourly.items()
+        ]
+        if not frames:
+            return pd.DataFrame(columns=[field.name for field in FORECAST_SCHEMA])
+        return pd.concat(frames, ignore_index=True).assign(
+            source_time_key=self.source_time_key if self.source_time_key is not None else -1,
+            model_version=self.model_version,
+            generated_at=self.generated_at
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Trạng thái store cho /metrics"""
+        return {
+            "stations": len(self._hourly),
+            "horizon_hours": self.horizon_hours,
+            "source_time_key": self.source_time_key,
+            "model_version": self.model_version,
+            "generated_at": self.generated_at.isoformat() if self.generated_at else None,
+            "refreshes": self.refreshes,
+            "errors": self.errors
+        }
+
+# Global store instance
+forecast_store = ForecastStore()
+
+def get_forecast_store() -> ForecastStore:
+    return forecast_store
+
+async def forecast_refresh_loop(interval_minutes: int) -> None:
+    """Background task: kiểm tra dữ liệu mới và tính lại dự báo (chạy từ lifespan của app)"""
+    while True:
+        try:
+            await forecast_store.refresh()
+        except Exception as e:
+            forecast_store.errors += 1
+            print(f"❌ Forecast store refresh error: {e}")
+        await asyncio.sleep(interval_minutes * 60)
@@ -0,0 +1,194 @@
+"""
+Model Selection - Tìm cấu hình model tốt nhất cho từng trạm
+- Lưới candidate (ARIMA (p,d,q) hoặc tham số LSTM) × trạm được chia cho ProcessPoolExecutor
+- Successive halving: rung đầu đánh giá với budget nhỏ, chỉ giữ top 1/eta candidate mỗi trạm cho rung sau
+- Mỗi kết quả được append vào file JSONL ngay khi xong - chạy lại sẽ bỏ qua task đã có (resume)
+  Khóa resume gồm budget của rung và fingerprint dữ liệu trạm; task lỗi không được coi là đã xong
+"""
+import os
+import json
+import hashlib
+import math
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.ml_config import ml_settings
+from app.ml.backtest import arima_walk_forward, default_workers, regression_metrics
+from app.ml.preprocessing import make_supervised
+
+# Budget của từng rung (tỉ lệ trên budget đầy đủ) - rung cuối luôn là 1.0
+DEFAULT_RUNGS = (0.25, 1.0)
+DEFAULT_ETA = 3
+
+Candidate = Dict[str, Any]
+
+def arima_candidates(p: Iterable[int] = range(4), d: Iterable[int] = (0, 1), q: Iterable[int] = range(4)) -> List[Candidate]:
+    """Lưới (p,d,q) giống test_pdq trong notebook (bỏ (0,d,0))"""
+    return [
+        {"family": "arima", "order": [pi, di, qi]}
+        for pi, di, qi in itertools.product(p, d, q) if pi + qi > 0
+    ]
+
+def lstm_candidates(
+    units: Iterable[int] = (32, 64, ml_settings.LSTM_UNITS),
+    layers: Iterable[int] = (1, ml_settings.LSTM_HIDDEN_LAYERS),
+    dropout: Iterable[float] = (0.1, ml_settings.LSTM_DROPOUT)
+) -> List[Candidate]:
+    """Lưới LSTM_UNITS × LSTM_HIDDEN_LAYERS × LSTM_DROPOUT"""
+    return [
+        {"family": "lstm", "units": u, "layers": l, "dropout": dr}
+        for u, l, dr in itertools.product(sorted(set(units)), sorted(set(layers)), sorted(set(dropout)))
+    ]
+
+def candidate_id(candidate: Candidate) -> str:
+    return json.dumps(candidate, sort_keys=True)
+
+def _evaluate_arima(series: np.ndarray, candidate: Candidate, test_size: int, fraction: float) -> Dict[str, Any]:
+    """Rung budget = phần đầu của giai đoạn test (fraction × test_size điểm)"""
+    budget = max(1, int(test_size * fraction))
+    split = len(series) - test_size
+    result = arima_walk_forward(series[:split + budget], tuple(candidate["order"]), budget)
+    return {**result["metrics"], "aic": result["aic"]}
+
+def _evaluate_lstm(series: np.ndarray, candidate: Candidate, test_size: int, fraction: float) -> Dict[str, Any]:
+    """Rung budget = số epoch (fraction × TRAINING_EPOCHS); đánh giá dự báo 1 bước trên toàn bộ giai đoạn test"""
+    # Import lazy - TensorFlow chỉ load trong worker khi tìm tham số LSTM
+    import tensorflow as tf
+
+    seq = ml_settings.LSTM_SEQUENCE_LENGTH
+    split = len(series) - test_size
+    low, high = float(np.min(series[:split])), float(np.max(series[:split]))
+    scaled = ((series - low) / max(high - low, 1e-9))[np.newaxis, :, np.newaxis]
+
+    train = make_supervised(scaled[:, :split], seq)
+    test = make_supervised(scaled[:, split - seq:], seq)
+    X_train, y_train = train["X"][train["valid"]], train["y"][train["valid"]]
+
+    model = tf.keras.Sequential([tf.keras.Input(shape=(seq, 1))])
+    for layer in range(candidate["layers"]):
+        model.add(tf.keras.layers.LSTM(candidate["units"], return_sequences=layer < candidate["layers"] - 1))
+        model.add(tf.keras.layers.Dropout(candidate["dropout"]))
+    model.add(tf.keras.layers.Dense(1))
+    model.compile(optimizer=tf.keras.optimizers.Adam(ml_settings.LSTM_LEARNING_RATE), loss="mean_absolute_error")
+    model.fit(
+        X_train, y_train,
+        epochs=max(1, int(ml_settings.TRAINING_EPOCHS * fraction)),
+        batch_size=ml_settings.TRAINING_BATCH_SIZE,
+        verbose=0
+    )
+
+    predictions = model.predict(test["X"][0], verbose=0).reshape(-1) * (high - low) + low
+    actual = series[split:split + len(predictions)]
+    return regression_metrics(actual, predictions)
+
+_EVALUATORS = {"arima": _evaluate_arima, "lstm": _evaluate_lstm}
+
+def _evaluate_task(task: Tuple[int, Candidate, int, float, np.ndarray, int]) -> Dict[str, Any]:
+    """Worker cho process pool: 1 (trạm, candidate, rung)"""
+    location_key, candidate, rung, fraction, series, test_size = task
+    record = {"location_key": location_key, "candidate": candidate, "rung": rung, "fraction": fraction}
+    try:
+        return {**record, **_EVALUATORS[candidate["family"]](series, candidate, test_size, fraction)}
+    except Exception as e:
+        return {**record, "error": str(e)}
+
+def series_fingerprint(series: np.ndarray, test_size: int) -> str:
+    """Hash dữ liệu của trạm + kích thước giai đoạn test - dữ liệu / --test-fraction đổi thì không resume kết quả cũ"""
+    digest = hashlib.sha1(np.ascontiguousarray(series, dtype=np.float64).tobytes())
+    digest.update(str(test_size).encode())
+    return digest.hexdigest()[:16]
+
+def _task_key(location_key: int, candidate: Candidate, fraction: float, fingerprint: str) -> str:
+    """Khóa theo budget (fraction) thay vì số thứ tự rung - --rungs khác nhau vẫn dùng lại được kết quả cùng budget"""
+    return f"{location_key}|{candidate_id(candidate)}|{float(fraction)!r}|{fingerprint}"
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Kết quả đã chạy từ file JSONL (bỏ qua dòng ghi dở khi process bị kill)
+    Task lỗi và dòng của phiên bản cũ (không có fingerprint) không được tính - sẽ chạy lại
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" in record or "fingerprint" not in record:
+                continue
+            key = _task_key(record["location_key"], record["candidate"], record["fraction"], record["fingerprint"])
+            results[key] = record
+    return results
+
+def _score(record: Optional[Dict[str, Any]], metric: str) -> float:
+    """Điểm để xếp hạng (nhỏ hơn là tốt hơn); lỗi/NaN xếp cuối"""
+    if record is None or "error" in record:
+        return math.inf
+    value = record.get(metric)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return math.inf
+    return -value if metric == "r2" else value
+
+def run_selection(
+    series_by_station: Dict[int, np.ndarray],
+    candidates: Sequence[Candidate],
+    results_path: str,
+    test_fraction: float = 0.2,
+    rungs: Sequence[float] = DEFAULT_RUNGS,
+    eta: int = DEFAULT_ETA,
+    metric: str = "mae",
+    workers: Optional[int] = None
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Successive halving trên lưới candidate × trạm
+    Trả về location_key -> kết quả tốt nhất ở rung cuối (candidate + metric)
+    """
+    done = load_results(results_path)
+    alive = {location_key: list(candidates) for location_key in series_by_station}
+    test_sizes = {key: max(1, int(len(series) * test_fraction)) for key, series in series_by_station.items()}
+    fingerprints = {key: series_fingerprint(series, test_sizes[key]) for key, series in series_by_station.items()}
+    workers = workers or default_workers()
+
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    with open(results_path, "a") as log, ProcessPoolExecutor(max_workers=workers) as executor:
+        for rung, fraction in enumerate(rungs):
+            pending = [
+                (location_key, candidate, rung, fraction, series_by_station[location_key], test_sizes[location_key])
+                for location_key, station_candidates in alive.items()
+                for candidate in station_candidates
+                if _task_key(location_key, candidate, fraction, fingerprints[location_key]) not in done
+            ]
+            total = sum(len(c) for c in alive.values())
+            print(f"🚀 Rung {rung} (budget {fraction:.0%}): {total} tasks, {total - len(pending)} resumed")
+
+            futures = [executor.submit(_evaluate_task, task) for task in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                record["fingerprint"] = fingerprints[record["location_key"]]
+                # Task lỗi vẫn ghi log (và xếp cuối ở rung này) nhưng lần chạy sau sẽ chạy lại
+                done[_task_key(record["location_key"], record["candidate"], fraction, record["fingerprint"])] = record
+                log.write(json.dumps(record, default=float) + "\n")
+                log.flush()
+
+            if rung == len(rungs) - 1:
+                break
+
+            # Pruning: giữ top 1/eta candidate của mỗi trạm
+            for location_key, station_candidates in alive.items():
+                ranked = sorted(
+                    station_candidates,
+                    key=lambda c: _score(done.get(_task_key(location_key, c, fraction, fingerprints[location_key])), metric)
+                )
+                alive[location_key] = ranked[:max(1, math.ceil(len(ranked) / eta))]
+
+    final_fraction = rungs[-1]
+    winners: Dict[int, Dict[str, Any]] = {}
+    for location_key, station_candidates in alive.items():
+        records = [done.get(_task_key(location_key, c, final_fraction, fingerprints[location_key])) for c in station_candidates]
+        best = min(records, key=lambda r: _score(r, metric), default=None)
+        if best is not None and _score(best, metric) < math.inf:
+            winners[location_key] = best
+    return winners
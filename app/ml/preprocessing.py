@@ -0,0 +1,121 @@
+"""
+Preprocessing - Chuẩn bị dữ liệu chuỗi thời gian cho training và inference
+- Dữ liệu long-format (location_key, time, features) -> tensor (stations, hours, features) trên lưới giờ chung
+- Forward-fill và clip outlier 3σ theo PREPROCESSING_CONFIG
+- Cửa sổ trượt bằng sliding_window_view: view zero-copy, nhiều feature và nhiều trạm trong 1 tensor
+"""
+from __future__ import annotations
+from typing import Any, Dict, Optional, Sequence, Tuple
+from app.core.lazy import lazy_import
+from app.core.ml_config import PREPROCESSING_CONFIG
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+def to_station_tensor(
+    df: pd.DataFrame,
+    columns: Sequence[str],
+    station_column: str = 'location_key',
+    time_column: str = 'time',
+    end: Optional[pd.Timestamp] = None,
+    periods: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Đưa dữ liệu long-format về tensor (stations, hours, features) theo lưới giờ chung
+    Giờ không có dữ liệu là NaN; nhiều bản ghi cùng giờ thì lấy bản ghi cuối
+    end/periods: giới hạn lưới (mặc định từ giờ nhỏ nhất tới giờ lớn nhất trong df)
+    """
+    columns = list(columns)
+    if df.empty:
+        return {
+            "values": np.empty((0, periods or 0, len(columns))),
+            "location_keys": [],
+            "times": pd.DatetimeIndex([]),
+            "columns": columns,
+        }
+
+    hours = pd.DatetimeIndex(df[time_column]).floor('h')
+    end = hours.max() if end is None else end
+    start = hours.min() if periods is None else end - pd.Timedelta(hours=periods - 1)
+    times = pd.date_range(start=start, end=end, freq='h')
+
+    station_codes, location_keys = pd.factorize(df[station_column], sort=True)
+    time_codes = times.get_indexer(hours)
+    inside = time_codes >= 0
+
+    values = np.full((len(location_keys), len(times), len(columns)), np.nan)
+    # Gán theo thứ tự xuất hiện - bản ghi sau ghi đè bản ghi trước cùng (trạm, giờ)
+    values[station_codes[inside], time_codes[inside]] = df[columns].to_numpy(dtype=np.float64)[inside]
+
+    return {
+        "values": values,
+        "location_keys": [int(key) for key in location_keys],
+        "times": times,
+        "columns": columns,
+    }
+
+def forward_fill(values: np.ndarray, axis: int = 1) -> np.ndarray:
+    """Forward-fill NaN theo trục thời gian (NaN ở đầu chuỗi giữ nguyên)"""
+    values = np.moveaxis(values, axis, -1)
+    positions = np.where(np.isnan(values), 0, np.arange(values.shape[-1]))
+    np.maximum.accumulate(positions, axis=-1, out=positions)
+    filled = np.take_along_axis(values, positions, axis=-1)
+    return np.moveaxis(filled, -1, axis)
+
+def clip_outliers(values: np.ndarray, threshold: float, axis: int = 1) -> np.ndarray:
+    """Clip giá trị vượt mean ± threshold·std, tính riêng cho từng trạm và từng feature"""
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(values, axis=axis, keepdims=True)
+        std = np.nanstd(values, axis=axis, keepdims=True)
+    return np.clip(values, mean - threshold * std, mean + threshold * std)
+
+def preprocess(values: np.ndarray, config: Dict[str, Any] = PREPROCESSING_CONFIG) -> np.ndarray:
+    """Forward-fill + clip outlier theo PREPROCESSING_CONFIG cho tensor (stations, hours, features)"""
+    if config.get("fill_method") == "forward":
+        values = forward_fill(values)
+    if config.get("outlier_threshold"):
+        values = clip_outliers(values, config["outlier_threshold"])
+    return values
+
+def sliding_windows(values: np.ndarray, window: int, step: int = 1) -> np.ndarray:
+    """
+    Cửa sổ trượt theo trục thời gian: (stations, hours, features) -> (stations, windows, window, features)
+    Kết quả là view read-only trên values (không copy)
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=1)[:, ::step]
+    return np.swapaxes(windows, -1, -2)
+
+def complete_windows(values: np.ndarray, window: int, step: int = 1) -> np.ndarray:
+    """Mask (stations, windows): True nếu cửa sổ không chứa NaN - tính bằng cumsum, không duyệt từng cửa sổ"""
+    missing = np.isnan(values).any(axis=-1)
+    counts = np.concatenate([np.zeros((missing.shape[0], 1), dtype=np.int64), np.cumsum(missing, axis=1)], axis=1)
+    return (counts[:, window:] - counts[:, :-window] == 0)[:, ::step]
+
+def make_supervised(
+    values: np.ndarray,
+    sequence_length: int = PREPROCESSING_CONFIG["sequence_length"],
+    target_index: int = 0,
+    horizon: int = 1,
+    step: int = 1
+) -> Dict[str, np.ndarray]:
+    """
+    Cặp (X, y) cho training thay cho vòng for i in range(blockSize, trainSize) của notebook
+    X: (stations, samples, sequence_length, features) view; y: (stations, samples) giá trị target
+    sau cửa sổ horizon giờ; valid: mask các mẫu không có NaN ở cả X và y
+    """
+    usable = values.shape[1] - horizon
+    if usable < sequence_length:
+        stations, features = values.shape[0], values.shape[2]
+        return {
+            "X": np.empty((stations, 0, sequence_length, features)),
+            "y": np.empty((stations, 0)),
+            "valid": np.empty((stations, 0), dtype=bool),
+        }
+
+    X = sliding_windows(values[:, :usable], sequence_length, step)
+    y = values[:, sequence_length + horizon - 1:, target_index][:, ::step]
+    valid = complete_windows(values[:, :usable], sequence_length, step) & ~np.isnan(y)
+    return {"X": X, "y": y, "valid": valid}
+
+def flatten_samples(X: np.ndarray, y: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Gộp trục trạm và mẫu -> (samples, sequence_length, features) chỉ gồm mẫu hợp lệ (copy 1 lần)"""
+    return X[valid], y[valid]
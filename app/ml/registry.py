@@ -0,0 +1,181 @@
+"""
+Model Registry - Lưu cấu hình / artifact model dưới MODEL_SAVE_PATH
+- versions/<version>/: artifact bất biến của từng version (ONNX weights, scaler, metrics, manifest)
+- ACTIVE: tên version đang phục vụ - đổi bằng os.replace nên API process hot-swap không cần restart
+- station_configs.json: cấu hình model tốt nhất cho từng trạm (kết quả model selection)
+Mọi file được ghi atomic (file tạm + os.replace) để server đang đọc không thấy file ghi dở
+"""
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from app.core.ml_config import PRODUCTION_CONFIG, ml_settings
+
+STATION_CONFIGS_NAME = "station_configs.json"
+VERSIONS_DIR = "versions"
+ACTIVE_NAME = "ACTIVE"
+MANIFEST_NAME = "manifest.json"
+METRICS_NAME = "metrics.json"
+
+def atomic_write_text(path: str, content: str) -> None:
+    """Ghi ra file tạm cùng thư mục rồi os.replace - reader luôn thấy file cũ hoặc mới đầy đủ"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def atomic_write_json(path: str, data: Any) -> None:
+    atomic_write_text(path, json.dumps(data, indent=2, default=str))
+
+def new_version_name() -> str:
+    """Tên version theo thời điểm publish (UTC) - sắp xếp theo chuỗi = theo thời gian"""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+class ModelRegistry:
+    """Registry model trên filesystem (thư mục MODEL_SAVE_PATH)"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or ml_settings.MODEL_SAVE_PATH
+
+    @property
+    def station_configs_path(self) -> str:
+        return os.path.join(self.root, STATION_CONFIGS_NAME)
+
+    @property
+    def versions_dir(self) -> str:
+        return os.path.join(self.root, VERSIONS_DIR)
+
+    @property
+    def active_path(self) -> str:
+        return os.path.join(self.root, ACTIVE_NAME)
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def list_versions(self) -> List[str]:
+        """Các version đã publish, cũ -> mới"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if not name.startswith(".") and os.path.isdir(self.version_dir(name))
+        )
+
+    def active_version(self) -> Optional[str]:
+        """Version đang active (None nếu chưa publish version nào)"""
+        try:
+            with open(self.active_path) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and os.path.isdir(self.version_dir(version)) else None
+
+    def active_dir(self) -> str:
+        """Thư mục artifact đang phục vụ - fallback về MODEL_SAVE_PATH (layout phẳng cũ) khi chưa có version"""
+        version = self.active_version()
+        return self.version_dir(version) if version else self.root
+
+    def manifest(self, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self.version_dir(version), MANIFEST_NAME)) as f:
+            return json.load(f)
+
+    def publish(
+        self,
+        artifacts: Dict[str, str],
+        metrics: Optional[Dict[str, Any]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        activate: bool = True
+    ) -> str:
+        """
+        Tạo version mới từ các file artifact (tên file trong version -> đường dẫn nguồn)
+        Copy vào thư mục staging rồi rename 1 lần, nên version chỉ xuất hiện khi đã đầy đủ
+        """
+        version = new_version_name()
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.versions_dir, prefix=".staging-")
+        try:
+            for name, source in artifacts.items():
+                shutil.copy2(source, os.path.join(staging, name))
+            with open(os.path.join(staging, METRICS_NAME), "w") as f:
+                json.dump(metrics or {}, f, indent=2, default=str)
+            with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+                json.dump({
+                    "version": version,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "artifacts": sorted(artifacts),
+                    **(metadata or {})
+                }, f, indent=2, default=str)
+            os.rename(staging, self.version_dir(version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        print(f"✅ Published model version {version}")
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version: str) -> None:
+        """Đổi version active (atomic) - API process tự hot-swap ở lần kiểm tra kế tiếp"""
+        if not os.path.isdir(self.version_dir(version)):
+            raise ValueError(f"Model version not found: {version}")
+        atomic_write_text(self.active_path, version + "\n")
+        print(f"✅ Active model version: {version}")
+
+    def rollback(self) -> Optional[str]:
+        """Quay về version ngay trước version active"""
+        versions = self.list_versions()
+        active = self.active_version()
+        if active not in versions or versions.index(active) == 0:
+            return None
+        previous = versions[versions.index(active) - 1]
+        self.activate(previous)
+        return previous
+
+    def prune(self, keep: int = PRODUCTION_CONFIG["backup_models"]) -> List[str]:
+        """Giữ version active + keep version backup mới nhất, xóa phần còn lại"""
+        active = self.active_version()
+        backups = [v for v in self.list_versions() if v != active]
+        removed = backups[:-keep] if keep > 0 else backups
+        for version in removed:
+            shutil.rmtree(self.version_dir(version), ignore_errors=True)
+        if removed:
+            print(f"🗑️ Removed {len(removed)} old model versions")
+        return removed
+
+    def load_station_configs(self) -> Dict[str, Dict[str, Any]]:
+        """location_key (string) -> cấu hình model đã chọn"""
+        try:
+            with open(self.station_configs_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def station_config(self, location_key: int) -> Optional[Dict[str, Any]]:
+        return self.load_station_configs().get(str(location_key))
+
+    def save_station_configs(self, configs: Dict[int, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Merge cấu hình mới (ghi đè theo trạm) vào station_configs.json"""
+        merged = self.load_station_configs()
+        updated_at = datetime.now(timezone.utc).isoformat()
+        for location_key, config in configs.items():
+            merged[str(location_key)] = {**config, "updated_at": updated_at}
+        atomic_write_json(self.station_configs_path, merged)
+        return merged
+
+# Global registry instance
+model_registry = ModelRegistry()
+
+def get_model_registry() -> ModelRegistry:
+    return model_registry
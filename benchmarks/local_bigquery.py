@@ -0,0 +1,158 @@
+"""
+Local BigQuery Stand-in - DuckDB thay cho google.cloud.bigquery.Client khi benchmark offline
+Chỉ implement phần API mà app/db/bigquery.py sử dụng: client.query(...) -> job.result() -> to_dataframe() / to_arrow()
+SQL BigQuery (Standard SQL) được dịch sang DuckDB cho các cú pháp mà endpoint dùng
+"""
+import re
+import uuid
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+# `project.dataset.Table` -> Table
+_TABLE_ID = re.compile(r"`(?:[\w-]+\.)*(\w+)`")
+# TIMESTAMP_SUB(x, INTERVAL n UNIT) / DATE_SUB(...) -> (x - INTERVAL (n) UNIT)
+_DATE_ARITH = re.compile(r"\b(?:TIMESTAMP_SUB|DATE_SUB)\(\s*([^,()]+?)\s*,\s*INTERVAL\s+([^\s()]+)\s+(\w+)\s*\)", re.IGNORECASE)
+_CURRENT_FUNCS = re.compile(r"\b(CURRENT_TIMESTAMP|CURRENT_DATE)\(\)", re.IGNORECASE)
+_IN_UNNEST = re.compile(r"\bIN\s+UNNEST\((@\w+)\)", re.IGNORECASE)
+_TIMESTAMP_CALL = re.compile(r"\bTIMESTAMP\(", re.IGNORECASE)
+_PARAM = re.compile(r"@(\w+)")
+
+def _rewrite_timestamp_calls(sql: str) -> str:
+    """TIMESTAMP(expr) -> CAST(expr AS TIMESTAMPTZ) (tìm dấu đóng ngoặc tương ứng)"""
+    while True:
+        match = _TIMESTAMP_CALL.search(sql)
+        if match is None:
+            return sql
+        depth = 1
+        i = match.end()
+        while depth and i < len(sql):
+            depth += {"(": 1, ")": -1}.get(sql[i], 0)
+            i += 1
+        inner = sql[match.end():i - 1]
+        sql = f"{sql[:match.start()]}CAST({inner} AS TIMESTAMPTZ){sql[i:]}"
+
+def translate_sql(sql: str) -> str:
+    """Dịch SQL BigQuery sang DuckDB (chỉ các cú pháp app đang dùng)"""
+    sql = _TABLE_ID.sub(r"\1", sql)
+    sql = _CURRENT_FUNCS.sub(r"\1", sql)
+    sql = _DATE_ARITH.sub(r"(\1 - INTERVAL (\2) \3)", sql)
+    sql = _IN_UNNEST.sub(r"IN (SELECT UNNEST(\1))", sql)
+    sql = _rewrite_timestamp_calls(sql)
+    return _PARAM.sub(r"$\1", sql)
+
+def query_parameters(job_config: Any) -> Dict[str, Any]:
+    """ScalarQueryParameter / ArrayQueryParameter -> dict parameter của DuckDB"""
+    params = {}
+    for param in getattr(job_config, "query_parameters", None) or []:
+        params[param.name] = list(param.values) if hasattr(param, "values") else param.value
+    return params
+
+class LocalRow(dict):
+    """Row giống google.cloud.bigquery.Row: truy cập theo key và attribute"""
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+class LocalRowIterator:
+    """RowIterator tối giản: .schema, .pages, .to_arrow_iterable(), to_arrow/to_dataframe, iterate từng row"""
+
+    def __init__(self, table: pa.Table, page_size: Optional[int]):
+        self._table = table
+        self._page_size = page_size or max(table.num_rows, 1)
+        self.schema = [SimpleNamespace(name=name) for name in table.column_names]
+        self.total_rows = table.num_rows
+
+    def to_arrow_iterable(self, bqstorage_client: Any = None) -> Iterator[pa.RecordBatch]:
+        return iter(self._table.to_batches(max_chunksize=self._page_size))
+
+    def to_arrow(self, **download_options: Any) -> pa.Table:
+        return self._table
+
+    def to_dataframe(self, **download_options: Any) -> pd.DataFrame:
+        return self._table.to_pandas()
+
+    @property
+    def pages(self) -> Iterator[List[LocalRow]]:
+        for batch in self.to_arrow_iterable():
+            yield [LocalRow(row) for row in batch.to_pylist()]
+
+    def __iter__(self) -> Iterator[LocalRow]:
+        for page in self.pages:
+            yield from page
+
+class LocalQueryJob:
+    """QueryJob chạy trên DuckDB - query thực thi đồng bộ trong result() như BigQuery job"""
+
+    def __init__(self, connection: duckdb.DuckDBPyConnection, query: str, job_config: Any = None):
+        self.job_id = f"local_{uuid.uuid4().hex[:12]}"
+        self.query = query
+        self.sql = translate_sql(query)
+        self.params = query_parameters(job_config)
+        self.created = datetime.now(timezone.utc)
+        self.started: Optional[datetime] = None
+        self.ended: Optional[datetime] = None
+        # Thuộc tính thống kê giống BigQuery (không có ý nghĩa với DuckDB)
+        self.cache_hit = False
+        self.total_bytes_processed: Optional[int] = None
+        self.total_bytes_billed: Optional[int] = None
+        self.slot_millis: Optional[int] = None
+        self.num_dml_affected_rows: Optional[int] = None
+        self._connection = connection
+        self._table: Optional[pa.Table] = None
+        self._lock = threading.Lock()
+
+    def _execute(self) -> pa.Table:
+        with self._lock:
+            if self._table is None:
+                self.started = datetime.now(timezone.utc)
+                # Mỗi job 1 cursor riêng - DuckDB cursor an toàn khi dùng từ nhiều thread
+                cursor = self._connection.cursor()
+                try:
+                    cursor.execute(self.sql, self.params or None)
+                    self._table = cursor.fetch_arrow_table() if cursor.description else pa.table({})
+                finally:
+                    cursor.close()
+                self.total_bytes_processed = self._table.nbytes
+                self.ended = datetime.now(timezone.utc)
+            return self._table
+
+    def result(self, timeout: Optional[float] = None, page_size: Optional[int] = None) -> LocalRowIterator:
+        return LocalRowIterator(self._execute(), page_size)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return self._execute().to_pandas()
+
+    def to_arrow(self) -> pa.Table:
+        return self._execute()
+
+    def cancel(self) -> bool:
+        return True
+
+class LocalBigQueryClient:
+    """
+    Thay thế bigquery.Client trong benchmark
+    Gắn vào app bằng install_local_client() - app.db.bigquery.get_bigquery_client() trả về client này
+    """
+
+    def __init__(self, connection: duckdb.DuckDBPyConnection, project: str = "local"):
+        self.connection = connection
+        self.project = project
+        self.queries_executed = 0
+
+    def query(self, query: str, job_config: Any = None, **kwargs) -> LocalQueryJob:
+        self.queries_executed += 1
+        return LocalQueryJob(self.connection, query, job_config)
+
+def install_local_client(client: LocalBigQueryClient) -> None:
+    """Thay singleton BigQuery client của app bằng client local"""
+    from app.db import bigquery as bigquery_module
+
+    bigquery_module._bigquery_client = client
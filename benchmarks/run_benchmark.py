@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmark API offline - chạy toàn bộ GET endpoint của api_router trên DuckDB stand-in
+Báo cáo p50/p99 latency và requests/sec cho từng endpoint
+
+Ví dụ:
+    python benchmarks/run_benchmark.py --months 6 --requests 200 --concurrency 16
+    python benchmarks/run_benchmark.py --output after.json --baseline before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import numpy as np
+from fastapi.routing import APIRoute
+
+from benchmarks.local_bigquery import LocalBigQueryClient, install_local_client
+from benchmarks.synthetic_data import STATIONS, create_database
+
+def _random_station() -> Dict[str, float]:
+    _, lat, lng = random.choice(STATIONS)
+    # Lệch nhẹ quanh trạm - mô phỏng click bản đồ
+    return {"lat": round(lat + random.uniform(-0.005, 0.005), 5), "lng": round(lng + random.uniform(-0.005, 0.005), 5)}
+
+# Giá trị mẫu cho từng query/path parameter của endpoint
+PARAM_SAMPLES: Dict[str, Callable[[], Any]] = {
+    "days": lambda: random.choice([3, 7, 14]),
+    "limit": lambda: 100,
+    "start_date": lambda: (date.today() - timedelta(days=7)).isoformat(),
+    "end_date": lambda: date.today().isoformat(),
+}
+
+# Route chẩn đoán không phải endpoint phục vụ người dùng - /debug/startup trả 404 khi tắt STARTUP_PROFILE_ENABLED
+# và khi bật thì chỉ profile 1 lần, đo latency không có ý nghĩa
+SKIPPED_PREFIXES = ("/debug/",)
+
+def build_request(route: APIRoute) -> Optional[Callable[[], Dict[str, Any]]]:
+    """Hàm sinh (path, params) cho 1 route, None nếu có parameter bắt buộc chưa biết cách sinh"""
+    query_params = route.dependant.query_params
+    path_params = route.dependant.path_params
+
+    unknown = [
+        p.name for p in query_params + path_params
+        if p.required and p.name not in PARAM_SAMPLES and p.name not in ("lat", "lng")
+    ]
+    if unknown:
+        print(f"⚠️ Skip {route.path}: không có giá trị mẫu cho {unknown}")
+        return None
+
+    def make() -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        names = {p.name for p in query_params + path_params}
+        if {"lat", "lng"} & names:
+            values.update(_random_station())
+        for p in query_params + path_params:
+            if p.name in PARAM_SAMPLES and (p.required or p.name in ("start_date", "end_date")):
+                values[p.name] = PARAM_SAMPLES[p.name]()
+        path = route.path.format(**{p.name: values.pop(p.name) for p in path_params})
+        return {"path": path, "params": {k: v for k, v in values.items() if k in names}}
+
+    return make
+
+def discover_endpoints(app) -> Dict[str, Callable[[], Dict[str, Any]]]:
+    """Tất cả GET route của API (bỏ qua docs/openapi và route chẩn đoán trong SKIPPED_PREFIXES)"""
+    from app.core.config import settings
+
+    endpoints = {}
+    for route in app.routes:
+        if isinstance(route, APIRoute) and "GET" in route.methods and route.path.startswith(settings.API_V1_STR):
+            if route.path[len(settings.API_V1_STR):].startswith(SKIPPED_PREFIXES):
+                print(f"⚠️ Skip {route.path}: route chẩn đoán")
+                continue
+            make = build_request(route)
+            if make is not None:
+                endpoints[route.path] = make
+    return endpoints
+
+async def run_endpoint(
+    client: httpx.AsyncClient,
+    make_request: Callable[[], Dict[str, Any]],
+    total: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Gửi total request với concurrency worker song song, trả về thống kê latency"""
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            request = make_request()
+            started = time.perf_counter()
+            try:
+                response = await client.get(request["path"], params=request["params"])
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 2),
+        "p99_ms": round(float(p99), 2),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+def print_report(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    """In bảng kết quả, kèm % thay đổi so với baseline (nếu có)"""
+    print("\n📊 KẾT QUẢ BENCHMARK")
+    print("=" * 96)
+    print(f"{'Endpoint':<40} {'req':>6} {'err':>5} {'p50 ms':>10} {'p99 ms':>10} {'req/s':>10}  {'Δp50':>7}")
+    print("-" * 96)
+    for path, r in results.items():
+        delta = ""
+        if baseline and path in baseline and baseline[path]["p50_ms"] > 0:
+            delta = f"{(r['p50_ms'] / baseline[path]['p50_ms'] - 1) * 100:+.0f}%"
+        print(f"{path:<40} {r['requests']:>6} {r['errors']:>5} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['rps']:>10.1f}  {delta:>7}")
+    print("=" * 96)
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    connection = create_database(months=args.months, seed=args.seed, rollups=not args.no_rollups)
+    local_client = LocalBigQueryClient(connection)
+    install_local_client(local_client)
+
+    import main as app_main
+    from app.core.config import settings
+    from app.db.bigquery import query_stats
+    from app.db.dimensions import dimension_cache
+
+    # Không có agg_daily - đi thẳng query raw thay vì thử rollup rồi fallback
+    settings.ROLLUPS_ENABLED = not args.no_rollups
+
+    app = app_main.app
+    endpoints = discover_endpoints(app)
+    if args.endpoints:
+        endpoints = {path: make for path, make in endpoints.items() if any(key in path for key in args.endpoints)}
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        await dimension_cache.ensure_loaded()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            for path, make in endpoints.items():
+                # Warm-up: cache/lazy init không tính vào kết quả
+                for _ in range(args.warmup):
+                    request = make()
+                    await client.get(request["path"], params=request["params"])
+                results[path] = await run_endpoint(client, make, args.requests, args.concurrency)
+                print(f"✅ {path}: p50 {results[path]['p50_ms']} ms, {results[path]['rps']} req/s")
+
+    print(f"\n🗄️ DuckDB queries executed: {local_client.queries_executed}")
+    if args.verbose:
+        print(json.dumps(query_stats.snapshot(), indent=2))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API endpoints với DuckDB thay cho BigQuery")
+    parser.add_argument("--months", type=int, default=3, help="Số tháng dữ liệu synthetic (30 trạm × mỗi giờ)")
+    parser.add_argument("--requests", type=int, default=200, help="Số request cho mỗi endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Số request song song")
+    parser.add_argument("--warmup", type=int, default=5, help="Số request warm-up cho mỗi endpoint")
+    parser.add_argument("--endpoints", nargs="*", help="Chỉ chạy endpoint có path chứa các chuỗi này")
+    parser.add_argument("--no-rollups", action="store_true", help="Không tạo agg_daily (đo đường query raw)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", help="File JSON kết quả lần trước để so sánh p50")
+    parser.add_argument("--verbose", action="store_true", help="In thống kê job theo từng named query")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = asyncio.run(main_async(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
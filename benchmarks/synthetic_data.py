@@ -0,0 +1,97 @@
+"""
+Synthetic Data - Sinh Dim_Location / Dim_Time / Fact_Weather_AirQuality cho benchmark offline
+Quy mô: months x 30 trạm x mỗi giờ 1 record (giống dữ liệu thực từ pipeline)
+"""
+from datetime import datetime, timezone
+import duckdb
+import numpy as np
+import pandas as pd
+
+# Tọa độ 30 quận/huyện Hà Nội (giống get_mock_aqi_data)
+STATIONS = [
+    ("Ba Đình", 21.0333, 105.8214), ("Hoàn Kiếm", 21.0285, 105.8542), ("Hai Bà Trưng", 21.0075, 105.8525),
+    ("Đống Đa", 21.0167, 105.8083), ("Tây Hồ", 21.0758, 105.8217), ("Cầu Giấy", 21.0333, 105.7833),
+    ("Thanh Xuân", 21.0167, 105.7833), ("Hoàng Mai", 20.9742, 105.8733), ("Long Biên", 21.0458, 105.8925),
+    ("Nam Từ Liêm", 21.0139, 105.7656), ("Bắc Từ Liêm", 21.0667, 105.7333), ("Hà Đông", 20.9717, 105.7692),
+    ("Sơn Tây", 21.1333, 105.5000), ("Ba Vì", 21.2500, 105.4000), ("Phúc Thọ", 21.1167, 105.4167),
+    ("Đan Phượng", 21.0833, 105.6167), ("Hoài Đức", 21.0000, 105.6833), ("Quốc Oai", 21.0333, 105.6000),
+    ("Thạch Thất", 21.0833, 105.6833), ("Chương Mỹ", 21.0000, 105.7500), ("Thanh Oai", 20.9167, 105.7500),
+    ("Thường Tín", 20.9167, 105.8333), ("Phú Xuyên", 20.8333, 105.8333), ("Ứng Hòa", 20.7500, 105.9167),
+    ("Mỹ Đức", 20.7500, 105.7500), ("Mai Châu", 21.1667, 105.5000), ("Lương Sơn", 21.1667, 105.6667),
+    ("Kim Bôi", 21.0833, 105.7500), ("Cao Phong", 21.0000, 105.8333), ("Tân Lạc", 20.9167, 105.6667),
+]
+
+def build_frames(months: int, stations: int = len(STATIONS), seed: int = 42):
+    """DataFrame cho 3 bảng Star Schema - time_key tăng dần theo thời gian"""
+    rng = np.random.default_rng(seed)
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    hours = months * 30 * 24
+    times = pd.date_range(end=end, periods=hours, freq="h")
+
+    locations = pd.DataFrame({
+        "location_key": np.arange(1, stations + 1, dtype=np.int64),
+        "location_name": [STATIONS[i % len(STATIONS)][0] for i in range(stations)],
+        "latitude": [STATIONS[i % len(STATIONS)][1] for i in range(stations)],
+        "longitude": [STATIONS[i % len(STATIONS)][2] for i in range(stations)],
+    })
+
+    dim_time = pd.DataFrame({
+        "time_key": np.arange(1, hours + 1, dtype=np.int64),
+        "time": times,
+    })
+
+    # Chu kỳ ngày + nhiễu cho mỗi trạm
+    n = hours * stations
+    hour_of_day = np.tile(times.hour.to_numpy(), stations)
+    daily = np.sin((hour_of_day - 6) / 24 * 2 * np.pi)
+    pm2_5 = np.clip(35 + 15 * daily + rng.normal(0, 8, n), 1, None)
+
+    fact = pd.DataFrame({
+        "location_key": np.repeat(locations["location_key"].to_numpy(), hours),
+        "time_key": np.tile(dim_time["time_key"].to_numpy(), stations),
+        "pm2_5": pm2_5,
+        "pm10": pm2_5 * 1.7 + rng.normal(0, 5, n),
+        "temperature_2m": 27 + 4 * daily + rng.normal(0, 1, n),
+        "relative_humidity_2m": np.clip(70 - 10 * daily + rng.normal(0, 5, n), 0, 100),
+        "wind_speed_10m": np.abs(rng.normal(3, 1.5, n)),
+        "wind_direction_10m": rng.uniform(0, 360, n),
+        "pressure_msl": 1010 + rng.normal(0, 3, n),
+        "AQI_TOTAL": np.clip(pm2_5 * 2.5, 0, 500).astype(np.int64),
+    })
+    return locations, dim_time, fact
+
+def create_database(months: int = 3, stations: int = len(STATIONS), seed: int = 42, rollups: bool = True) -> duckdb.DuckDBPyConnection:
+    """DuckDB in-memory với dữ liệu synthetic (và agg_daily nếu rollups=True)"""
+    connection = duckdb.connect(":memory:")
+    connection.execute("SET TimeZone = 'UTC'")
+
+    locations, dim_time, fact = build_frames(months, stations, seed)
+    for name, frame in [("Dim_Location", locations), ("Dim_Time", dim_time), ("Fact_Weather_AirQuality", fact)]:
+        connection.register("frame", frame)
+        connection.execute(f"CREATE TABLE {name} AS SELECT * FROM frame")
+        connection.unregister("frame")
+    connection.execute("ALTER TABLE Dim_Time ALTER time TYPE TIMESTAMPTZ")
+
+    if rollups:
+        # Cùng cột với agg_daily (app/db/rollups.py DAILY_SCHEMA)
+        connection.execute("""
+        CREATE TABLE agg_daily AS
+        SELECT
+            f.location_key,
+            CAST(t.time AS DATE) AS date,
+            AVG(f.pm2_5) AS avg_pm2_5,
+            AVG(f.pm10) AS avg_pm10,
+            AVG(f.temperature_2m) AS avg_temperature,
+            AVG(f.relative_humidity_2m) AS avg_humidity,
+            AVG(f.wind_speed_10m) AS avg_wind_speed,
+            AVG(f.AQI_TOTAL) AS daily_avg_aqi,
+            MAX(f.AQI_TOTAL) AS daily_max_aqi,
+            MIN(f.AQI_TOTAL) AS daily_min_aqi,
+            COUNT(*) AS record_count
+        FROM Fact_Weather_AirQuality f
+        JOIN Dim_Time t ON f.time_key = t.time_key
+        GROUP BY 1, 2
+        """)
+
+    print(f"✅ Synthetic data: {len(locations)} locations × {len(dim_time):,} hours = {len(fact):,} fact rows")
+    return connection
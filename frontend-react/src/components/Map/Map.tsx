@@ -16,6 +16,7 @@ L.Icon.Default.mergeOptions({
 });
 import { RefreshCw } from 'lucide-react';
 import { AQIData } from '../../types/aqi';
+import { AQI_TILE_URL } from '../../services/api';
 import { getAQIColor, getAQILabel, getAQILevelInfo, getDistrictName } from '../../utils/aqi';
 import '../../types/leaflet-heat.d.ts';
 
@@ -121,8 +122,17 @@ const Map = ({ data, onLocationSelect, selectedLocation }: MapProps) => {
 
     // Tạo layer control
     const baseMaps = {};
+    // Lớp AQI nội suy từ server - chỉ tải tile PNG đã cache, không tính heatmap trên client
+    const aqiTileLayer = L.tileLayer(AQI_TILE_URL, {
+      maxZoom: 18,
+      tileSize: 256,
+      opacity: 0.8,
+      crossOrigin: true
+    });
+
     const overlayMaps = {
-      "📍 Điểm Quan Trắc": markersLayer
+      "📍 Điểm Quan Trắc": markersLayer,
+      "🎨 Lớp AQI (server)": aqiTileLayer
     };
 
     const layerControl = L.control.layers(baseMaps, overlayMaps, {
@@ -13,6 +13,9 @@ import {
 // API Configuration
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'https://fastapi-bigquery-app-production.up.railway.app/api/v1';
 
+// AQI overlay tiles (XYZ) render sẵn trên server
+export const AQI_TILE_URL = `${API_BASE_URL}/aqi/tiles/{z}/{x}/{y}.png`;
+
 // Create axios instance
 const apiClient = axios.create({
     baseURL: API_BASE_URL,
@@ -3,17 +3,63 @@ AirVXM Platform - FastAPI Backend
 Hệ thống giám sát chất lượng không khí Hà Nội với BigQuery integration
 """
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.lazy import mark_startup, warm_up_imports
 from app.api.router import api_router
+from app.db.bigquery import shutdown_query_executor
+from app.db.rollups import rollup_refresh_loop
+from app.db.dimensions import dimension_refresh_loop
+from app.ml.forecast_engine import model_reload_loop
+from app.ml.forecast_store import forecast_refresh_loop
+
+async def start_background_jobs(background_tasks: list):
+    """
+    Job nền của app - chạy sau khi server đã nhận request (/health trả lời ngay)
+    Module nặng (pandas, numpy, BigQuery) được import ở thread riêng trước, để các loop không block event loop
+    """
+    if settings.WARMUP_IMPORTS_ON_STARTUP:
+        await asyncio.to_thread(warm_up_imports)
+    
+    # Preload Dim_Location / Dim_Time vào memory và refresh định kỳ
+    background_tasks.append(asyncio.create_task(dimension_refresh_loop(settings.DIMENSION_REFRESH_MINUTES)))
+    
+    # Refresh bảng rollup định kỳ (tắt mặc định - dùng scripts/refresh_rollups.py)
+    if settings.ROLLUP_REFRESH_INTERVAL_MINUTES > 0:
+        background_tasks.append(asyncio.create_task(rollup_refresh_loop(settings.ROLLUP_REFRESH_INTERVAL_MINUTES)))
+    
+    # Dự báo 7 ngày cho toàn bộ trạm - tính lại khi có dữ liệu fact mới
+    if settings.FORECAST_REFRESH_MINUTES > 0:
+        background_tasks.append(asyncio.create_task(forecast_refresh_loop(settings.FORECAST_REFRESH_MINUTES)))
+    
+    # Hot-swap model khi model registry có version ACTIVE mới
+    if settings.MODEL_RELOAD_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(model_reload_loop(settings.MODEL_RELOAD_SECONDS)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks của ứng dụng"""
+    mark_startup("app_ready")
+    background_tasks = []
+    background_tasks.append(asyncio.create_task(start_background_jobs(background_tasks)))
+    
+    yield
+    
+    for task in background_tasks:
+        task.cancel()
+    # Giải phóng thread pool chạy BigQuery job
+    shutdown_query_executor()
 
 # Khởi tạo FastAPI app với metadata
 app = FastAPI(
     title="AirVXM Platform API",
     description="Air Quality Monitoring Platform for Hanoi - Backend API with BigQuery integration",
     version="1.0.0",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Cấu hình CORS middleware cho frontend
@@ -23,6 +69,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Metadata của /aqi/grid và validator (ETag / Last-Modified) cho client khác origin
+    expose_headers=["X-Grid-Width", "X-Grid-Height", "X-Grid-Bounds", "X-Grid-Scale", "ETag", "Last-Modified"],
 )
 
 # Mount API router với prefix
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Backtest walk-forward ARIMA cho tất cả trạm (song song trên process pool)
+Metric MAE / MAPE / R² so với ngưỡng MIN_R2_SCORE / MAX_MAE / MAX_MAPE
+
+Usage:
+    pip install statsmodels
+    python scripts/backtest_models.py --days 90
+    python scripts/backtest_models.py --days 365 --order 5 1 0 --refit-every 336 --workers 8
+    python scripts/backtest_models.py --csv data.csv --output backtest.csv
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import pandas as pd
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ml_config import EVALUATION_CONFIG, ml_settings
+from app.ml.backtest import backtest_stations, load_station_series, meets_thresholds, station_series, summarize
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Walk-forward ARIMA backtest per station")
+    parser.add_argument("--days", type=int, default=90, help="Số ngày dữ liệu lấy từ BigQuery")
+    parser.add_argument("--csv", help="Đọc dữ liệu từ CSV (location_key, time, AQI_TOTAL) thay vì BigQuery")
+    parser.add_argument("--target", default="AQI_TOTAL")
+    parser.add_argument("--order", type=int, nargs=3, default=list(ml_settings.ARIMA_ORDER), metavar=("P", "D", "Q"))
+    parser.add_argument("--test-fraction", type=float, default=EVALUATION_CONFIG["test_size"])
+    parser.add_argument("--refit-every", type=int, default=ml_settings.BACKTEST_REFIT_EVERY,
+                        help="Refit sau mỗi N bước test (0 = chỉ fit 1 lần)")
+    parser.add_argument("--workers", type=int, default=None, help="Số process (mặc định số CPU)")
+    parser.add_argument("--output", help="Ghi metric theo trạm ra file CSV")
+    args = parser.parse_args()
+
+    print("🚀 Loading station series...")
+    try:
+        if args.csv:
+            df = pd.read_csv(args.csv, parse_dates=["time"])
+            series = station_series(df, args.target)
+        else:
+            series = asyncio.run(load_station_series(args.days, args.target))
+    except Exception as e:
+        print(f"❌ Failed to load data: {e}")
+        sys.exit(1)
+
+    if not series:
+        print("❌ No data")
+        sys.exit(1)
+    print(f"✅ {len(series)} stations, {max(len(s) for s in series.values())} hours")
+
+    started = time.perf_counter()
+    results = backtest_stations(
+        series, order=tuple(args.order), test_fraction=args.test_fraction,
+        refit_every=args.refit_every, workers=args.workers
+    )
+    elapsed = time.perf_counter() - started
+
+    with pd.option_context("display.max_rows", None, "display.width", 120):
+        print(results.drop(columns=["order"]).round(3).to_string(index=False))
+
+    summary = summarize(results)
+    print(f"\n📊 ARIMA{tuple(args.order)}: {summary} in {elapsed:.1f}s")
+    print("✅ Meets thresholds" if meets_thresholds(summary) else "⚠️ Below MIN_R2_SCORE / MAX_MAE / MAX_MAPE thresholds")
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"💾 Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,13 @@ from google.cloud.exceptions import NotFound
 import pandas as pd
 from datetime import datetime, timedelta
 
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.bigquery import schema_fields
+from app.db.ingestion import load_frame
+from app.db.rollups import HOURLY_TABLE, HOURLY_SCHEMA, DAILY_TABLE, DAILY_SCHEMA
+
 def create_dimension_tables(client, dataset_id):
     """Tạo các bảng dimension"""
     
@@ -85,7 +92,10 @@ def create_dimension_tables(client, dataset_id):
     return True
 
 def create_fact_table(client, dataset_id):
-    """Tạo bảng fact chính"""
+    """
+    Tạo bảng fact chính
+    Partition theo ngày của cột time và cluster theo location_id - query N ngày gần nhất chỉ quét N partition
+    """
     
     fact_schema = [
         # Foreign Keys
@@ -93,6 +103,9 @@ def create_fact_table(client, dataset_id):
         bigquery.SchemaField("time_id", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("weather_condition_id", "STRING", mode="NULLABLE"),
         
+        # Thời điểm đo (denormalize từ dim_time) - cột partition
+        bigquery.SchemaField("time", "TIMESTAMP", mode="REQUIRED"),
+        
         # Measurements
         bigquery.SchemaField("pm2_5", "FLOAT64", mode="NULLABLE"),
         bigquery.SchemaField("pm10", "FLOAT64", mode="NULLABLE"),
@@ -125,6 +138,11 @@ def create_fact_table(client, dataset_id):
     
     fact_table_id = f"{client.project}.{dataset_id}.fact_air_quality"
     fact_table = bigquery.Table(fact_table_id, schema=fact_schema)
+    fact_table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field="time"
+    )
+    fact_table.clustering_fields = ["location_id"]
     
     try:
         client.delete_table(fact_table_id, not_found_ok=True)
@@ -136,80 +154,32 @@ def create_fact_table(client, dataset_id):
         return False
 
 def create_aggregated_tables(client, dataset_id):
-    """Tạo các bảng tổng hợp"""
-    
-    # 1. Hourly aggregation
-    hourly_schema = [
-        bigquery.SchemaField("location_id", "STRING", mode="REQUIRED"),
-        bigquery.SchemaField("year", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("month", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("day", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("hour", "INT64", mode="REQUIRED"),
-        
-        # Averages
-        bigquery.SchemaField("avg_pm2_5", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("avg_aqi", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("avg_temperature", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("avg_humidity", "FLOAT64", mode="NULLABLE"),
-        
-        # Min/Max
-        bigquery.SchemaField("min_pm2_5", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("max_pm2_5", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("min_aqi", "INT64", mode="NULLABLE"),
-        bigquery.SchemaField("max_aqi", "INT64", mode="NULLABLE"),
-        
-        # Counts
-        bigquery.SchemaField("record_count", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("last_updated", "TIMESTAMP", mode="REQUIRED")
-    ]
-    
-    hourly_table_id = f"{client.project}.{dataset_id}.agg_hourly"
-    hourly_table = bigquery.Table(hourly_table_id, schema=hourly_schema)
-    
-    try:
-        client.delete_table(hourly_table_id, not_found_ok=True)
-        hourly_table = client.create_table(hourly_table)
-        print(f"✅ Tạo bảng {hourly_table_id}")
-    except Exception as e:
-        print(f"❌ Lỗi tạo bảng hourly: {e}")
-        return False
-    
-    # 2. Daily aggregation
-    daily_schema = [
-        bigquery.SchemaField("location_id", "STRING", mode="REQUIRED"),
-        bigquery.SchemaField("year", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("month", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("day", "INT64", mode="REQUIRED"),
-        
-        # Daily statistics
-        bigquery.SchemaField("daily_avg_aqi", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("daily_max_aqi", "INT64", mode="NULLABLE"),
-        bigquery.SchemaField("daily_min_aqi", "INT64", mode="NULLABLE"),
-        
-        # Health impact
-        bigquery.SchemaField("good_hours", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("moderate_hours", "INT64", mode="REQUIRED"),
-        bigquery.SchemaField("unhealthy_hours", "INT64", mode="REQUIRED"),
+    """
+    Tạo các bảng tổng hợp
+    Schema dùng chung với job rollup (app/db/rollups.py) - bảng được populate bằng scripts/refresh_rollups.py
+    """
+    
+    for table_name, schema, partition_field in [
+        (HOURLY_TABLE, HOURLY_SCHEMA, "hour_start"),  # 1. Hourly aggregation
+        (DAILY_TABLE, DAILY_SCHEMA, "date")           # 2. Daily aggregation
+    ]:
+        table_id = f"{client.project}.{dataset_id}.{table_name}"
+        table = bigquery.Table(table_id, schema=schema_fields(schema))
+        table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY,
+            field=partition_field
+        )
+        table.clustering_fields = ["location_key"]
         
-        # Weather summary
-        bigquery.SchemaField("avg_temperature", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("avg_humidity", "FLOAT64", mode="NULLABLE"),
-        bigquery.SchemaField("total_rainfall", "FLOAT64", mode="NULLABLE"),
-        
-        bigquery.SchemaField("last_updated", "TIMESTAMP", mode="REQUIRED")
-    ]
-    
-    daily_table_id = f"{client.project}.{dataset_id}.agg_daily"
-    daily_table = bigquery.Table(daily_table_id, schema=daily_schema)
+        try:
+            client.delete_table(table_id, not_found_ok=True)
+            client.create_table(table)
+            print(f"✅ Tạo bảng {table_id}")
+        except Exception as e:
+            print(f"❌ Lỗi tạo bảng {table_name}: {e}")
+            return False
     
-    try:
-        client.delete_table(daily_table_id, not_found_ok=True)
-        daily_table = client.create_table(daily_table)
-        print(f"✅ Tạo bảng {daily_table_id}")
-        return True
-    except Exception as e:
-        print(f"❌ Lỗi tạo bảng daily: {e}")
-        return False
+    return True
 
 def populate_sample_data(client, dataset_id):
     """Tạo dữ liệu mẫu cho các bảng"""
@@ -270,17 +240,13 @@ def populate_sample_data(client, dataset_id):
             'updated_at': now
         })
     
-    # Insert vào dim_locations
+    # Insert vào dim_locations (load job - không dùng streaming insert từng dòng)
     locations_table_id = f"{client.project}.{dataset_id}.dim_locations"
-    errors = client.insert_rows_json(
-        locations_table_id, 
-        locations_rows
-    )
-    
-    if errors:
-        print(f"❌ Lỗi insert locations: {errors}")
-    else:
+    try:
+        load_frame(client, pd.DataFrame(locations_rows), locations_table_id)
         print(f"✅ Đã insert {len(locations_rows)} locations")
+    except Exception as e:
+        print(f"❌ Lỗi insert locations: {e}")
     
     # 2. Populate dim_time với dữ liệu 30 ngày gần nhất
     time_rows = []
@@ -315,15 +281,11 @@ def populate_sample_data(client, dataset_id):
     
     # Insert vào dim_time
     time_table_id = f"{client.project}.{dataset_id}.dim_time"
-    errors = client.insert_rows_json(
-        time_table_id, 
-        time_rows
-    )
-    
-    if errors:
-        print(f"❌ Lỗi insert time: {errors}")
-    else:
+    try:
+        load_frame(client, pd.DataFrame(time_rows), time_table_id)
         print(f"✅ Đã insert {len(time_rows)} time records")
+    except Exception as e:
+        print(f"❌ Lỗi insert time: {e}")
     
     # 3. Populate dim_weather_conditions
     weather_conditions = [
@@ -345,15 +307,11 @@ def populate_sample_data(client, dataset_id):
     
     # Insert vào dim_weather_conditions
     weather_table_id = f"{client.project}.{dataset_id}.dim_weather_conditions"
-    errors = client.insert_rows_json(
-        weather_table_id, 
-        weather_rows
-    )
-    
-    if errors:
-        print(f"❌ Lỗi insert weather: {errors}")
-    else:
+    try:
+        load_frame(client, pd.DataFrame(weather_rows), weather_table_id)
         print(f"✅ Đã insert {len(weather_rows)} weather conditions")
+    except Exception as e:
+        print(f"❌ Lỗi insert weather: {e}")
 
 def main():
     """Main function"""
@@ -372,7 +330,7 @@ def main():
     # Kiểm tra dataset có tồn tại không
     try:
         dataset_ref = client.dataset(dataset_id)
-        dataset = client.get_dataset(dataset_ref)
+        client.get_dataset(dataset_ref)
         print(f"✅ Dataset {dataset_id} đã tồn tại")
     except NotFound:
         print(f"❌ Dataset {dataset_id} không tồn tại. Vui lòng tạo dataset trước.")
@@ -402,7 +360,7 @@ def main():
     print("  - dim_locations (30 quận/huyện Hà Nội)")
     print("  - dim_time (30 ngày gần nhất)")
     print("  - dim_weather_conditions (4 điều kiện thời tiết)")
-    print("  - fact_air_quality (bảng chính)")
+    print("  - fact_air_quality (bảng chính, partition theo ngày của time, cluster theo location_id)")
     print("  - agg_hourly (tổng hợp theo giờ)")
     print("  - agg_daily (tổng hợp theo ngày)")
     
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Export mô hình LSTM (model.keras từ Time_seri_Analysic_model.ipynb) sang ONNX cho forecast engine
+Chỉ cần TensorFlow + tf2onnx lúc export; server chỉ cần onnxruntime
+
+Usage:
+    pip install tensorflow tf2onnx
+    python scripts/export_forecast_model.py --model model.keras --scaler scaler.pkl
+    python scripts/export_forecast_model.py --model model.keras --data-min 0 --data-max 300
+    python scripts/export_forecast_model.py --model model.keras --scaler scaler.pkl --publish --metrics metrics.json
+
+Output (trong --output-dir, mặc định MODEL_SAVE_PATH):
+    aqi_lstm.onnx     - model với batch dynamic: (None, sequence_length, 1) -> (None, 1)
+    aqi_scaler.json   - tham số MinMaxScaler + metadata (sequence_length, target)
+Với --publish: 2 file trên được đưa vào model registry thành version mới và ACTIVE
+(API đang chạy tự hot-swap), version cũ chỉ giữ lại PRODUCTION_CONFIG["backup_models"] bản
+"""
+
+import os
+import sys
+import json
+import pickle
+import argparse
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ml_config import PRODUCTION_CONFIG, ml_settings
+from app.ml.registry import get_model_registry
+
+def load_scaler_params(args) -> dict:
+    """Tham số MinMaxScaler từ file pickle (sklearn) hoặc từ tham số dòng lệnh"""
+    if args.scaler:
+        with open(args.scaler, "rb") as f:
+            scaler = pickle.load(f)
+        return {
+            "data_min": float(scaler.data_min_[0]),
+            "data_max": float(scaler.data_max_[0]),
+            "feature_range": [float(v) for v in scaler.feature_range],
+        }
+
+    if args.data_min is None or args.data_max is None:
+        raise ValueError("Cần --scaler hoặc cả --data-min và --data-max")
+    return {
+        "data_min": float(args.data_min),
+        "data_max": float(args.data_max),
+        "feature_range": [0.0, 1.0],
+    }
+
+def export_model(model_path: str, output_dir: str, opset: int) -> tuple:
+    """Convert Keras -> ONNX với batch dimension dynamic để chạy nhiều trạm trong 1 lần"""
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(model_path)
+    sequence_length, features = model.input_shape[1], model.input_shape[2]
+    spec = (tf.TensorSpec((None, sequence_length, features), tf.float32, name="window"),)
+
+    output_path = os.path.join(output_dir, ml_settings.ONNX_MODEL_NAME)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+    return output_path, sequence_length
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Export LSTM forecast model to ONNX")
+    parser.add_argument("--model", default="model.keras", help="Đường dẫn model.keras")
+    parser.add_argument("--scaler", help="MinMaxScaler đã fit (pickle)")
+    parser.add_argument("--data-min", type=float, help="data_min_ của scaler (nếu không có pickle)")
+    parser.add_argument("--data-max", type=float, help="data_max_ của scaler (nếu không có pickle)")
+    parser.add_argument("--target", default="AQI_TOTAL", help="Cột model dự báo")
+    parser.add_argument("--output-dir", default=ml_settings.MODEL_SAVE_PATH)
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--publish", action="store_true", help="Publish thành version mới trong model registry")
+    parser.add_argument("--metrics", help="File JSON metric đánh giá lưu kèm version (khi --publish)")
+    parser.add_argument("--no-activate", action="store_true", help="Publish nhưng không đổi version ACTIVE")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"🚀 Exporting {args.model} to ONNX...")
+    try:
+        scaler_params = load_scaler_params(args)
+        output_path, sequence_length = export_model(args.model, args.output_dir, args.opset)
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        sys.exit(1)
+
+    scaler_params.update({"sequence_length": int(sequence_length), "target": args.target})
+    scaler_path = os.path.join(args.output_dir, ml_settings.SCALER_PARAMS_NAME)
+    with open(scaler_path, "w") as f:
+        json.dump(scaler_params, f, indent=2)
+
+    print(f"✅ Model: {output_path}")
+    print(f"✅ Scaler: {scaler_path}")
+
+    if args.publish:
+        metrics = {}
+        if args.metrics:
+            with open(args.metrics) as f:
+                metrics = json.load(f)
+        registry = get_model_registry()
+        registry.publish(
+            {ml_settings.ONNX_MODEL_NAME: output_path, ml_settings.SCALER_PARAMS_NAME: scaler_path},
+            metrics=metrics,
+            metadata={"source_model": os.path.abspath(args.model), "target": args.target},
+            activate=not args.no_activate
+        )
+        registry.prune(PRODUCTION_CONFIG["backup_models"])
+    print("🎉 Done")
+
+if __name__ == "__main__":
+    main()
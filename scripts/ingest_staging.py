@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Ingest Staging_RawData -> Fact_Weather_AirQuality
+Đọc quan trắc thô N giờ gần nhất (Arrow, theo batch), gán location_key (trạm gần nhất) và time_key (Dim_Time),
+tính AQI_TOTAL từ nồng độ (app/core/aqi_calc, NowCast 12h) khi staging chưa có, ghi vào bảng fact bằng load job + MERGE theo (location_key, time_key) - chạy lại nhiều lần không tạo bản ghi trùng
+
+Usage:
+    python scripts/ingest_staging.py                  # 24 giờ gần nhất
+    python scripts/ingest_staging.py --hours 720      # Backfill 30 ngày
+    python scripts/ingest_staging.py --dry-run        # Chỉ đếm số dòng sẽ ghi
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+from google.cloud import bigquery
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.aqi_calc import NOWCAST_HOURS, POLLUTANTS, compute_aqi
+from app.core.config import settings
+from app.db.bigquery import get_bigquery_client, iter_arrow_batches, query_and_wait
+from app.db.dimensions import get_dimensions
+from app.db.ingestion import FactIngestBuffer, OBSERVATION_TIME
+from app.db.queries import hours_ago, table_id
+
+STAGING_TABLE_NAME = "Staging_RawData"
+# Cột đo của bảng fact - chỉ lấy các cột có trong Staging_RawData
+FACT_MEASURES = [
+    "pm2_5", "pm10", "temperature_2m", "relative_humidity_2m",
+    "wind_speed_10m", "wind_direction_10m", "pressure_msl", "AQI_TOTAL",
+]
+
+def build_staging_query(measures) -> str:
+    """Quan trắc thô từ @since, time_key lấy theo giờ của quan trắc"""
+    return f"""
+    SELECT
+        t.time_key,
+        t.time AS {OBSERVATION_TIME},
+        s.latitude,
+        s.longitude,
+        {", ".join(f"s.{column}" for column in measures)}
+    FROM
+        `{table_id(STAGING_TABLE_NAME)}` s
+    JOIN
+        `{table_id("Dim_Time")}` t
+    ON
+        t.time = TIMESTAMP_TRUNC(s.time, HOUR)
+    WHERE
+        s.time >= @since
+    """
+
+def assign_location_keys(frame: pd.DataFrame, location_index) -> pd.DataFrame:
+    """location_key của trạm gần nhất trong NEAREST_STATION_MAX_KM (tính 1 lần cho mỗi tọa độ), bỏ dòng không khớp"""
+    coords = frame[["latitude", "longitude"]].drop_duplicates()
+    keys = {}
+    for lat, lng in coords.itertuples(index=False):
+        station = location_index.nearest_one(lat, lng, max_distance_km=settings.NEAREST_STATION_MAX_KM)
+        keys[(lat, lng)] = station["location_key"] if station else np.nan
+
+    location_keys = pd.Series(
+        [keys[coord] for coord in zip(frame["latitude"], frame["longitude"])],
+        index=frame.index, dtype="float64"
+    )
+    matched = location_keys.notna()
+    return frame[matched].drop(columns=["latitude", "longitude"]).assign(
+        location_key=location_keys[matched].astype("int64")
+    )
+
+def with_aqi_total(observations: pd.DataFrame, since) -> pd.DataFrame:
+    """
+    AQI_TOTAL = AQI tổng theo settings.AQI_STANDARD, tính cho toàn bộ cửa sổ trong 1 lần vectorized
+    Các giờ trước since chỉ dùng làm lịch sử NowCast, không ghi vào bảng fact
+    """
+    observations = observations.drop_duplicates(["location_key", "time_key"], keep="last")
+    scored = compute_aqi(observations, standard=settings.AQI_STANDARD)
+    scored = scored[pd.to_datetime(scored[OBSERVATION_TIME], utc=True) >= since]
+    aqi_columns = [column for column in scored.columns if column.startswith("aqi_")]
+    inputs_only = [column for column in POLLUTANTS if column not in FACT_MEASURES and column in scored]
+    return scored.assign(AQI_TOTAL=scored["aqi_overall"]).drop(columns=aqi_columns + inputs_only)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Ingest Staging_RawData into the fact table")
+    parser.add_argument("--hours", type=int, default=24, help="Số giờ dữ liệu staging gần nhất")
+    parser.add_argument("--batch-rows", type=int, default=settings.INGEST_BATCH_ROWS, help="Số dòng mỗi load job + MERGE")
+    parser.add_argument("--dry-run", action="store_true", help="Không ghi vào bảng fact")
+    args = parser.parse_args()
+
+    client = get_bigquery_client()
+    try:
+        staging_columns = {field.name for field in client.get_table(table_id(STAGING_TABLE_NAME)).schema}
+        dimensions = asyncio.run(get_dimensions())
+    except Exception as e:
+        print(f"❌ Failed to load staging schema / dimensions: {e}")
+        sys.exit(1)
+
+    measures = [column for column in FACT_MEASURES if column in staging_columns]
+    # Staging chưa có AQI: đọc thêm nồng độ các chất và NOWCAST_HOURS - 1 giờ lịch sử để tính AQI
+    compute_total = "AQI_TOTAL" not in staging_columns
+    if compute_total:
+        measures += [column for column in POLLUTANTS if column in staging_columns and column not in measures]
+    since = hours_ago(args.hours)
+    read_since = hours_ago(args.hours + NOWCAST_HOURS - 1) if compute_total else since
+    print(f"🚀 Reading {STAGING_TABLE_NAME} ({args.hours}h): {', '.join(measures)}")
+    if compute_total:
+        print(f"💡 AQI_TOTAL computed locally ({settings.AQI_STANDARD})")
+
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("since", "TIMESTAMP", read_since)
+    ])
+    job = query_and_wait(client, build_staging_query(measures), name="ingest_staging_read", job_config=job_config)
+
+    buffer = FactIngestBuffer(batch_rows=args.batch_rows)
+    read_rows = skipped_rows = merged_rows = 0
+    pending = []
+
+    def write(observations: pd.DataFrame) -> None:
+        nonlocal merged_rows
+        merged_rows += len(observations)
+        if not args.dry_run and buffer.add(observations):
+            buffer.flush()
+
+    try:
+        for batch in iter_arrow_batches(job.result(page_size=args.batch_rows)):
+            frame = batch.to_pandas()
+            observations = assign_location_keys(frame, dimensions.location_index)
+            read_rows += len(frame)
+            skipped_rows += len(frame) - len(observations)
+            if compute_total:
+                # NowCast cần chuỗi giờ liên tục của từng trạm - gom đủ cửa sổ rồi mới tính
+                pending.append(observations)
+            else:
+                write(observations)
+
+        if compute_total and pending:
+            scored = with_aqi_total(pd.concat(pending, ignore_index=True), since)
+            for start in range(0, len(scored), args.batch_rows):
+                write(scored.iloc[start:start + args.batch_rows])
+        if not args.dry_run:
+            buffer.flush()
+    except Exception as e:
+        print(f"❌ Ingestion failed: {e}")
+        sys.exit(1)
+
+    print(f"✅ Read {read_rows} rows, {skipped_rows} without a station within {settings.NEAREST_STATION_MAX_KM} km")
+    if args.dry_run:
+        print(f"💡 Dry run - {merged_rows} rows would be merged")
+        return
+    print(f"🎉 Done: {buffer.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Quản lý model registry dưới MODEL_SAVE_PATH (version, ACTIVE, rollback, dọn version cũ)
+API đang chạy tự hot-swap sang version ACTIVE mới sau tối đa MODEL_RELOAD_SECONDS
+
+Usage:
+    python scripts/model_registry.py list
+    python scripts/model_registry.py activate 20250101T000000000000Z
+    python scripts/model_registry.py rollback
+    python scripts/model_registry.py prune --keep 3
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ml_config import PRODUCTION_CONFIG
+from app.ml.registry import METRICS_NAME, get_model_registry
+
+def list_versions(registry) -> None:
+    active = registry.active_version()
+    versions = registry.list_versions()
+    if not versions:
+        print(f"⚠️ No model versions in {registry.versions_dir}")
+        return
+    for version in versions:
+        metrics_path = os.path.join(registry.version_dir(version), METRICS_NAME)
+        metrics = {}
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+        marker = "*" if version == active else " "
+        print(f" {marker} {version}  {json.dumps(metrics)}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Manage versioned forecast models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Liệt kê version (* = ACTIVE)")
+    activate_parser = subparsers.add_parser("activate", help="Đổi version ACTIVE")
+    activate_parser.add_argument("version")
+    subparsers.add_parser("rollback", help="Quay về version trước version ACTIVE")
+    prune_parser = subparsers.add_parser("prune", help="Xóa version cũ")
+    prune_parser.add_argument("--keep", type=int, default=PRODUCTION_CONFIG["backup_models"], help="Số version backup giữ lại")
+    args = parser.parse_args()
+
+    registry = get_model_registry()
+    try:
+        if args.command == "list":
+            list_versions(registry)
+        elif args.command == "activate":
+            registry.activate(args.version)
+        elif args.command == "rollback":
+            previous = registry.rollback()
+            if previous is None:
+                print("⚠️ No previous version to roll back to")
+        elif args.command == "prune":
+            registry.prune(args.keep)
+    except Exception as e:
+        print(f"❌ {args.command} failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Migration: rebuild Fact_Weather_AirQuality thành bảng partition theo thời gian, cluster theo location_key
+- Thêm cột TIMESTAMP (mặc định `time`, lấy từ Dim_Time qua time_key) làm cột partition
+- Partition theo ngày (mặc định) hoặc theo giờ (tối đa 4000 partition ~ 5.5 tháng dữ liệu)
+- Tạo bảng mới, kiểm tra số dòng, rồi đổi tên: bảng cũ -> <bảng>_backup_<thời điểm>, bảng mới -> tên cũ
+Sau khi chạy: đặt FACT_PARTITION_COLUMN=<cột> để query lọc trực tiếp trên cột partition (BigQuery prune partition)
+
+Usage:
+    python scripts/partition_fact_table.py --dry-run            # In SQL và ước tính bytes quét
+    python scripts/partition_fact_table.py
+    python scripts/partition_fact_table.py --granularity HOUR --no-swap
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, timezone
+from google.cloud import bigquery
+from google.cloud.exceptions import NotFound
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.bigquery import get_bigquery_client, query_and_wait
+from app.db.queries import table_id
+
+FACT_TABLE_NAME = "Fact_Weather_AirQuality"
+PARTITION_EXPRESSIONS = {
+    "DAY": "DATE({column})",
+    "HOUR": "TIMESTAMP_TRUNC({column}, HOUR)",
+}
+
+def build_partitioned_table_sql(source: str, target: str, column: str, granularity: str) -> str:
+    """CREATE TABLE ... AS SELECT: fact + thời điểm từ Dim_Time, partition theo column, cluster theo location_key"""
+    return f"""
+    CREATE TABLE `{target}`
+    PARTITION BY {PARTITION_EXPRESSIONS[granularity].format(column=column)}
+    CLUSTER BY location_key
+    OPTIONS (description = "Fact_Weather_AirQuality partitioned by {column} ({granularity}), clustered by location_key")
+    AS
+    SELECT
+        f.*,
+        t.time AS {column}
+    FROM
+        `{source}` f
+    LEFT JOIN
+        `{table_id("Dim_Time")}` t
+    ON
+        f.time_key = t.time_key
+    """
+
+def count_rows(client: bigquery.Client, table: str) -> int:
+    job = query_and_wait(client, f"SELECT COUNT(*) AS n FROM `{table}`", name="partition_migration_count")
+    return int(next(iter(job.result())).n)
+
+def estimate_bytes(client: bigquery.Client, query: str) -> int:
+    """Bytes sẽ quét (dry run - không tốn chi phí)"""
+    job = client.query(query, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+    return job.total_bytes_processed or 0
+
+def last_day_queries(old_fact: str, new_fact: str, column: str) -> dict:
+    """Cùng 1 thống kê 24h (/aqi/stats) trên bảng cũ (JOIN Dim_Time) và bảng mới (lọc cột partition)"""
+    return {
+        "join Dim_Time": f"""
+            SELECT AVG(f.AQI_TOTAL) FROM `{old_fact}` f
+            JOIN `{table_id("Dim_Time")}` t ON f.time_key = t.time_key
+            WHERE t.time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
+        """,
+        "partition filter": f"""
+            SELECT AVG(f.AQI_TOTAL) FROM `{new_fact}` f
+            WHERE f.{column} >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
+        """,
+    }
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild fact table with time partitioning and clustering")
+    parser.add_argument("--column", default="time", help="Tên cột TIMESTAMP partition thêm vào bảng fact")
+    parser.add_argument("--granularity", choices=sorted(PARTITION_EXPRESSIONS), default="DAY")
+    parser.add_argument("--no-swap", action="store_true", help="Chỉ tạo <bảng>_partitioned, không đổi tên bảng")
+    parser.add_argument("--dry-run", action="store_true", help="In SQL và ước tính bytes, không tạo bảng")
+    args = parser.parse_args()
+
+    client = get_bigquery_client()
+    source = table_id(FACT_TABLE_NAME)
+    target = table_id(f"{FACT_TABLE_NAME}_partitioned")
+
+    try:
+        table = client.get_table(source)
+    except NotFound:
+        print(f"❌ Table {source} not found")
+        sys.exit(1)
+
+    if table.time_partitioning is not None or any(field.name == args.column for field in table.schema):
+        print(f"⚠️ {source} đã có cột {args.column} / partitioning - bỏ qua")
+        print(f"💡 Đặt FACT_PARTITION_COLUMN={args.column}")
+        return
+
+    sql = build_partitioned_table_sql(source, target, args.column, args.granularity)
+    print(f"🚀 {source}: {table.num_rows:,} rows, {table.num_bytes / 1024 ** 2:.1f} MB")
+    print(sql)
+
+    if args.dry_run:
+        print(f"💾 Migration sẽ quét {estimate_bytes(client, sql) / 1024 ** 2:.1f} MB")
+        return
+
+    try:
+        client.delete_table(target, not_found_ok=True)
+        query_and_wait(client, sql, name="partition_migration_create")
+        source_rows, target_rows = count_rows(client, source), count_rows(client, target)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+    if source_rows != target_rows:
+        print(f"❌ Row count mismatch: {source_rows} vs {target_rows} - giữ nguyên bảng cũ, kiểm tra {target}")
+        sys.exit(1)
+    print(f"✅ Created {target} ({target_rows:,} rows)")
+
+    for label, query in last_day_queries(source, target, args.column).items():
+        print(f"   /aqi/stats 24h ({label}): {estimate_bytes(client, query) / 1024 ** 2:.2f} MB scanned")
+
+    if args.no_swap:
+        print(f"💡 Bảng cũ giữ nguyên - đổi tên thủ công rồi đặt FACT_PARTITION_COLUMN={args.column}")
+        return
+
+    backup_name = f"{FACT_TABLE_NAME}_backup_{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+    backup = table_id(backup_name)
+    try:
+        query_and_wait(client, f"ALTER TABLE `{source}` RENAME TO `{backup_name}`", name="partition_migration_swap")
+    except Exception as e:
+        print(f"❌ Swap failed, {source} unchanged: {e}")
+        sys.exit(1)
+
+    try:
+        query_and_wait(client, f"ALTER TABLE `{target}` RENAME TO `{FACT_TABLE_NAME}`", name="partition_migration_swap")
+    except Exception as e:
+        print(f"❌ Swap failed after renaming {source} -> {backup_name}: {e}")
+        # Bảng gốc đã bị đổi tên - đổi lại ngay để API/ingest không mất bảng fact
+        try:
+            query_and_wait(client, f"ALTER TABLE `{backup}` RENAME TO `{FACT_TABLE_NAME}`", name="partition_migration_rollback")
+            print(f"✅ Rolled back: {source} restored, partitioned copy kept at {target}")
+        except Exception as rollback_error:
+            print(f"❌ Rollback failed: {rollback_error}")
+            print("💡 Khôi phục thủ công bằng 1 trong 2 lệnh:")
+            print(f"   ALTER TABLE `{backup}` RENAME TO `{FACT_TABLE_NAME}`;  -- trả lại bảng cũ")
+            print(f"   ALTER TABLE `{target}` RENAME TO `{FACT_TABLE_NAME}`;  -- hoàn tất chuyển sang bảng partition")
+        sys.exit(1)
+
+    print(f"✅ {FACT_TABLE_NAME} is now partitioned by {args.column} ({args.granularity}), old table: {backup_name}")
+    print(f"💡 Đặt FACT_PARTITION_COLUMN={args.column} và cập nhật job ingest để ghi cột {args.column}")
+    print("🎉 Done")
+
+if __name__ == "__main__":
+    main()
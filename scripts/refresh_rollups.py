@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Refresh bảng rollup agg_hourly / agg_daily từ Fact_Weather_AirQuality
+Chạy định kỳ (cron / Railway scheduled job) sau mỗi lần ingest dữ liệu theo giờ
+
+Usage:
+    python scripts/refresh_rollups.py              # Tính lại ROLLUP_LOOKBACK_DAYS ngày gần nhất
+    python scripts/refresh_rollups.py --days 7     # Tính lại 7 ngày gần nhất
+    python scripts/refresh_rollups.py --backfill   # Tính lại toàn bộ lịch sử
+"""
+
+import os
+import sys
+import argparse
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.rollups import refresh_rollups
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Refresh AQI rollup tables")
+    parser.add_argument("--days", type=int, default=None, help="Số ngày gần nhất cần tính lại")
+    parser.add_argument("--backfill", action="store_true", help="Tính lại toàn bộ lịch sử")
+    args = parser.parse_args()
+    
+    lookback_days = 0 if args.backfill else args.days
+    
+    print("🚀 Refreshing rollup tables...")
+    try:
+        result = refresh_rollups(lookback_days)
+    except Exception as e:
+        print(f"❌ Rollup refresh failed: {e}")
+        sys.exit(1)
+    
+    print(f"🎉 Done: {result}")
+
+if __name__ == "__main__":
+    main()
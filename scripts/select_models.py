@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Model selection - tìm order ARIMA / tham số LSTM tốt nhất cho từng trạm
+Lưới candidate × trạm chạy song song trên process pool, prune candidate kém sau mỗi rung,
+kết quả ghi dần ra JSONL (chạy lại cùng --results để resume), winner ghi vào model registry
+
+Usage:
+    python scripts/select_models.py --days 180
+    python scripts/select_models.py --family arima --p 0 1 2 3 4 5 --d 0 1 --q 0 1 2 3
+    python scripts/select_models.py --family lstm --units 32 64 128 --layers 1 2 --dropout 0.1 0.2 --workers 4
+    python scripts/select_models.py --csv data.csv --dry-run
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import pandas as pd
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ml_config import EVALUATION_CONFIG, ml_settings
+from app.ml.backtest import load_station_series, station_series
+from app.ml.model_selection import DEFAULT_ETA, DEFAULT_RUNGS, arima_candidates, lstm_candidates, run_selection
+from app.ml.registry import get_model_registry
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Per-station model selection with successive halving")
+    parser.add_argument("--family", choices=["arima", "lstm"], default="arima")
+    parser.add_argument("--days", type=int, default=90, help="Số ngày dữ liệu lấy từ BigQuery")
+    parser.add_argument("--csv", help="Đọc dữ liệu từ CSV (location_key, time, AQI_TOTAL) thay vì BigQuery")
+    parser.add_argument("--target", default="AQI_TOTAL")
+    parser.add_argument("--p", type=int, nargs="+", default=[0, 1, 2, 3])
+    parser.add_argument("--d", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--q", type=int, nargs="+", default=[0, 1, 2, 3])
+    parser.add_argument("--units", type=int, nargs="+", default=[32, 64, ml_settings.LSTM_UNITS])
+    parser.add_argument("--layers", type=int, nargs="+", default=[1, ml_settings.LSTM_HIDDEN_LAYERS])
+    parser.add_argument("--dropout", type=float, nargs="+", default=[0.1, ml_settings.LSTM_DROPOUT])
+    parser.add_argument("--rungs", type=float, nargs="+", default=list(DEFAULT_RUNGS),
+                        help="Budget mỗi rung (ARIMA: tỉ lệ giai đoạn test, LSTM: tỉ lệ TRAINING_EPOCHS)")
+    parser.add_argument("--eta", type=int, default=DEFAULT_ETA, help="Giữ 1/eta candidate mỗi trạm sau mỗi rung")
+    parser.add_argument("--metric", choices=["mae", "mape", "rmse", "r2"], default="mae")
+    parser.add_argument("--test-fraction", type=float, default=EVALUATION_CONFIG["test_size"])
+    parser.add_argument("--workers", type=int, default=None, help="Số process (mặc định số CPU)")
+    parser.add_argument("--results", default=None, help="File JSONL kết quả (mặc định MODEL_SAVE_PATH/model_selection_<family>.jsonl)")
+    parser.add_argument("--dry-run", action="store_true", help="Không ghi winner vào model registry")
+    args = parser.parse_args()
+
+    if args.rungs[-1] != 1.0:
+        args.rungs.append(1.0)
+    results_path = args.results or os.path.join(ml_settings.MODEL_SAVE_PATH, f"model_selection_{args.family}.jsonl")
+
+    if args.family == "arima":
+        candidates = arima_candidates(args.p, args.d, args.q)
+    else:
+        candidates = lstm_candidates(args.units, args.layers, args.dropout)
+
+    print("🚀 Loading station series...")
+    try:
+        if args.csv:
+            series = station_series(pd.read_csv(args.csv, parse_dates=["time"]), args.target)
+        else:
+            series = asyncio.run(load_station_series(args.days, args.target))
+    except Exception as e:
+        print(f"❌ Failed to load data: {e}")
+        sys.exit(1)
+
+    if not series:
+        print("❌ No data")
+        sys.exit(1)
+    print(f"✅ {len(series)} stations × {len(candidates)} candidates, results: {results_path}")
+
+    started = time.perf_counter()
+    winners = run_selection(
+        series, candidates, results_path,
+        test_fraction=args.test_fraction, rungs=args.rungs, eta=args.eta,
+        metric=args.metric, workers=args.workers
+    )
+    print(f"✅ Search finished in {time.perf_counter() - started:.1f}s")
+
+    for location_key, record in sorted(winners.items()):
+        print(f"   {location_key}: {record['candidate']} {args.metric}={record[args.metric]:.3f}")
+
+    if args.dry_run or not winners:
+        return
+
+    configs = {
+        location_key: {
+            **record["candidate"],
+            "metric": args.metric,
+            "metrics": {k: record.get(k) for k in ("mae", "mape", "rmse", "r2", "n")},
+            "target": args.target,
+        }
+        for location_key, record in winners.items()
+    }
+    registry = get_model_registry()
+    registry.save_station_configs(configs)
+    print(f"💾 Saved {len(configs)} station configs to {registry.station_configs_path}")
+    print("🎉 Done")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test Script cho AQI Engine (app/core/aqi_calc.py)
+Kiểm tra mốc breakpoint EPA / VN_AQI, khe O3 của EPA, giới hạn AQI_MAX và quy tắc NowCast
+Không cần BigQuery hay server đang chạy
+"""
+
+import sys
+import os
+import math
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.aqi_calc import AQI_MAX, nowcast, sub_index
+
+def values(concentrations, pollutant, standard):
+    return [float(v) for v in sub_index(concentrations, pollutant, standard)]
+
+def test_epa_breakpoints():
+    """Mốc PM2.5 (bản 2024) và PM10 của EPA"""
+    assert values([0.0, 9.0, 9.1, 35.4, 35.5, 55.4, 12.0], "pm2_5", "EPA") == [0, 50, 51, 100, 101, 150, 56]
+    # 35.45 cắt (không làm tròn) về 35.4 trước khi tra bảng
+    assert values([35.45], "pm2_5", "EPA") == [100]
+    assert values([54, 55, 154], "pm10", "EPA") == [50, 51, 100]
+
+def test_vn_aqi_breakpoints():
+    """Mốc liên tục của VN_AQI (QĐ 1459/QĐ-TCMT)"""
+    assert values([0, 25, 37.5, 50, 80], "pm2_5", "VN_AQI") == [0, 50, 75, 100, 150]
+    assert values([50, 150, 600], "pm10", "VN_AQI") == [50, 100, 500]
+
+def test_epa_o3_gap():
+    """O3 giữa bảng 8h (tới 200 ppb) và mốc 405 ppb của bảng 1h giữ AQI 300"""
+    # 600 µg/m³ ≈ 305 ppb
+    assert values([600], "o3", "EPA") == [300]
+
+def test_cap_and_missing():
+    """Vượt mốc cao nhất -> AQI_MAX, NaN / âm -> NaN"""
+    assert values([400.0], "pm2_5", "EPA") == [AQI_MAX]
+    assert values([600.0], "pm2_5", "VN_AQI") == [AQI_MAX]
+    assert all(math.isnan(v) for v in values([float("nan"), -1.0], "pm2_5", "EPA"))
+
+def test_nowcast_two_of_three_hours():
+    """NowCast cần ít nhất 2 trong 3 giờ gần nhất có dữ liệu"""
+    nan = float("nan")
+    result = nowcast([nan, nan, 10.0])
+    assert math.isnan(result[-1])
+
+    result = nowcast([10.0, nan, 10.0])
+    assert result[-1] == 10.0
+
+    # Chuỗi hằng số -> NowCast bằng chính giá trị đó
+    result = nowcast([20.0] * 12)
+    assert all(abs(v - 20.0) < 1e-9 for v in result[1:])
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing AQI Engine")
+    print("=" * 50)
+    tests = [
+        test_epa_breakpoints,
+        test_vn_aqi_breakpoints,
+        test_epa_o3_gap,
+        test_cap_and_missing,
+        test_nowcast_two_of_three_hours,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All AQI engine tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test Script cho Drift Monitor (app/ml/drift.py)
+So sánh RollingAccumulator (Welford có trọng số, O(1) bộ nhớ) với numpy tính trên cả chuỗi quan sát
+Không cần BigQuery hay server đang chạy
+"""
+
+import sys
+import os
+import math
+
+import numpy as np
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml.drift import RollingAccumulator
+
+def reference_metrics(actual, predicted, half_life):
+    """Cùng các chỉ số tính trực tiếp bằng numpy với trọng số decay^(tuổi quan sát)"""
+    decay = 0.5 ** (1.0 / half_life) if half_life > 0 else 1.0
+    weights = decay ** np.arange(len(actual) - 1, -1, -1)
+    error = actual - predicted
+    nonzero = actual != 0
+
+    mean = np.average(actual, weights=weights)
+    sst = np.sum(weights * (actual - mean) ** 2)
+    return {
+        "mae": np.average(np.abs(error), weights=weights),
+        "rmse": math.sqrt(np.average(error ** 2, weights=weights)),
+        "mape": np.average(np.abs(error[nonzero] / actual[nonzero]), weights=weights[nonzero]) * 100,
+        "r2": 1.0 - np.sum(weights * error ** 2) / sst,
+        "samples": len(actual),
+    }
+
+def sample_series(count=500, seed=5):
+    rng = np.random.default_rng(seed)
+    actual = rng.gamma(4.0, 15.0, size=count)
+    actual[::37] = 0.0
+    predicted = actual + rng.normal(0, 8, size=count)
+    return actual, predicted
+
+def accumulate(actual, predicted, half_life):
+    accumulator = RollingAccumulator(half_life)
+    for a, p in zip(actual, predicted):
+        accumulator.update(float(a), float(p))
+    return accumulator.metrics()
+
+def assert_close(metrics, expected):
+    assert metrics["samples"] == expected["samples"]
+    for name in ("mae", "rmse", "mape", "r2"):
+        assert math.isclose(metrics[name], expected[name], rel_tol=1e-9, abs_tol=1e-9), (name, metrics[name], expected[name])
+
+def test_matches_numpy_without_decay():
+    """half_life=0: không giảm trọng số - MAE/RMSE/MAPE/R² thông thường trên cả chuỗi"""
+    actual, predicted = sample_series()
+    assert_close(accumulate(actual, predicted, 0), reference_metrics(actual, predicted, 0))
+
+def test_matches_numpy_with_decay():
+    """Trọng số giảm dần theo half-life giống trung bình có trọng số của numpy"""
+    actual, predicted = sample_series()
+    for half_life in (24, 168):
+        assert_close(accumulate(actual, predicted, half_life), reference_metrics(actual, predicted, half_life))
+
+def test_recent_errors_dominate():
+    """Sai số lớn gần đây làm MAE rolling tăng nhanh hơn MAE toàn chuỗi"""
+    actual, predicted = sample_series()
+    predicted = predicted.copy()
+    predicted[-48:] += 40
+    rolling = accumulate(actual, predicted, 24)["mae"]
+    overall = accumulate(actual, predicted, 0)["mae"]
+    assert rolling > overall * 2
+
+def test_empty():
+    """Chưa có quan sát -> NaN, samples = 0"""
+    metrics = RollingAccumulator(24).metrics()
+    assert metrics["samples"] == 0
+    assert all(math.isnan(metrics[name]) for name in ("mae", "rmse", "mape", "r2"))
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing Drift Accumulator")
+    print("=" * 50)
+    tests = [
+        test_matches_numpy_without_decay,
+        test_matches_numpy_with_decay,
+        test_recent_errors_dominate,
+        test_empty,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All drift accumulator tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test Script cho HTTP Conditional Responses (app/core/http_cache.py)
+Endpoint mẫu dùng đúng pattern của các endpoint đọc dữ liệu: If-None-Match khớp -> 304, không chạy query
+Không cần BigQuery hay server đang chạy (FastAPI TestClient)
+"""
+
+import sys
+import os
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.http_cache import cached_json, is_not_modified, make_etag, not_modified
+
+LAST_MODIFIED = datetime(2025, 3, 1, 8, 30, 15, 123456, tzinfo=timezone.utc)
+
+def build_client():
+    """App mẫu: đếm số lần 'query' để biết 304 có bỏ qua được phần tính body không"""
+    app = FastAPI()
+    state = {"version": 1, "queries": 0}
+
+    @app.get("/items")
+    async def items(request: Request, limit: int = 10):
+        etag = make_etag("items", limit, state["version"])
+        if is_not_modified(request, etag, LAST_MODIFIED):
+            return not_modified(etag, LAST_MODIFIED)
+        state["queries"] += 1
+        return cached_json({"version": state["version"], "limit": limit}, etag, LAST_MODIFIED)
+
+    @app.get("/sample")
+    async def sample():
+        return cached_json({"sample": True}, None)
+
+    return TestClient(app), state
+
+def test_make_etag():
+    """Weak ETag ổn định theo tham số, đổi khi version hoặc tham số đổi"""
+    etag = make_etag("items", 10, 1)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag("items", 10, 1)
+    assert etag != make_etag("items", 10, 2)
+    assert etag != make_etag("items", 20, 1)
+
+def test_if_none_match_returns_304():
+    """Lần 2 gửi If-None-Match -> 304 body rỗng, không query lại"""
+    client, state = build_client()
+    first = client.get("/items")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+    assert first.headers["last-modified"] == "Sat, 01 Mar 2025 08:30:15 GMT"
+
+    second = client.get("/items", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert state["queries"] == 1
+
+    # So sánh weak: client/proxy bỏ tiền tố W/ hoặc gửi nhiều tag vẫn khớp
+    for header in (etag[2:], f'"other", {etag}', "*"):
+        assert client.get("/items", headers={"If-None-Match": header}).status_code == 304, header
+    assert state["queries"] == 1
+
+def test_changed_data_or_params_return_200():
+    """Version dữ liệu hoặc tham số khác -> 200 với ETag mới"""
+    client, state = build_client()
+    etag = client.get("/items").headers["etag"]
+
+    other = client.get("/items", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+    state["version"] = 2
+    changed = client.get("/items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == {"version": 2, "limit": 10}
+    assert state["queries"] == 3
+
+def test_if_modified_since():
+    """Không có If-None-Match: If-Modified-Since không cũ hơn Last-Modified -> 304"""
+    client, _ = build_client()
+    assert client.get("/items", headers={"If-Modified-Since": "Sat, 01 Mar 2025 08:30:15 GMT"}).status_code == 304
+    assert client.get("/items", headers={"If-Modified-Since": "Sat, 01 Mar 2025 08:00:00 GMT"}).status_code == 200
+    assert client.get("/items", headers={"If-Modified-Since": "not a date"}).status_code == 200
+    # If-None-Match được ưu tiên hơn If-Modified-Since
+    headers = {"If-None-Match": '"stale"', "If-Modified-Since": "Sat, 01 Mar 2025 08:30:15 GMT"}
+    assert client.get("/items", headers=headers).status_code == 200
+
+def test_sample_data_has_no_validators():
+    """Dữ liệu mẫu (etag None) không có ETag / Cache-Control"""
+    client, _ = build_client()
+    response = client.get("/sample")
+    assert response.status_code == 200
+    assert "etag" not in response.headers and "cache-control" not in response.headers
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing HTTP Conditional Responses")
+    print("=" * 50)
+    tests = [
+        test_make_etag,
+        test_if_none_match_returns_304,
+        test_changed_data_or_params_return_200,
+        test_if_modified_since,
+        test_sample_data_has_no_validators,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All HTTP cache tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
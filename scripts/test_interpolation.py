@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test Script cho IDW Interpolation (app/core/interpolation.py)
+So sánh idw_grid (broadcasting theo khối hàng) với công thức IDW tính từng ô
+Không cần BigQuery hay server đang chạy
+"""
+
+import sys
+import os
+import math
+
+import numpy as np
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import interpolation
+from app.core.interpolation import GridBounds, NO_DATA_UINT8, grid_axes, idw_grid, quantize_uint8
+
+BOUNDS = GridBounds(20.9, 105.7, 21.15, 106.0)
+
+def sample_stations(count=12, seed=9):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(BOUNDS.lat_min, BOUNDS.lat_max, count)
+    lngs = rng.uniform(BOUNDS.lng_min, BOUNDS.lng_max, count)
+    values = rng.uniform(20, 220, count)
+    return lats, lngs, values
+
+def reference_idw(lats, lngs, station_lats, station_lngs, values, power, max_distance_km=None):
+    """Từng ô: w = 1 / d^power trên toạ độ phẳng (km) quanh vĩ độ trung bình của lưới"""
+    km_per_deg_lng = interpolation.KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(float(np.mean(lats))))
+    result = np.full((len(lats), len(lngs)), np.nan)
+    for row, lat in enumerate(lats):
+        for col, lng in enumerate(lngs):
+            dx = (lng - station_lngs) * km_per_deg_lng
+            dy = (lat - station_lats) * interpolation.KM_PER_DEG_LAT
+            distances = np.sqrt(dx ** 2 + dy ** 2)
+            if max_distance_km is not None and distances.min() > max_distance_km:
+                continue
+            weights = 1.0 / np.maximum(distances, 1e-6) ** power
+            result[row, col] = np.sum(weights * values) / np.sum(weights)
+    return result
+
+def test_matches_reference():
+    """Kết quả giống công thức IDW từng ô với nhiều power, kể cả khi chia nhiều khối hàng"""
+    station_lats, station_lngs, values = sample_stations()
+    lats, lngs = grid_axes(BOUNDS, 30, 20)
+    previous = interpolation._MAX_BLOCK_ELEMENTS
+    for block_elements in (previous, 30 * 12 * 3):
+        interpolation._MAX_BLOCK_ELEMENTS = block_elements
+        try:
+            for power in (1.0, 2.0, 3.0):
+                grid = idw_grid(station_lats, station_lngs, values, lats, lngs, power=power)
+                expected = reference_idw(lats, lngs, station_lats, station_lngs, values, power)
+                assert grid.shape == (20, 30) and grid.dtype == np.float32
+                assert np.allclose(grid, expected, rtol=1e-5), (block_elements, power)
+        finally:
+            interpolation._MAX_BLOCK_ELEMENTS = previous
+
+def test_station_cell_and_bounds():
+    """Ô trùng vị trí trạm lấy đúng giá trị trạm; giá trị nằm trong [min, max] của các trạm"""
+    station_lats, station_lngs, values = sample_stations()
+    grid = idw_grid(station_lats, station_lngs, values, station_lats[:1], station_lngs[:1])
+    assert math.isclose(float(grid[0, 0]), values[0], rel_tol=1e-5)
+
+    lats, lngs = grid_axes(BOUNDS, 16, 16)
+    grid = idw_grid(station_lats, station_lngs, values, lats, lngs)
+    assert grid.min() >= values.min() - 1e-3 and grid.max() <= values.max() + 1e-3
+
+def test_missing_values_and_max_distance():
+    """Trạm NaN bị bỏ qua; ô xa mọi trạm hơn max_distance_km là NaN"""
+    station_lats, station_lngs, values = sample_stations()
+    lats, lngs = grid_axes(BOUNDS, 10, 10)
+    with_nan = np.append(values, np.nan)
+    grid = idw_grid(np.append(station_lats, 21.0), np.append(station_lngs, 105.8), with_nan, lats, lngs)
+    assert np.allclose(grid, idw_grid(station_lats, station_lngs, values, lats, lngs))
+
+    grid = idw_grid(station_lats, station_lngs, values, lats, lngs, max_distance_km=2.0)
+    expected = reference_idw(lats, lngs, station_lats, station_lngs, values, 2.0, max_distance_km=2.0)
+    assert np.array_equal(np.isnan(grid), np.isnan(expected))
+    assert np.isnan(idw_grid([], [], [], lats, lngs)).all()
+
+def test_grid_helpers():
+    """Hàng đầu là phía bắc; quantize_uint8 giữ 255 cho ô không có dữ liệu"""
+    lats, lngs = grid_axes(BOUNDS, 4, 2)
+    assert lats[0] > lats[1] and lngs[0] < lngs[-1]
+    assert GridBounds.parse(str(BOUNDS)) == BOUNDS
+    levels = quantize_uint8(np.array([0.0, 250.0, 500.0, 1000.0, np.nan]), 500.0)
+    assert levels.tolist() == [0, 127, 254, 254, NO_DATA_UINT8]
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing IDW Interpolation")
+    print("=" * 50)
+    tests = [
+        test_matches_reference,
+        test_station_cell_and_bounds,
+        test_missing_values_and_max_distance,
+        test_grid_helpers,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All interpolation tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
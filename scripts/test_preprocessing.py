@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test Script cho Preprocessing (app/ml/preprocessing.py)
+So sánh cửa sổ trượt (sliding_window_view) với vòng for i in range(...) kiểu notebook
+Không cần BigQuery hay server đang chạy
+"""
+
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml.preprocessing import (
+    complete_windows, forward_fill, make_supervised, sliding_windows, to_station_tensor
+)
+
+def sample_values(stations=3, hours=40, features=2, seed=3):
+    """Tensor (stations, hours, features) có vài giờ thiếu dữ liệu"""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(50, 10, size=(stations, hours, features))
+    values[0, 5, 0] = np.nan
+    values[1, 20:23, 1] = np.nan
+    values[2, -1, 0] = np.nan
+    return values
+
+def loop_supervised(values, sequence_length, target_index, horizon, step):
+    """Reference: duyệt từng trạm, từng vị trí bắt đầu"""
+    X, y, valid = [], [], []
+    for station in values:
+        xs, ys, vs = [], [], []
+        for start in range(0, len(station) - horizon - sequence_length + 1, step):
+            window = station[start:start + sequence_length]
+            target = station[start + sequence_length + horizon - 1, target_index]
+            xs.append(window)
+            ys.append(target)
+            vs.append(not np.isnan(window).any() and not np.isnan(target))
+        X.append(xs)
+        y.append(ys)
+        valid.append(vs)
+    return np.array(X), np.array(y), np.array(valid)
+
+def test_sliding_windows_match_loop():
+    """sliding_windows / complete_windows giống cắt lát từng cửa sổ, với mọi step"""
+    values = sample_values()
+    for window in (1, 6, 24):
+        for step in (1, 3):
+            windows = sliding_windows(values, window, step)
+            expected = np.array([
+                [station[start:start + window] for start in range(0, values.shape[1] - window + 1, step)]
+                for station in values
+            ])
+            assert windows.shape == expected.shape, (window, step)
+            assert np.array_equal(windows, expected, equal_nan=True), (window, step)
+
+            mask = complete_windows(values, window, step)
+            assert np.array_equal(mask, ~np.isnan(expected).any(axis=(-1, -2))), (window, step)
+
+def test_windows_are_views():
+    """Cửa sổ là view read-only, không copy dữ liệu"""
+    values = sample_values()
+    windows = sliding_windows(values, 24)
+    assert np.shares_memory(windows, values)
+    assert not windows.flags.writeable
+
+def test_make_supervised_matches_loop():
+    """(X, y, valid) giống vòng for của notebook"""
+    values = sample_values()
+    for horizon, step in ((1, 1), (3, 2)):
+        result = make_supervised(values, sequence_length=12, target_index=1, horizon=horizon, step=step)
+        X, y, valid = loop_supervised(values, 12, 1, horizon, step)
+        assert np.array_equal(result["X"], X, equal_nan=True), (horizon, step)
+        assert np.array_equal(result["y"], y, equal_nan=True), (horizon, step)
+        assert np.array_equal(result["valid"], valid), (horizon, step)
+
+    too_short = make_supervised(values[:, :5], sequence_length=12)
+    assert too_short["X"].shape == (3, 0, 12, 2)
+
+def test_forward_fill():
+    """NaN lấy giá trị gần nhất trước đó, NaN ở đầu chuỗi giữ nguyên"""
+    values = np.array([[[np.nan], [1.0], [np.nan], [np.nan], [4.0], [np.nan]]])
+    filled = forward_fill(values)
+    assert np.array_equal(filled[0, :, 0], [np.nan, 1.0, 1.0, 1.0, 4.0, 4.0], equal_nan=True)
+
+def test_to_station_tensor():
+    """Long-format -> lưới giờ chung, giờ thiếu là NaN"""
+    df = pd.DataFrame({
+        "location_key": [2, 1, 1, 2],
+        "time": pd.to_datetime(["2025-01-01 00:10", "2025-01-01 00:00", "2025-01-01 02:00", "2025-01-01 01:00"]),
+        "aqi": [20.0, 10.0, 12.0, 21.0],
+    })
+    tensor = to_station_tensor(df, ["aqi"])
+    assert tensor["location_keys"] == [1, 2]
+    assert np.array_equal(tensor["values"][..., 0], [[10.0, np.nan, 12.0], [20.0, 21.0, np.nan]], equal_nan=True)
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing Preprocessing")
+    print("=" * 50)
+    tests = [
+        test_sliding_windows_match_loop,
+        test_windows_are_views,
+        test_make_supervised_matches_loop,
+        test_forward_fill,
+        test_to_station_tensor,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All preprocessing tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
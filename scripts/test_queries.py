@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test Script cho Query Templates (app/db/queries.py)
+Kiểm tra chuẩn hoá giá trị parameter, bind template và khớp @param giữa SQL và khai báo
+Không cần BigQuery hay server đang chạy (chỉ build QueryJobConfig, không submit)
+"""
+
+import sys
+import os
+import re
+import importlib
+from datetime import date, datetime, timedelta, timezone
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import queries
+# Template agg_daily được đăng ký khi import rollups
+importlib.import_module("app.db.rollups")
+
+def parameter_values(bound):
+    return {p.name: (p.type_, p.value) for p in bound.job_config.query_parameters}
+
+def test_normalize_date():
+    """'YYYY-MM-DD' / date / datetime -> date, sai định dạng -> ValueError"""
+    assert queries.normalize_date("2025-03-01") == date(2025, 3, 1)
+    assert queries.normalize_date(" 2025-03-01T10:20:00 ") == date(2025, 3, 1)
+    assert queries.normalize_date(datetime(2025, 3, 1, 23, 59)) == date(2025, 3, 1)
+    assert queries.normalize_date(date(2025, 3, 1)) == date(2025, 3, 1)
+    for invalid in ("01/03/2025", "2025-13-01", ""):
+        try:
+            queries.normalize_date(invalid)
+        except ValueError:
+            continue
+        raise AssertionError(f"{invalid!r} không raise ValueError")
+
+def test_normalize_timestamp():
+    """Làm tròn xuống đầu giờ theo UTC, datetime naive coi là UTC"""
+    ict = timezone(timedelta(hours=7))
+    assert queries.normalize_timestamp(datetime(2025, 3, 1, 8, 45, 12, 999)) == datetime(2025, 3, 1, 8, tzinfo=timezone.utc)
+    assert queries.normalize_timestamp(datetime(2025, 3, 1, 8, 45, tzinfo=ict)) == datetime(2025, 3, 1, 1, tzinfo=timezone.utc)
+    assert queries.hours_ago(0).minute == 0
+
+def test_same_request_same_job():
+    """Cùng request logic -> cùng SQL và cùng parameter (BigQuery result cache dùng được)"""
+    template = queries.QueryTemplate("test_window", "SELECT @key, @since", {"key": "INT64", "since": "TIMESTAMP"})
+    first = template.bind(key="42", since=datetime(2025, 3, 1, 8, 1, tzinfo=timezone.utc))
+    second = template.bind(key=42, since=datetime(2025, 3, 1, 8, 59, tzinfo=timezone.utc))
+    assert first.sql == second.sql
+    assert parameter_values(first) == parameter_values(second)
+    assert parameter_values(first)["key"] == ("INT64", 42)
+    assert first.job_config.use_query_cache
+
+def test_bind_validation():
+    """Thiếu / thừa parameter hoặc kiểu không hỗ trợ -> ValueError, tên trùng không đăng ký lại được"""
+    template = queries.QueryTemplate("test_bind", "SELECT @day", {"day": "DATE"})
+    for values in ({}, {"day": "2025-03-01", "extra": 1}):
+        try:
+            template.bind(**values)
+        except ValueError:
+            continue
+        raise AssertionError(f"bind({values}) không raise ValueError")
+
+    try:
+        queries.QueryTemplate("test_type", "SELECT @x", {"x": "GEOGRAPHY"})
+        raise AssertionError("Kiểu GEOGRAPHY không raise ValueError")
+    except ValueError:
+        pass
+
+    name = next(iter(queries._templates))
+    try:
+        queries.register_template(name, "SELECT 1")
+        raise AssertionError("Đăng ký trùng tên không raise ValueError")
+    except ValueError:
+        pass
+
+def test_registered_templates_declare_their_params():
+    """Mọi @param trong SQL của template đã đăng ký đều được khai báo và ngược lại"""
+    assert queries._templates
+    for name, template in queries._templates.items():
+        used = set(re.findall(r"@(\w+)", template.sql))
+        assert used == set(template.params), f"{name}: SQL dùng {sorted(used)}, khai báo {sorted(template.params)}"
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing Query Templates")
+    print("=" * 50)
+    tests = [
+        test_normalize_date,
+        test_normalize_timestamp,
+        test_same_request_same_job,
+        test_bind_validation,
+        test_registered_templates_declare_their_params,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All query template tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test Script cho Columnar Serializer (app/core/serialization.py)
+So sánh serialize_frame với cách cũ (iterrows + float()/int()/isoformat() từng giá trị)
+Không cần BigQuery hay server đang chạy
+"""
+
+import sys
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.serialization import serialize_frame
+
+FIELDS = {
+    "aqi": ("aqi", "int", 0),
+    "pm2_5": ("pm2_5", "float", 0.0),
+    "name": ("location_name", "str", "Unknown"),
+    "time": ("time", "timestamp", None),
+    "date": ("date", "date", None),
+}
+
+def sample_frame():
+    return pd.DataFrame({
+        "aqi": [42.7, np.nan, 151.0],
+        "pm2_5": [12.5, None, 80.25],
+        "location_name": ["Hoàn Kiếm", None, "Cầu Giấy"],
+        "time": pd.to_datetime(["2025-01-01 07:00:00", "2025-01-01 08:30:15", None]),
+        "date": pd.to_datetime(["2025-01-01", "2025-01-02", None]),
+    })
+
+def reference(df):
+    """Cách cũ: duyệt từng hàng"""
+    records = []
+    for _, row in df.iterrows():
+        records.append({
+            "aqi": int(row["aqi"]) if pd.notna(row["aqi"]) else 0,
+            "pm2_5": float(row["pm2_5"]) if pd.notna(row["pm2_5"]) else 0.0,
+            "name": str(row["location_name"]) if pd.notna(row["location_name"]) else "Unknown",
+            "time": row["time"].isoformat() if pd.notna(row["time"]) else None,
+            "date": row["date"].strftime("%Y-%m-%d") if pd.notna(row["date"]) else None,
+        })
+    return records
+
+def test_matches_iterrows():
+    """Kết quả theo cột giống hệt kết quả iterrows (kể cả NULL -> default)"""
+    df = sample_frame()
+    assert serialize_frame(df, FIELDS) == reference(df)
+
+def test_value_types():
+    """int/float/str trả về kiểu Python, không phải numpy scalar"""
+    record = serialize_frame(sample_frame(), FIELDS)[0]
+    assert type(record["aqi"]) is int and record["aqi"] == 42
+    assert type(record["pm2_5"]) is float
+    assert record["time"] == "2025-01-01T07:00:00"
+    assert record["date"] == "2025-01-01"
+
+def test_timezone_aware_timestamps():
+    """TIMESTAMP có tz (BigQuery) -> giống datetime.isoformat() theo UTC"""
+    df = pd.DataFrame({"time": pd.to_datetime(["2025-01-01 07:00:00"]).tz_localize("UTC")})
+    records = serialize_frame(df, {"time": ("time", "timestamp", None)})
+    assert records == [{"time": datetime(2025, 1, 1, 7).isoformat() + "+00:00"}]
+
+def test_constants_and_empty():
+    """constants gắn vào mọi record; DataFrame rỗng -> []"""
+    df = sample_frame()
+    records = serialize_frame(df, {"aqi": ("aqi", "int", 0)}, constants={"location": "Hà Nội"})
+    assert [r["location"] for r in records] == ["Hà Nội"] * len(df)
+    assert serialize_frame(df.iloc[0:0], FIELDS) == []
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing Columnar Serializer")
+    print("=" * 50)
+    tests = [
+        test_matches_iterrows,
+        test_value_types,
+        test_timezone_aware_timestamps,
+        test_constants_and_empty,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All serializer tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
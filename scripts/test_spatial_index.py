@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test Script cho Spatial Index (app/core/spatial.py) và resolve_station
+So sánh LocationIndex.nearest với cách tính khoảng cách tới mọi trạm (brute force)
+Không cần BigQuery hay server đang chạy
+"""
+
+import sys
+import os
+import asyncio
+import random
+
+import numpy as np
+
+# Add app to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.spatial import LocationIndex, haversine_km
+from app.db import dimensions
+
+def sample_locations(count=200, seed=7):
+    """Trạm ngẫu nhiên quanh Hà Nội"""
+    rng = random.Random(seed)
+    return [
+        {
+            'location_key': key,
+            'location_name': f"Station {key}",
+            'latitude': 20.8 + rng.random() * 0.5,
+            'longitude': 105.6 + rng.random() * 0.5,
+        }
+        for key in range(1, count + 1)
+    ]
+
+def brute_force(locations, lat, lng, k):
+    lats = np.array([loc['latitude'] for loc in locations])
+    lngs = np.array([loc['longitude'] for loc in locations])
+    distances = haversine_km(lat, lng, lats, lngs)
+    order = np.argsort(distances)[:k]
+    return [(locations[i]['location_key'], float(distances[i])) for i in order]
+
+def test_nearest_matches_brute_force():
+    """k trạm gần nhất giống brute force, kể cả điểm nằm ngoài vùng có trạm"""
+    locations = sample_locations()
+    index = LocationIndex(locations, cell_size_deg=0.05)
+    rng = random.Random(11)
+    points = [(20.7 + rng.random() * 0.7, 105.5 + rng.random() * 0.7) for _ in range(100)] + [(21.9, 106.4)]
+    for lat, lng in points:
+        for k in (1, 3):
+            found = [(loc['location_key'], distance) for loc, distance in index.nearest(lat, lng, k=k)]
+            expected = brute_force(locations, lat, lng, k)
+            assert [key for key, _ in found] == [key for key, _ in expected], (lat, lng, k)
+            assert np.allclose([d for _, d in found], [d for _, d in expected])
+
+def test_max_distance():
+    """Không có trạm trong max_distance_km -> None"""
+    index = LocationIndex(sample_locations())
+    assert index.nearest_one(10.0, 106.0, max_distance_km=5) is None
+    assert index.nearest_one(10.0, 106.0) is not None
+    assert LocationIndex([]).nearest(21.0, 105.8) == []
+
+def test_resolve_station():
+    """resolve_station dùng index của dimension cache, giới hạn NEAREST_STATION_MAX_KM"""
+    locations = sample_locations()
+    previous = dimensions.dimension_cache.location_index
+    dimensions.dimension_cache.location_index = LocationIndex(locations)
+    try:
+        lat, lng = locations[5]['latitude'] + 0.0001, locations[5]['longitude']
+        station = asyncio.run(dimensions.resolve_station(lat, lng))
+        assert station['location_key'] == brute_force(locations, lat, lng, 1)[0][0]
+
+        # Phía bắc trạm xa nhất hơn NEAREST_STATION_MAX_KM (1° vĩ ~ 110.5 km)
+        far_lat = max(loc['latitude'] for loc in locations) + (settings.NEAREST_STATION_MAX_KM + 1) / 110.0
+        assert asyncio.run(dimensions.resolve_station(far_lat, 105.85)) is None
+    finally:
+        dimensions.dimension_cache.location_index = previous
+
+def main():
+    """Chạy toàn bộ test"""
+    print("🧪 Testing Spatial Index")
+    print("=" * 50)
+    tests = [
+        test_nearest_matches_brute_force,
+        test_max_distance,
+        test_resolve_station,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("🎉 All spatial index tests passed!" if not failed else f"❌ {failed} test(s) failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()